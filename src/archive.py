@@ -0,0 +1,66 @@
+import hashlib
+import json
+import zipfile
+from typing import Any, Dict, IO, List
+
+MANIFEST_NAME = "manifest.json"
+
+
+class _HashingWriter:
+    """Forwards writes to ``target`` while counting bytes and computing their sha256."""
+
+    def __init__(self, target: IO[bytes]):
+        self.target = target
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.digest.update(data)
+        self.size += len(data)
+        return self.target.write(data)
+
+    def flush(self) -> None:
+        self.target.flush()
+
+
+class DocxArchive:
+    """Many filled documents written straight into one streamed ``.zip``, plus a checksum manifest.
+
+    Works on unseekable targets (pipes, sockets): members are written once, in order,
+    with data descriptors, so nothing is staged on disk or buffered per document.
+    """
+
+    def __init__(self, target: str | IO[bytes]):
+        # Members are already-deflated .docx packages; storing them avoids a second compression pass.
+        self.zip = zipfile.ZipFile(target, "w", zipfile.ZIP_STORED, allowZip64=True)
+        self.entries: List[Dict[str, Any]] = []
+
+    def _record(self, name: str, writer: _HashingWriter, meta: Dict[str, Any]) -> Dict[str, Any]:
+        entry = {"name": name, "size": writer.size, "sha256": writer.digest.hexdigest(), **meta}
+        self.entries.append(entry)
+        return entry
+
+    def add_fill(self, name: str, template_path: str, mapping: Dict[str, str], **meta: Any) -> Dict[str, Any]:
+        from .filler import fill_docx_to
+
+        with self.zip.open(name, "w", force_zip64=True) as member:
+            writer = _HashingWriter(member)
+            fill_docx_to(template_path, mapping, writer)
+        return self._record(name, writer, meta)
+
+    def add_bytes(self, name: str, data: bytes, **meta: Any) -> Dict[str, Any]:
+        with self.zip.open(name, "w", force_zip64=True) as member:
+            writer = _HashingWriter(member)
+            writer.write(data)
+        return self._record(name, writer, meta)
+
+    def close(self) -> None:
+        manifest = {"count": len(self.entries), "files": self.entries}
+        self.zip.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+        self.zip.close()
+
+    def __enter__(self) -> "DocxArchive":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,245 @@
+import contextlib
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, Tuple
+
+from . import timing
+from .archive import DocxArchive
+from .config import settings
+from .logging_utils import setup_logger, jlog
+from .plan import plan_for
+
+_KEY_SAFE_RE = re.compile(r"[^\w.-]+")
+
+# Template path whose compiled form ``init_worker`` loads once per worker process.
+_WORKER_TEMPLATE: str | None = None
+_WORKER_CACHE = None
+
+
+def iter_records(data_path: str) -> Iterator[Tuple[int, Dict[str, Any] | None, str | None]]:
+    """Stream ``(line_no, record, error)`` tuples from a JSONL or CSV file."""
+    if data_path.lower().endswith(".csv"):
+        with open(data_path, "r", encoding="utf-8-sig", newline="") as handler:
+            for line_no, row in enumerate(csv.DictReader(handler), 2):
+                yield line_no, {key: value or "" for key, value in row.items() if key}, None
+        return
+    with open(data_path, "r", encoding="utf-8") as handler:
+        for line_no, line in enumerate(handler, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_no, None, f"JSON inválido: {exc}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "registro não é um objeto JSON"
+                continue
+            yield line_no, record, None
+
+
+def record_key(record: Dict[str, Any] | None, key_field: str | None, line_no: int) -> str:
+    raw = ""
+    if record is not None and key_field:
+        raw = str(record.get(key_field) or "").strip()
+    if not raw:
+        raw = f"linha{line_no:06d}"
+    return _KEY_SAFE_RE.sub("_", raw).strip("._") or f"linha{line_no:06d}"
+
+
+def iter_keyed_records(
+    data_path: str, key_field: str | None
+) -> Iterator[Tuple[int, str, Dict[str, Any] | None, str | None]]:
+    """``iter_records`` plus each record's unique key (repeated keys get ``-2``, ``-3``... in file order).
+
+    A suffixed key skips every key already used, so a renamed ``a-2`` never takes the place of a record
+    whose own key is ``a-2`` (that one becomes ``a-2-2``).
+    """
+    used: set = set()
+    next_suffix: Dict[str, int] = {}
+    for line_no, record, error in iter_records(data_path):
+        key = record_key(record, key_field, line_no)
+        if key in used:
+            suffix = next_suffix.get(key, 2)
+            while f"{key}-{suffix}" in used:
+                suffix += 1
+            next_suffix[key] = suffix + 1
+            key = f"{key}-{suffix}"
+        used.add(key)
+        yield line_no, key, record, error
+
+
+def init_worker(template_path: str, cache=None) -> None:
+    """``ProcessPoolExecutor`` initializer shared by ``run_batch`` and ``jobs.run_shard``: loads the template once."""
+    from .compiled import get_compiled
+
+    global _WORKER_TEMPLATE, _WORKER_CACHE
+    get_compiled(template_path)
+    _WORKER_TEMPLATE = template_path
+    _WORKER_CACHE = cache
+
+
+def fill_one(key: str, mapping: Dict[str, str], out_dir: str, out_name: str, as_bytes: bool) -> Dict[str, Any]:
+    """Fill one record in a worker set up by ``init_worker``; never raises, failures come back as ``status: error``."""
+    from .filler import fill_docx, fill_docx_bytes
+
+    started = time.perf_counter()
+    cache = _WORKER_CACHE
+    hits = cache.hits if cache is not None else 0
+    try:
+        if as_bytes:
+            data = fill_docx_bytes(_WORKER_TEMPLATE, mapping, cache=cache)
+            result = {"key": key, "status": "ok", "name": out_name, "data": data}
+        else:
+            out_path = fill_docx(_WORKER_TEMPLATE, mapping, out_name=out_name, out_dir=out_dir, cache=cache)
+            result = {"key": key, "status": "ok", "out": out_path}
+    except Exception as exc:  # one bad record must not sink the batch
+        return {"key": key, "status": "error", "error": f"{type(exc).__name__}: {exc}"}
+    result["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    if cache is not None:
+        result["cache"] = "hit" if cache.hits > hits else "miss"
+    result["spans"] = timing.drain()
+    return result
+
+
+def run_batch(
+    spec: Dict[str, Any],
+    data_path: str,
+    key_field: str | None = None,
+    out_dir: str | None = None,
+    summary_path: str | None = None,
+    workers: int | None = None,
+    max_tasks_per_child: int = 200,
+    archive_path: str | None = None,
+    strict: bool = False,
+    cache=None,
+    fuzzy: float | None = None,
+    store=None,
+) -> Dict[str, int]:
+    """Fill one document per record; with ``strict`` records failing the field validators are not filled.
+
+    ``cache`` (an ``OutputCache``) lets a re-run skip records whose document was already generated.
+    ``fuzzy`` (a 0-100 similarity threshold) resolves loosely written column names to placeholders.
+    ``store`` (a ``store.Store``) keeps the parties of every filled record and records each document.
+    """
+    logger = setup_logger()
+    slug = spec["name"]
+    plan = plan_for(spec)
+    matcher = None
+    if fuzzy is not None:
+        from .keymatch import matcher_for
+
+        matcher = matcher_for(spec, fuzzy)
+    logged_resolutions: set = set()
+    template_path = os.path.join(settings.TEMPLATES, spec["source"])
+    out_dir = out_dir or os.path.join(settings.RESULTS, f"{slug}_lote")
+    os.makedirs(out_dir, exist_ok=True)
+    summary_path = summary_path or os.path.join(out_dir, "summary.jsonl")
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4
+
+    jlog(logger, "INFO", "BATCH_START", slug=slug, data=data_path, out_dir=out_dir, workers=workers)
+    started = time.perf_counter()
+    totals = {"ok": 0, "error": 0}
+    cache_counts = {"hit": 0, "miss": 0}
+    unknown_keys: Dict[str, int] = {}
+    # key -> mapping of records in flight, only kept when the store needs it once the fill is done
+    in_flight: Dict[str, Dict[str, str]] = {}
+
+    archive = DocxArchive(archive_path) if archive_path else None
+    # The archive is closed last (after the pool has drained), even on error, so the zip always gets its
+    # manifest and central directory.
+    with (
+        archive or contextlib.nullcontext(),
+        open(summary_path, "w", encoding="utf-8") as summary,
+        ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(template_path, cache),
+            max_tasks_per_child=max_tasks_per_child,
+        ) as pool,
+    ):
+
+        def record_result(result: Dict[str, Any]) -> None:
+            timing.merge(result.pop("spans", {}))
+            if archive is not None and "data" in result:
+                entry = archive.add_bytes(result.pop("name"), result.pop("data"), key=result["key"])
+                result["out"] = f"{archive_path}!{entry['name']}"
+                result["sha256"] = entry["sha256"]
+            totals[result["status"]] += 1
+            mapping = in_flight.pop(result["key"], None)
+            if store is not None and mapping is not None and result["status"] == "ok":
+                from .store import remember_fill
+
+                remember_fill(store, spec, template_path, mapping, result["out"], {"ms": result.get("ms")})
+            if "cache" in result:
+                cache_counts[result["cache"]] += 1
+            summary.write(json.dumps(result, ensure_ascii=False) + "\n")
+            if result["status"] != "ok":
+                jlog(logger, "WARN", "BATCH_RECORD_FAIL", key=result["key"], error=result.get("error"))
+
+        def drain(block_until: int) -> None:
+            nonlocal pending
+            while len(pending) > block_until:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record_result(future.result())
+
+        pending: set = set()
+        for line_no, key, record, error in iter_keyed_records(data_path, key_field):
+            if error is not None:
+                record_result({"key": key, "status": "error", "error": error, "line": line_no})
+                continue
+            if matcher is not None:
+                record, resolution = matcher.remap(record)
+                if id(resolution) not in logged_resolutions:  # once per distinct set of columns
+                    logged_resolutions.add(id(resolution))
+                    renamed = {k: v for k, v in resolution.matches.items() if k != v}
+                    jlog(
+                        logger,
+                        "INFO",
+                        "BATCH_KEY_MATCH",
+                        matched=renamed,
+                        ambiguous=resolution.ambiguous,
+                        unmatched=[k for k in resolution.unmatched if k != key_field],
+                    )
+            check = plan.check_record(record)
+            for unknown in check.unknown:
+                if unknown != key_field:
+                    unknown_keys[unknown] = unknown_keys.get(unknown, 0) + 1
+            if check.errors:
+                jlog(logger, "WARN", "BATCH_RECORD_INVALID", key=key, line=line_no, fields=check.errors)
+                if strict:
+                    invalid = {"key": key, "status": "error", "error": "campos inválidos", "line": line_no}
+                    record_result({**invalid, "fields": check.errors})
+                    continue
+            mapping = check.mapping
+            out_name = f"{slug}_{key}_preenchido.docx"
+            if store is not None:
+                in_flight[key] = mapping
+            pending.add(pool.submit(fill_one, key, mapping, out_dir, out_name, archive is not None))
+            drain(max_pending)
+        drain(0)
+
+    if unknown_keys:
+        jlog(logger, "WARN", "BATCH_UNKNOWN_KEYS", slug=slug, keys=unknown_keys)
+    elapsed = time.perf_counter() - started
+    total = totals["ok"] + totals["error"]
+    jlog(
+        logger,
+        "INFO",
+        "BATCH_DONE",
+        slug=slug,
+        ok=totals["ok"],
+        error=totals["error"],
+        seconds=round(elapsed, 3),
+        docs_per_s=round(total / elapsed, 2) if elapsed > 0 else None,
+        summary=summary_path,
+        **({"cache_hits": cache_counts["hit"], "cache_misses": cache_counts["miss"]} if cache is not None else {}),
+    )
+    return totals
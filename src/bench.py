@@ -0,0 +1,307 @@
+"""Benchmarks for index, compile and fill over the shipped templates and synthetic stress templates.
+
+    python -m src.bench run --out bench/base.json
+    python -m src.bench compare bench/base.json bench/new.json --threshold 0.10
+    python -m src.bench startup
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from .config import settings
+
+METRICS_LOWER_IS_BETTER = ("seconds", "peak_tracemalloc_kb", "max_rss_kb")
+
+# CLI startup budget: total import time (``python -X importtime``, without ``site``) per command, and modules it
+# must not load.
+STARTUP_BUDGET_MS = {"list": 120.0, "tag_header": 450.0}
+STARTUP_FORBIDDEN = {"list": ("docx", "lxml", "pydantic"), "tag_header": ("docx", "lxml")}
+
+
+def _mapping_for(path: str) -> Dict[str, str]:
+    from .parser import read_docx_placeholders
+
+    names = read_docx_placeholders(path)["placeholders"]
+    return {item["raw"]: f"valor {idx}" for idx, item in enumerate(names)}
+
+
+def _time_case(func: Callable[[], int], repeat: int) -> Dict[str, Any]:
+    """Median wall time over ``repeat`` runs; ``func`` returns how many documents it processed."""
+    func()  # warm imports and caches once, outside the measurement
+    timings: List[float] = []
+    docs = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        docs = func()
+        timings.append(time.perf_counter() - started)
+    # tracemalloc slows everything down, so the peak comes from one separate run.
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    seconds = statistics.median(timings)
+    return {
+        "seconds": round(seconds, 6),
+        "docs": docs,
+        "docs_per_s": round(docs / seconds, 2) if seconds > 0 else None,
+        "peak_tracemalloc_kb": round(peak / 1024, 1),
+    }
+
+
+def _run_case(case: str, paths: List[str], repeat: int, out_dir: str) -> Dict[str, Any]:
+    """Runs in a fresh worker process, so ``max_rss_kb`` belongs to this case alone."""
+    from . import compiled
+    from .filler import fill_docx
+    from .logging_utils import setup_logger
+
+    setup_logger("ERROR")
+    kind = case.split(":", 1)[0]
+    if kind == "index":
+        from .parser import build_spec_from_docx
+
+        def func() -> int:
+            for path in paths:
+                build_spec_from_docx(path)
+            return len(paths)
+
+    elif kind == "compile":
+
+        def func() -> int:
+            for path in paths:
+                compiled.compile_docx(path)
+            return len(paths)
+
+    elif kind == "fill":
+        mappings = [_mapping_for(path) for path in paths]
+
+        def func() -> int:
+            for idx, (path, mapping) in enumerate(zip(paths, mappings)):
+                fill_docx(path, mapping, out_name=f"bench_{idx}.docx", out_dir=out_dir)
+            return len(paths)
+
+    elif kind == "fill_cold":
+        mappings = [_mapping_for(path) for path in paths]
+
+        def func() -> int:
+            compiled._CACHE.clear()
+            for idx, (path, mapping) in enumerate(zip(paths, mappings)):
+                fill_docx(path, mapping, out_name=f"bench_{idx}.docx", out_dir=out_dir)
+            return len(paths)
+
+    elif kind == "collect_keys":
+        from .collector import infer_counts_from_spec
+        from .parser import build_spec_from_docx
+        from .plan import CollectionPlan
+
+        specs = [build_spec_from_docx(path) for path in paths]
+
+        def func() -> int:
+            for spec in specs:
+                infer_counts_from_spec(spec)
+                plan = CollectionPlan(spec)  # not plan_for: the plan build is part of what is measured
+                for field in plan.fields:
+                    for idx in range(1, 4):
+                        plan.key_for(field.name, field.entity, idx)
+            return len(specs)
+
+    else:
+        raise ValueError(f"caso desconhecido: {case}")
+
+    result = _time_case(func, repeat)
+    result["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.ROOT, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_suite(repeat: int = 3, only: str | None = None, skip_synthetic: bool = False) -> Dict[str, Any]:
+    from .synthetic import generate_all
+
+    templates = sorted(
+        os.path.join(settings.TEMPLATES, name) for name in os.listdir(settings.TEMPLATES) if name.endswith(".docx")
+    )
+    with tempfile.TemporaryDirectory(prefix="agnodocs-bench-") as tmp:
+        cases: Dict[str, List[str]] = {}
+        for kind in ("index", "compile", "fill_cold", "fill", "collect_keys"):
+            cases[f"{kind}:templates"] = templates
+        if not skip_synthetic:
+            for name, path in generate_all(os.path.join(tmp, "synthetic")).items():
+                for kind in ("index", "compile", "fill"):
+                    cases[f"{kind}:{name}"] = [path]
+        if only:
+            cases = {case: paths for case, paths in cases.items() if only in case}
+
+        out_dir = os.path.join(tmp, "out")
+        os.makedirs(out_dir)
+        results: Dict[str, Any] = {}
+        context = multiprocessing.get_context("spawn")
+        for case, paths in cases.items():
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results[case] = pool.submit(_run_case, case, paths, repeat, out_dir).result()
+            print(f"{case:45s} {results[case]['seconds']:>10.4f}s  {results[case]['docs_per_s']!s:>10} docs/s", file=sys.stderr)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> List[str]:
+    """Regressions where ``new`` is worse than ``base`` by more than ``threshold`` (0.10 = 10%)."""
+    regressions: List[str] = []
+    for case, new_result in new["results"].items():
+        base_result = base["results"].get(case)
+        if not base_result:
+            continue
+        for metric in METRICS_LOWER_IS_BETTER:
+            before, after = base_result.get(metric), new_result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change > threshold:
+                regressions.append(f"{case} {metric}: {before} -> {after} (+{change:.0%})")
+    return regressions
+
+
+def _startup_argv(command: str) -> List[str] | None:
+    if command == "list":
+        return ["-m", "src.main", "list"]
+    if command == "tag_header":
+        from .spec_repo import list_specs
+
+        slugs = list_specs()
+        return ["-m", "src.tag_header", "--slug", slugs[0]] if slugs else None
+    raise ValueError(f"comando desconhecido: {command}")
+
+
+def _import_profile(argv: List[str]) -> Tuple[float, List[str]]:
+    """Total import ms and the top-level packages imported by ``python -X importtime <argv>``."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv], cwd=settings.ROOT, capture_output=True, text=True, check=True
+    )
+    total_us = 0
+    packages = set()
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        # ``site`` runs before the command's own imports and does not depend on it, so it is left out.
+        if not name.startswith("  ") and name.strip() != "site":
+            total_us += int(cumulative)
+        packages.add(name.strip().split(".", 1)[0])
+    return total_us / 1000, sorted(packages)
+
+
+def startup_check(repeat: int = 5, budgets: Dict[str, float] | None = None) -> Dict[str, Any]:
+    """Median import time per command against ``STARTUP_BUDGET_MS``, plus forbidden heavy imports."""
+    budgets = budgets or STARTUP_BUDGET_MS
+    results: Dict[str, Any] = {}
+    for command, budget in budgets.items():
+        argv = _startup_argv(command)
+        if argv is None:
+            continue
+        runs = [_import_profile(argv) for _ in range(repeat)]
+        import_ms = statistics.median(ms for ms, _ in runs)
+        forbidden = [name for name in STARTUP_FORBIDDEN.get(command, ()) if name in runs[0][1]]
+        results[command] = {
+            "import_ms": round(import_ms, 1),
+            "budget_ms": budget,
+            "forbidden_imports": forbidden,
+            "ok": import_ms <= budget and not forbidden,
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks de index/fill")
+    sub = parser.add_subparsers(dest="cmd")
+
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--out", default=None, help="Arquivo JSON de resultados (padrão: stdout)")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--only", default=None, help="Roda só os casos cujo nome contém este texto")
+    run_parser.add_argument("--skip-synthetic", action="store_true")
+
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+
+    startup_parser = sub.add_parser("startup", help="Checa o tempo de import da CLI (python -X importtime)")
+    startup_parser.add_argument("--repeat", type=int, default=5)
+    startup_parser.add_argument(
+        "--budget",
+        action="append",
+        default=[],
+        metavar="COMANDO=MS",
+        help="Sobrescreve o orçamento de um comando (ex.: list=100)",
+    )
+
+    args = parser.parse_args()
+    if args.cmd == "run":
+        report = json.dumps(run_suite(args.repeat, args.only, args.skip_synthetic), indent=2)
+        if args.out:
+            os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+            with open(args.out, "w", encoding="utf-8") as handler:
+                handler.write(report + "\n")
+        else:
+            print(report)
+    elif args.cmd == "compare":
+        with open(args.base, "r", encoding="utf-8") as handler:
+            base = json.load(handler)
+        with open(args.new, "r", encoding="utf-8") as handler:
+            new = json.load(handler)
+        regressions = compare(base, new, args.threshold)
+        for line in regressions:
+            print(f"[REGRESSÃO] {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"[OK] Sem regressões acima de {args.threshold:.0%}")
+    elif args.cmd == "startup":
+        budgets = dict(STARTUP_BUDGET_MS)
+        for item in args.budget:
+            command, _, ms = item.partition("=")
+            budgets[command.strip()] = float(ms)
+        results = startup_check(args.repeat, budgets)
+        failed = False
+        for command, result in results.items():
+            status = "OK" if result["ok"] else "REGRESSÃO"
+            failed = failed or not result["ok"]
+            extra = f" importa {', '.join(result['forbidden_imports'])}" if result["forbidden_imports"] else ""
+            print(f"[{status}] {command}: {result['import_ms']}ms (orçamento {result['budget_ms']}ms){extra}")
+        if failed:
+            raise SystemExit(1)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
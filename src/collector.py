@@ -1,6 +1,9 @@
 from typing import Dict, Any, List
-from .validators import guess_validator
 from .logging_utils import setup_logger, jlog
+from .plan import plan_for
+from .timing import Span
+
+BACK_COMMAND = ":voltar"
 
 
 def ask(prompt: str, default: str | None = None) -> str:
@@ -12,20 +15,6 @@ def ask(prompt: str, default: str | None = None) -> str:
     return value if value else (default or "")
 
 
-def choose_entities_v(entities: List[str]) -> List[str]:
-    if not entities:
-        return []
-    if len(entities) == 1:
-        answer = ask(f"A entidade '{entities[0]}' é 'V' (vários)? (s/n)", "n").lower()
-        return [entities[0]] if answer.startswith("s") else []
-    print("Quais entidades são 'V' (vários)? Separe por vírgula. Opções:", ", ".join(entities))
-    raw = input("> ").strip()
-    if not raw:
-        return []
-    chosen = [item.strip().upper() for item in raw.split(",") if item.strip()]
-    return [entity for entity in chosen if entity in entities]
-
-
 def infer_counts_from_spec(spec: Dict[str, Any]) -> Dict[str, int]:
     counts: Dict[str, int] = {}
     meta_counts = (spec.get("meta") or {}).get("inferred_counts") or {}
@@ -51,167 +40,143 @@ def infer_counts_from_spec(spec: Dict[str, Any]) -> Dict[str, int]:
     return counts
 
 
-def collect_counts_for_v(v_entities: List[str], casais: bool, defaults: Dict[str, int]) -> Dict[str, int]:
-    counts: Dict[str, int] = {}
-    for entity in v_entities:
-        default_n = defaults.get(entity, 0)
-        if default_n < 1:
-            default_n = 2 if casais else 1
-        while True:
-            text = ask(f"Quantos registros para '{entity}'?", str(default_n))
-            if text.isdigit() and int(text) >= 1:
-                counts[entity] = int(text)
-                break
-            print("Informe um número inteiro >= 1.")
-    return counts
+def _llm_prefill(spec: Dict[str, Any], counts: Dict[str, int], logger) -> Dict[str, str]:
+    """Ask for pasted qualification text and pre-extract values, offered as defaults in each prompt."""
+    from .llm_extract import extract_fields
+
+    print("\nCole o texto com a qualificação das partes (linha vazia para terminar, ou só Enter para pular):")
+    lines: List[str] = []
+    while True:
+        line = input()
+        if not line.strip():
+            break
+        lines.append(line)
+    if not lines:
+        return {}
+    try:
+        mapping, report = extract_fields(spec, "\n".join(lines), counts=counts)
+    except Exception as exc:  # the interview goes on without suggestions
+        jlog(logger, "WARN", "RUN_LLM_FAIL", error=f"{type(exc).__name__}: {exc}")
+        print(f"[aviso] Extração automática indisponível: {exc}")
+        return {}
+    print(f"[info] {len(mapping)} campos sugeridos pelo modelo; confirme com Enter ou digite outro valor.")
+    return mapping
 
 
-def _match_placeholder(target: str, all_names: List[str]) -> str | None:
-    target_cf = target.casefold()
-    for name in all_names:
-        if name.casefold() == target_cf:
-            return name
-    return None
+def _store_prefill(spec: Dict[str, Any], group_id: str, entity: str, total: int, store, logger) -> Dict[str, str]:
+    """Ask the CPF/CNPJ of each record of ``entity`` and turn parties found in the store into suggestions."""
+    from .store import DOCUMENT_RULES, prefill_for
+
+    plan = plan_for(spec)
+    if not any(field.group == group_id and field.rule in DOCUMENT_RULES for field in plan.fields):
+        return {}
+    prefill: Dict[str, str] = {}
+    for idx in range(1, total + 1):
+        doc = ask(f"CPF/CNPJ de {entity} #{idx} para buscar no cadastro (Enter para pular)")
+        if not doc:
+            continue
+        party = store.party(doc)
+        jlog(logger, "INFO", "RUN_STORE_LOOKUP", entity=entity, idx=idx, found=party is not None)
+        if party is None:
+            print("[cadastro] não encontrado")
+            continue
+        print(f"[cadastro] {party.fields.get('NOME') or party.doc}: {len(party.fields)} campos sugeridos")
+        prefill.update(prefill_for(plan, entity, idx, party))
+    return prefill
 
 
-def best_placeholder_key(base: str, entity: str, idx: int, all_names: List[str]) -> str | None:
-    numbered_name = f"{base}_{entity}_{idx}"
-    match = _match_placeholder(numbered_name, all_names)
-    if match:
-        return f"{{{match}}}"
-    if idx == 1:
-        simple_name = f"{base}_{entity}"
-        match = _match_placeholder(simple_name, all_names)
-        if match:
-            return f"{{{match}}}"
-    return None
+def collect_for_spec(spec: Dict[str, Any], use_llm: bool = False, store=None) -> Dict[str, str]:
+    """Console adapter over ``session.CollectionSession``: one ``input()`` per question.
 
+    With a ``store.Store``, each entity's records can be looked up by CPF/CNPJ and prefilled from it.
+    """
+    from .session import CollectionSession
 
-def collect_for_spec(spec: Dict[str, Any], use_llm: bool = False) -> Dict[str, str]:
     logger = setup_logger()
-    multiplicity = spec.get("multiplicity") or "[1-1]"
-    entities = [entity for entity in spec.get("entities", []) if entity != "GLOBAL"]
-    casais = bool((spec.get("meta") or {}).get("casais"))
-    all_names = spec.get("all_placeholders", [])
-    inferred_counts = infer_counts_from_spec(spec)
-
-    print(f"\nIniciando coleta para: {spec['name']}  | multiplicidade: {multiplicity}")
-
-    v_entities: List[str] = []
-    if "V" in multiplicity:
-        auto_v = sorted([entity for entity, count in inferred_counts.items() if count > 1 and entity in entities])
-        if auto_v:
-            print("Detectei automaticamente entidades 'V':", ", ".join(auto_v))
-            jlog(logger, "INFO", "RUN_CHOOSE_V_AUTO", v_entities=auto_v)
-            v_entities.extend(auto_v)
-        remaining = [entity for entity in entities if entity not in v_entities]
-        if remaining:
-            manual_v = choose_entities_v(remaining)
-            if manual_v:
-                v_entities.extend(entity for entity in manual_v if entity not in v_entities)
-                jlog(logger, "INFO", "RUN_CHOOSE_V_MANUAL", v_entities=manual_v)
-        jlog(logger, "INFO", "RUN_CHOOSE_V", v_entities=v_entities)
-        v_counts = collect_counts_for_v(v_entities, casais, inferred_counts)
-    else:
-        v_counts = {}
-
-    one_counts = {entity: 1 for entity in entities if entity not in v_entities}
-    counts = {**one_counts, **v_counts}
-    jlog(logger, "INFO", "RUN_COUNTS", **counts)
-
-    mapping: Dict[str, str] = {}
-
-    for group in spec.get("groups", []):
-        print(f"\n=== {group['id']} :: {group['label']} ===")
-        for field in group.get("fields", []):
-            entity = field["entity"]
-            field_name = field["name"]
-            placeholder = field["placeholder"]
-
-            if entity == "GLOBAL":
-                validator, hint, rule = guess_validator(field_name)
-                while True:
-                    jlog(
-                        logger,
-                        "INFO",
-                        "RUN_FIELD_PROMPT",
-                        group=group["id"],
-                        entity="GLOBAL",
-                        name=field_name,
-                        idx=1,
-                    )
-                    prompt = f"{field_name} (GLOBAL)"
-                    if hint:
-                        prompt += f"  [{hint}]"
-                    value = ask(prompt)
-                    if validator(value):
-                        mapping[placeholder] = value
-                        jlog(logger, "INFO", "RUN_MAP_KEY", src=f"{field_name}/GLOBAL", to=placeholder)
-                        break
-                    jlog(
-                        logger,
-                        "WARN",
-                        "RUN_FIELD_VALID_FAIL",
-                        entity="GLOBAL",
-                        name=field_name,
-                        idx=1,
-                        value=value,
-                        rule=rule,
-                    )
-                continue
-
-            total = counts.get(entity, 1)
-            for idx in range(1, total + 1):
-                validator, hint, rule = guess_validator(field_name)
-                while True:
-                    jlog(
-                        logger,
-                        "INFO",
-                        "RUN_FIELD_PROMPT",
-                        group=group["id"],
-                        entity=entity,
-                        name=field_name,
-                        idx=idx,
-                    )
-                    prompt = f"{field_name} ({entity}) #{idx}"
-                    if hint:
-                        prompt += f"  [{hint}]"
-                    value = ask(prompt)
-                    if validator(value):
-                        key = best_placeholder_key(base=field_name, entity=entity, idx=idx, all_names=all_names)
-                        if key is None:
-                            if idx == 1:
-                                mapping[placeholder] = value
-                                jlog(
-                                    logger,
-                                    "INFO",
-                                    "RUN_MAP_KEY",
-                                    src=f"{field_name}/{entity}#{idx}",
-                                    to=placeholder,
-                                )
-                            else:
-                                jlog(
-                                    logger,
-                                    "WARN",
-                                    "RUN_MAP_KEY_WARN",
-                                    reason="missing_placeholder_variant",
-                                    wanted=f"{{{field_name}_{entity}_{idx}}}",
-                                    fallback=None,
-                                )
-                        else:
-                            mapping[key] = value
-                            jlog(logger, "INFO", "RUN_MAP_KEY", src=f"{field_name}/{entity}#{idx}", to=key)
-                        break
-                    jlog(
-                        logger,
-                        "WARN",
-                        "RUN_FIELD_VALID_FAIL",
-                        entity=entity,
-                        name=field_name,
-                        idx=idx,
-                        value=value,
-                        rule=rule,
-                    )
-
-    jlog(logger, "INFO", "RUN_MAPPING_SIZE", placeholders=len(mapping))
+    collect_span = Span("collect.total").start()
+    session = CollectionSession(spec["name"])
+    auto_v = session.v_entities(spec)
+
+    print(f"\nIniciando coleta para: {spec['name']}  | multiplicidade: {spec.get('multiplicity') or '[1-1]'}")
+    print(f"(digite {BACK_COMMAND} para voltar à pergunta anterior)")
+    if auto_v:
+        print("Detectei automaticamente entidades 'V':", ", ".join(auto_v))
+        jlog(logger, "INFO", "RUN_CHOOSE_V_AUTO", v_entities=auto_v)
+
+    fields_started = False
+    group_id = None
+    looked_up: set = set()
+    while True:
+        question = session.question(spec)
+        if question is None:
+            break
+        if question.kind == "field" and not fields_started:
+            fields_started = True
+            counts = session.counts(spec) or {}
+            jlog(logger, "INFO", "RUN_CHOOSE_V", v_entities=session.v_entities(spec))
+            jlog(logger, "INFO", "RUN_COUNTS", **counts)
+            if use_llm and session.prefill is None:
+                session.prefill = _llm_prefill(spec, counts, logger) or {}
+                question = session.question(spec)
+        elif question.kind != "field":
+            fields_started = False
+        if question.kind == "field" and question.group != group_id:
+            group_id = question.group
+            print(f"\n=== {question.group} :: {question.label} ===")
+            if store is not None and question.entity != "GLOBAL" and group_id not in looked_up:
+                looked_up.add(group_id)
+                total = (session.counts(spec) or {}).get(question.entity, 1)
+                found = _store_prefill(spec, group_id, question.entity, total, store, logger)
+                if found:
+                    session.prefill = {**(session.prefill or {}), **found}
+                    question = session.question(spec)
+        if question.kind == "field":
+            jlog(
+                logger,
+                "INFO",
+                "RUN_FIELD_PROMPT",
+                group=question.group,
+                entity=question.entity,
+                name=question.name,
+                idx=question.idx,
+            )
+
+        value = ask(question.prompt, question.default)
+        if value == BACK_COMMAND:
+            session.back(spec)
+            group_id = None
+            continue
+        result = session.submit(spec, value)
+        if not result.ok:
+            print(result.error)
+            if question.kind == "field":
+                jlog(
+                    logger,
+                    "WARN",
+                    "RUN_FIELD_VALID_FAIL",
+                    entity=question.entity,
+                    name=question.name,
+                    idx=question.idx,
+                    value=value,
+                    rule=plan_for(spec).validator(question.name)[2],
+                )
+            continue
+        if question.kind == "v_entities" and session.answers[-1]:
+            jlog(logger, "INFO", "RUN_CHOOSE_V_MANUAL", v_entities=session.answers[-1].split(","))
+        elif question.kind == "field":
+            src = f"{question.name}/{question.entity}" + ("" if question.entity == "GLOBAL" else f"#{question.idx}")
+            if question.key is None:
+                jlog(
+                    logger,
+                    "WARN",
+                    "RUN_MAP_KEY_WARN",
+                    reason="missing_placeholder_variant",
+                    wanted=f"{{{question.name}_{question.entity}_{question.idx}}}",
+                    fallback=None,
+                )
+            else:
+                jlog(logger, "INFO", "RUN_MAP_KEY", src=src, to=question.key)
+
+    mapping = session.mapping(spec)
+    jlog(logger, "INFO", "RUN_MAPPING_SIZE", placeholders=len(mapping), duration_ms=collect_span.stop())
     return mapping
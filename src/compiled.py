@@ -0,0 +1,532 @@
+import itertools
+import os
+import pickle
+import re
+import struct
+import time
+import zipfile
+from typing import Dict, IO, Iterable, Iterator, List, NamedTuple
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+from .computed import agreement_forms
+from .config import settings
+from .parser import MAIN_PART, PLACEHOLDER_RE, REPEAT_OPEN, is_story_part
+from .replacer import W_NS, W_P, W_T, XML_SPACE, own_text_nodes, stitch_placeholders
+from .timing import record
+
+COMPILED_VERSION = 4
+
+# Private-use markers never produced by Word; they survive serialization untouched.
+_SLOT_OPEN = "\ue000"
+_SLOT_CLOSE = "\ue001"
+_SLOT_RE = re.compile(f"{_SLOT_OPEN}(\\d+){_SLOT_CLOSE}".encode("utf-8"))
+# Repeat blocks are fenced with comments while compiling, then cut out of the serialized part.
+_BLOCK_OPEN = "\ue002"
+_BLOCK_CLOSE = "\ue003"
+_BLOCK_RE = re.compile(f"<!--{_BLOCK_OPEN}(\\d+)-->(.*?)<!--{_BLOCK_CLOSE}-->".encode("utf-8"), re.S)
+_MARKER_RE = re.compile(r"\{([#/])([^{}:\s]+)\}")
+# Mail merge: record bodies are separated by a page break; drawing ids are shifted per copy to stay unique.
+_PAGE_BREAK = b'<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+_BODY_OPEN_RE = re.compile(rb"<w:body(?:\s[^>]*)?>")
+_DOC_PR_RE = re.compile(rb'(<wp:docPr\b[^>]*?\sid=")(\d+)')
+_W14_IDS_RE = re.compile(rb' w14:(?:paraId|textId)="[^"]*"')
+W_TR = f"{{{W_NS}}}tr"
+W_SECT_PR = f"{{{W_NS}}}sectPr"
+# Word's per-paragraph revision ids; optional, and they would be duplicated by every copy of a block.
+W14_IDS = (
+    "{http://schemas.microsoft.com/office/word/2010/wordml}paraId",
+    "{http://schemas.microsoft.com/office/word/2010/wordml}textId",
+)
+_BREAK = '</w:t><w:br/><w:t xml:space="preserve">'
+_TAB = '</w:t><w:tab/><w:t xml:space="preserve">'
+
+
+class CompiledBlock(NamedTuple):
+    """A ``{#ENTITY}...{/ENTITY}`` block: rendered once per record of ``entity``."""
+
+    entity: str
+    segments: List[bytes]
+    slots: List[str]
+    # "NOME_OUTORGADO" for {NOME_OUTORGADO}: copy i reads {NOME_OUTORGADO_i}; None: same value in every copy
+    stems: List[str | None]
+
+
+class CompiledPart(NamedTuple):
+    name: str
+    segments: List[bytes]  # len(segments) == len(slots) + 1
+    slots: List[str]  # raw placeholders, e.g. "{NOME_OUTORGANTE}"; "{#ENTITY}" where a repeat block goes
+    offsets: List[int]  # byte offset of each slot within b"".join(segments)
+    blocks: Dict[int, CompiledBlock]  # slot position -> repeat block
+
+
+class CompiledTemplate(NamedTuple):
+    version: int
+    source: str
+    size: int
+    mtime_ns: int
+    parts: Dict[str, CompiledPart]
+
+
+_CACHE: Dict[str, CompiledTemplate] = {}
+
+
+def compiled_path(template_path: str) -> str:
+    base = os.path.splitext(os.path.basename(template_path))[0]
+    return os.path.join(settings.INDEX_DIR, "compiled", f"{base}.ctpl")
+
+
+def _own_text(paragraph) -> str:
+    return "".join(node.text or "" for node in own_text_nodes(paragraph))
+
+
+def _paragraph_of(node):
+    while node is not None and node.tag != W_P:
+        node = node.getparent()
+    return node
+
+
+def _row_of(node):
+    while node is not None and node.tag != W_TR:
+        node = node.getparent()
+    return node
+
+
+def _mark_blocks(root) -> List[str]:
+    """Fence every repeat block with numbered comments and strip its markers; returns the block entities.
+
+    Markers in sibling paragraphs repeat those paragraphs (a marker paragraph left empty is dropped);
+    markers in the cells of sibling table rows repeat those rows.
+    """
+    markers = []
+    for node in root.iter(W_T):
+        text = node.text or ""
+        if "{#" in text or "{/" in text:
+            markers.extend((node, match.group(1), match.group(2)) for match in _MARKER_RE.finditer(text))
+    if not markers:
+        return []
+    if len(markers) % 2 or any(
+        opening[1] != REPEAT_OPEN or closing[1] == REPEAT_OPEN or opening[2].casefold() != closing[2].casefold()
+        for opening, closing in zip(markers[0::2], markers[1::2])
+    ):
+        raise ValueError("marcadores de bloco {#ENTIDADE}...{/ENTIDADE} desbalanceados ou aninhados")
+    spans = []
+    for (open_node, _, entity), (close_node, _, _) in zip(markers[0::2], markers[1::2]):
+        first, last = _paragraph_of(open_node), _paragraph_of(close_node)
+        dropped = []
+        if first.getparent() is not last.getparent():
+            first, last = _row_of(first), _row_of(last)
+            if first is None or last is None or first.getparent() is not last.getparent():
+                raise ValueError(f"bloco {{#{entity}}} precisa abrir e fechar no mesmo nível (parágrafos ou linhas)")
+        elif first is not last:
+            dropped = [first, last]
+        units = [first]
+        while units[-1] is not last:
+            following = units[-1].getnext()
+            if following is None:
+                raise ValueError(f"{{/{entity}}} antes de {{#{entity}}}")
+            units.append(following)
+        spans.append((entity.upper(), units, dropped))
+    for node, _, _ in markers:
+        node.text = _MARKER_RE.sub("", node.text)
+        node.set(XML_SPACE, "preserve")
+    entities: List[str] = []
+    for entity, units, dropped in spans:
+        for paragraph in dropped:
+            if not _own_text(paragraph).strip() and paragraph.find(f".//{W_SECT_PR}") is None:
+                units.remove(paragraph)
+                paragraph.getparent().remove(paragraph)
+        if not units:
+            continue
+        for unit in units:
+            for node in unit.iter():
+                for attribute in W14_IDS:
+                    node.attrib.pop(attribute, None)
+        units[0].addprevious(etree.Comment(f"{_BLOCK_OPEN}{len(entities)}"))
+        units[-1].addnext(etree.Comment(_BLOCK_CLOSE))
+        entities.append(entity)
+    return entities
+
+
+def _append_slots(segments: List[bytes], slots: List[str], data: bytes, raw: List[str]) -> None:
+    pieces = _SLOT_RE.split(data)
+    segments[-1] += pieces[0]
+    for idx, text in zip(pieces[1::2], pieces[2::2]):
+        slots.append(raw[int(idx)])
+        segments.append(text)
+
+
+def _stem(raw: str, entity: str) -> str | None:
+    """The per-record name of a block slot (``NOME_OUTORGADO`` -> ``{NOME_OUTORGADO_<n>}``), ``None`` when every
+    copy shares the value: other entities, globals and agreement forms such as ``{PLURAL_OUTORGADO:o|os}``,
+    which are computed once from the record count."""
+    match = PLACEHOLDER_RE.fullmatch(raw)
+    name, hint = match.group(1), match.group(2)
+    if agreement_forms(hint):
+        return None
+    parts = name.split("_")
+    return name if len(parts) >= 2 and parts[-1].casefold() == entity.casefold() else None
+
+
+def _compile_part(name: str, xml: bytes) -> CompiledPart | None:
+    if b"{" not in xml:
+        return None
+    root = etree.fromstring(xml)
+    stitch_placeholders(root, PLACEHOLDER_RE)
+    block_entities = _mark_blocks(root)
+    raw: List[str] = []
+    for node in root.iter(W_T):
+        text = node.text or ""
+        if "{" not in text:
+            continue
+
+        def to_slot(match: re.Match) -> str:
+            raw.append(match.group(0))
+            return f"{_SLOT_OPEN}{len(raw) - 1}{_SLOT_CLOSE}"
+
+        new_text = PLACEHOLDER_RE.sub(to_slot, text)
+        if new_text != text:
+            node.text = new_text
+            node.set(XML_SPACE, "preserve")
+    if not raw and not block_entities:
+        return None
+    data = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+    pieces = _BLOCK_RE.split(data)
+    segments: List[bytes] = [b""]
+    slots: List[str] = []
+    blocks: Dict[int, CompiledBlock] = {}
+    _append_slots(segments, slots, pieces[0], raw)
+    for number, body, text in zip(pieces[1::3], pieces[2::3], pieces[3::3]):
+        entity = block_entities[int(number)]
+        block_segments: List[bytes] = [b""]
+        block_slots: List[str] = []
+        _append_slots(block_segments, block_slots, body, raw)
+        stems = [_stem(slot, entity) for slot in block_slots]
+        blocks[len(slots)] = CompiledBlock(entity, block_segments, block_slots, stems)
+        slots.append(f"{{#{entity}}}")
+        segments.append(b"")
+        _append_slots(segments, slots, text, raw)
+    offsets: List[int] = []
+    position = 0
+    for segment in segments[:-1]:
+        position += len(segment)
+        offsets.append(position)
+    return CompiledPart(name, segments, slots, offsets, blocks)
+
+
+def compile_docx(template_path: str, only_parts: Iterable[str] | None = None) -> CompiledTemplate:
+    """``only_parts`` (e.g. the spec's ``meta.parts``) skips parts the parser found no placeholder in."""
+    stat = os.stat(template_path)
+    wanted = set(only_parts) if only_parts is not None else None
+    parts: Dict[str, CompiledPart] = {}
+    with zipfile.ZipFile(template_path) as package:
+        for info in package.infolist():
+            if not is_story_part(info.filename) or (wanted is not None and info.filename not in wanted):
+                continue
+            part = _compile_part(info.filename, package.read(info))
+            if part is not None:
+                parts[info.filename] = part
+    return CompiledTemplate(COMPILED_VERSION, template_path, stat.st_size, stat.st_mtime_ns, parts)
+
+
+def save_compiled(compiled: CompiledTemplate) -> str:
+    path = compiled_path(compiled.source)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as handler:
+        pickle.dump(compiled, handler, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _is_fresh(compiled: CompiledTemplate, stat: os.stat_result) -> bool:
+    return (
+        compiled.version == COMPILED_VERSION
+        and compiled.size == stat.st_size
+        and compiled.mtime_ns == stat.st_mtime_ns
+    )
+
+
+def get_compiled(template_path: str) -> CompiledTemplate:
+    """Return the compiled template, from memory, from the index, or compiled on the fly."""
+    stat = os.stat(template_path)
+    compiled = _CACHE.get(template_path)
+    if compiled is not None and _is_fresh(compiled, stat):
+        return compiled
+    try:
+        with open(compiled_path(template_path), "rb") as handler:
+            compiled = pickle.load(handler)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, TypeError):
+        # TypeError: a .ctpl pickled with an older CompiledPart/CompiledBlock layout; _is_fresh never sees it.
+        compiled = None
+    if compiled is None or not _is_fresh(compiled, stat):
+        compiled = compile_docx(template_path)
+    compiled = compiled._replace(source=template_path)
+    _CACHE[template_path] = compiled
+    return compiled
+
+
+def _escape_value(value: str) -> str:
+    text = escape(str(value))
+    if "\n" in text or "\t" in text:
+        text = text.replace("\r\n", "\n").replace("\n", _BREAK).replace("\t", _TAB)
+    return text
+
+
+def _slot_bytes(raw: str, value: str | None) -> bytes:
+    return escape(raw).encode("utf-8") if value is None else _escape_value(value).encode("utf-8")
+
+
+def block_count(block: CompiledBlock, mapping: Dict[str, str]) -> int:
+    """Copies to render: the highest record index with data (at least one copy); gaps render as empty records."""
+    stems = {f"{{{stem}" for stem in block.stems if stem is not None}
+    count = 1
+    for key in mapping:
+        head, sep, index = key[:-1].rpartition("_")
+        if sep and index.isdigit() and head in stems and key.endswith("}"):
+            count = max(count, int(index))
+    return count
+
+
+def render_block(block: CompiledBlock, mapping: Dict[str, str]) -> bytes:
+    chunks: List[bytes] = []
+    segments = block.segments
+    for number in range(1, block_count(block, mapping) + 1):
+        for idx, raw in enumerate(block.slots):
+            chunks.append(segments[idx])
+            stem = block.stems[idx]
+            value = mapping.get(raw) if stem is None or number == 1 else None
+            if stem is not None and value is None:
+                value = mapping.get(f"{{{stem}_{number}}}")
+            # A record without this value renders like copy 1 would: the slot's own placeholder text.
+            chunks.append(_slot_bytes(raw, value))
+        chunks.append(segments[-1])
+    return b"".join(chunks)
+
+
+def render_part(part: CompiledPart, mapping: Dict[str, str]) -> bytes:
+    chunks: List[bytes] = []
+    segments = part.segments
+    blocks = part.blocks
+    for idx, raw in enumerate(part.slots):
+        chunks.append(segments[idx])
+        if blocks and idx in blocks:
+            chunks.append(render_block(blocks[idx], mapping))
+            continue
+        chunks.append(_slot_bytes(raw, mapping.get(raw)))
+    chunks.append(segments[-1])
+    return b"".join(chunks)
+
+
+def _clone_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    clone = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    clone.compress_type = info.compress_type
+    clone.external_attr = info.external_attr
+    return clone
+
+
+def compress_level() -> int | None:
+    """Deflate level for rewritten parts: ``AGNODOCS_ZIP_LEVEL`` (0-9), zlib's default when unset."""
+    level = os.getenv("AGNODOCS_ZIP_LEVEL")
+    return int(level) if level else None
+
+
+# Private ZipFile state _copy_raw updates, exactly as ``ZipFile.write`` does. Unchanged from Python 3.11 through
+# 3.13 (the versions this project supports); on any other layout members are recompressed instead.
+_RAW_COPY_ATTRS = ("fp", "_lock", "_seekable", "start_dir", "filelist", "NameToInfo", "_didModify")
+_ZIP64_EXTRA_ID = 0x0001
+
+
+def _can_copy_raw(out: zipfile.ZipFile) -> bool:
+    return hasattr(zipfile, "sizeFileHeader") and all(hasattr(out, attr) for attr in _RAW_COPY_ATTRS)
+
+
+def _strip_zip64_extra(extra: bytes) -> bytes:
+    """``extra`` without its zip64 record: the sizes it carried belong to the source archive, and ``FileHeader``
+    writes a fresh one when the member needs it."""
+    kept: List[bytes] = []
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, size = struct.unpack("<HH", extra[position:position + 4])
+        if header_id != _ZIP64_EXTRA_ID:
+            kept.append(extra[position:position + 4 + size])
+        position += 4 + size
+    return b"".join(kept)
+
+
+def _copy_raw(source: zipfile.ZipFile, info: zipfile.ZipInfo, out: zipfile.ZipFile) -> None:
+    """Append ``info`` to ``out`` with its compressed bytes copied as they are (no inflate/deflate).
+
+    zipfile has no public API for this, so the entry is written the way ``ZipFile.write`` does it:
+    local header at ``start_dir``, payload, then the entry registered for the central directory. The member's
+    extra field (timestamps, alignment padding...) is kept. Falls back to ``read``/``writestr`` when
+    ``_can_copy_raw`` says the ZipFile internals are not the expected ones.
+    """
+    clone = _clone_info(info)
+    clone.extra = _strip_zip64_extra(info.extra)
+    if not _can_copy_raw(out):
+        out.writestr(clone, source.read(info))
+        return
+    clone.flag_bits = info.flag_bits & ~0x08  # sizes go in the local header, no data descriptor
+    clone.CRC = info.CRC
+    clone.compress_size = info.compress_size
+    clone.file_size = info.file_size
+    source.fp.seek(info.header_offset)
+    local = source.fp.read(zipfile.sizeFileHeader)
+    name_len, extra_len = struct.unpack("<HH", local[26:30])
+    source.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_len + extra_len)
+    with out._lock:
+        if out._seekable:
+            out.fp.seek(out.start_dir)
+        clone.header_offset = out.start_dir
+        out.fp.write(clone.FileHeader())
+        remaining = info.compress_size
+        while remaining:
+            chunk = source.fp.read(min(remaining, 1 << 20))
+            if not chunk:
+                raise zipfile.BadZipFile(f"membro truncado: {info.filename}")
+            out.fp.write(chunk)
+            remaining -= len(chunk)
+        out.start_dir = out.fp.tell()
+        out.filelist.append(clone)
+        out.NameToInfo[clone.filename] = clone
+        out._didModify = True
+
+
+def render_docx(
+    compiled: CompiledTemplate,
+    mapping: Dict[str, str],
+    target: str | IO[bytes],
+    timings: Dict[str, float] | None = None,
+    compresslevel: int | None = None,
+) -> None:
+    """Write the filled package; ``timings`` (if given) receives ``render_ms`` and ``save_ms``.
+
+    Only parts with placeholders are rewritten (deflated at ``compresslevel``); images, fonts, styles
+    and every other member are copied compressed, byte for byte.
+    """
+    render_s = 0.0
+    started = time.perf_counter()
+    level = compresslevel if compresslevel is not None else compress_level()
+    with zipfile.ZipFile(compiled.source) as source, zipfile.ZipFile(
+        target, "w", zipfile.ZIP_DEFLATED, compresslevel=level
+    ) as out:
+        for info in source.infolist():
+            part = compiled.parts.get(info.filename)
+            if part is None:
+                _copy_raw(source, info, out)
+                continue
+            part_started = time.perf_counter()
+            data = render_part(part, mapping)
+            render_s += time.perf_counter() - part_started
+            out.writestr(_clone_info(info), data, compresslevel=level)
+    render_ms = round(render_s * 1000, 3)
+    save_ms = round((time.perf_counter() - started - render_s) * 1000, 3)
+    record("fill.render", render_ms)
+    record("fill.save", save_ms)
+    if timings is not None:
+        timings["render_ms"] = render_ms
+        timings["save_ms"] = save_ms
+
+
+class MergeLayout(NamedTuple):
+    """``word/document.xml`` cut for mail merge: ``head`` + one ``body`` per record + ``tail`` (final sectPr)."""
+
+    head: bytes
+    body: CompiledPart
+    tail: bytes
+    doc_pr_stride: int  # 0 when the body has no drawings
+
+
+def merge_layout(compiled: CompiledTemplate, xml: bytes | None = None) -> MergeLayout:
+    """``xml`` is the raw main part, needed only when it has no placeholders (so it was not compiled)."""
+    part = compiled.parts.get(MAIN_PART) or CompiledPart(MAIN_PART, [xml or b""], [], [], {})
+    segments = list(part.segments)
+    opening = _BODY_OPEN_RE.search(segments[0])
+    if opening is None:
+        raise ValueError(f"{MAIN_PART} sem <w:body>")
+    head, segments[0] = segments[0][: opening.end()], segments[0][opening.end():]
+    last = segments[-1]
+    cut = last.rfind(b"<w:sectPr")
+    if cut < 0 or last.find(b"</w:p>", cut) >= 0:  # no sectPr, or only a paragraph's own
+        cut = last.rfind(b"</w:body>")
+    segments[-1], tail = last[:cut], last[cut:]
+    segments = [_W14_IDS_RE.sub(b"", segment) for segment in segments]
+    blocks = {
+        position: block._replace(segments=[_W14_IDS_RE.sub(b"", segment) for segment in block.segments])
+        for position, block in part.blocks.items()
+    }
+    ids = [int(match.group(2)) for segment in segments for match in _DOC_PR_RE.finditer(segment)]
+    ids += [
+        int(match.group(2))
+        for block in blocks.values()
+        for segment in block.segments
+        for match in _DOC_PR_RE.finditer(segment)
+    ]
+    body = CompiledPart(MAIN_PART, segments, part.slots, part.offsets, blocks)
+    return MergeLayout(head, body, tail, max(ids) + 1 if ids else 0)
+
+
+def _shift_drawing_ids(data: bytes, offset: int) -> bytes:
+    return _DOC_PR_RE.sub(lambda match: match.group(1) + str(int(match.group(2)) + offset).encode("ascii"), data)
+
+
+def render_merged(
+    compiled: CompiledTemplate,
+    mappings: Iterable[Dict[str, str]],
+    target: str | IO[bytes],
+    timings: Dict[str, float] | None = None,
+    compresslevel: int | None = None,
+) -> int:
+    """Write one package with the template body repeated for every mapping; returns how many were written.
+
+    The body is rendered per record and streamed into ``word/document.xml``, separated by page breaks.
+    Everything else exists once: styles, numbering and media are copied compressed, and headers, footers and
+    notes are rendered with the first record (so only values shared by all records belong there).
+    """
+    render_s = 0.0
+    started = time.perf_counter()
+    level = compresslevel if compresslevel is not None else compress_level()
+    records: Iterator[Dict[str, str]] = iter(mappings)
+    first = next(records, None)
+    if first is None:
+        raise ValueError("nenhum registro para mesclar")
+    count = 0
+    with zipfile.ZipFile(compiled.source) as source, zipfile.ZipFile(
+        target, "w", zipfile.ZIP_DEFLATED, compresslevel=level
+    ) as out:
+        for info in source.infolist():
+            if info.filename == MAIN_PART:
+                layout = merge_layout(compiled, None if MAIN_PART in compiled.parts else source.read(info))
+                clone = _clone_info(info)
+                clone.compress_type = zipfile.ZIP_DEFLATED
+                clone._compresslevel = level
+                with out.open(clone, "w", force_zip64=True) as stream:
+                    stream.write(layout.head)
+                    for mapping in itertools.chain((first,), records):
+                        part_started = time.perf_counter()
+                        body = render_part(layout.body, mapping)
+                        if layout.doc_pr_stride and count:
+                            body = _shift_drawing_ids(body, count * layout.doc_pr_stride)
+                        render_s += time.perf_counter() - part_started
+                        if count:
+                            stream.write(_PAGE_BREAK)
+                        stream.write(body)
+                        count += 1
+                    stream.write(layout.tail)
+                continue
+            part = compiled.parts.get(info.filename)
+            if part is None:
+                _copy_raw(source, info, out)
+                continue
+            part_started = time.perf_counter()
+            data = render_part(part, first)
+            render_s += time.perf_counter() - part_started
+            out.writestr(_clone_info(info), data, compresslevel=level)
+    render_ms = round(render_s * 1000, 3)
+    save_ms = round((time.perf_counter() - started - render_s) * 1000, 3)
+    record("merge.render", render_ms)
+    record("merge.save", save_ms)
+    if timings is not None:
+        timings["render_ms"] = render_ms
+        timings["save_ms"] = save_ms
+    return count
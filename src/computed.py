@@ -0,0 +1,346 @@
+"""Computed placeholders: values derived from other fields instead of being typed.
+
+The parser declares them in ``spec["computed"]`` from the placeholder names (``DIA_EXTENSO`` and friends come
+from one ``DATA_ATO``, ``VALOR_EXTENSO`` from ``VALOR``, ``{PLURAL_OUTORGANTE:o outorgante|os outorgantes}``
+agrees with the number of OUTORGANTE records). ``CollectionPlan.derive`` evaluates them once per record, in
+dependency order, after the inputs went through the usual validators; a value given explicitly wins. The
+formatters are pure and memoized, so a batch where every record has the same date or amount converts it once.
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from graphlib import CycleError, TopologicalSorter
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+from .validators import DATE_RE
+
+FORMATTER_CACHE_SIZE = 4096
+DATE_INPUT = "DATA_ATO"
+GENDER_FIELD = "SEXO"
+WORDS_SUFFIX = "_EXTENSO"
+AGREEMENT_KIND = "concordancia"
+
+# name -> (kind, input): the date fields every notarial act repeats, all derived from DATA_ATO.
+DATE_FIELDS: Dict[str, Tuple[str, str]] = {
+    "DIA_NUMERAL": ("dia", DATE_INPUT),
+    "DIA_EXTENSO": ("dia_extenso", "DIA_NUMERAL"),
+    "MES_NUMERAL": ("mes", DATE_INPUT),
+    "MES_EXTENSO": ("mes_extenso", DATE_INPUT),
+    "ANO_NUMERAL": ("ano", DATE_INPUT),
+    "ANO_EXTENSO": ("extenso", "ANO_NUMERAL"),
+}
+
+_UNITS = (
+    "zero", "um", "dois", "três", "quatro", "cinco", "seis", "sete", "oito", "nove", "dez",
+    "onze", "doze", "treze", "catorze", "quinze", "dezesseis", "dezessete", "dezoito", "dezenove",
+)
+_TENS = ("", "", "vinte", "trinta", "quarenta", "cinquenta", "sessenta", "setenta", "oitenta", "noventa")
+_HUNDREDS = (
+    "", "cento", "duzentos", "trezentos", "quatrocentos", "quinhentos", "seiscentos", "setecentos", "oitocentos",
+    "novecentos",
+)
+_SCALES = (("", ""), ("mil", "mil"), ("milhão", "milhões"), ("bilhão", "bilhões"), ("trilhão", "trilhões"))
+_MONTHS = (
+    "janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho", "agosto", "setembro", "outubro",
+    "novembro", "dezembro",
+)
+
+
+def _feminine(word: str) -> str:
+    if word in ("um", "dois"):
+        return "uma" if word == "um" else "duas"
+    return word[:-2] + "as" if word.endswith("entos") else word
+
+
+def _below_thousand(number: int, feminine: bool) -> str:
+    if number == 100:
+        return "cem"
+    hundreds, rest = divmod(number, 100)
+    words = [_HUNDREDS[hundreds]] if hundreds else []
+    if rest >= 20:
+        tens, units = divmod(rest, 10)
+        words.append(_TENS[tens])
+        if units:
+            words.append(_UNITS[units])
+    elif rest:
+        words.append(_UNITS[rest])
+    if feminine:
+        words = [_feminine(word) for word in words]
+    return " e ".join(words)
+
+
+@lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def number_words(number: int, feminine: bool = False) -> str:
+    """``1234`` -> ``"mil duzentos e trinta e quatro"``."""
+    if number < 0:
+        raise ValueError("número negativo")
+    if number == 0:
+        return "zero"
+    groups: List[Tuple[int, int]] = []
+    scale = 0
+    while number:
+        number, group = divmod(number, 1000)
+        if group:
+            groups.append((group, scale))
+        scale += 1
+    if scale > len(_SCALES):
+        raise ValueError("número grande demais")
+    groups.reverse()
+    text = ""
+    for position, (group, scale) in enumerate(groups):
+        if scale == 0:
+            words = _below_thousand(group, feminine)
+        elif scale == 1:
+            words = "mil" if group == 1 else f"{_below_thousand(group, feminine)} mil"
+        else:
+            singular, plural = _SCALES[scale]
+            words = f"{_below_thousand(group, False)} {singular if group == 1 else plural}"
+        if position == 0:
+            text = words
+        elif position == len(groups) - 1 and (group < 100 or group % 100 == 0):
+            text = f"{text} e {words}"
+        else:
+            text = f"{text} {words}"
+    return text
+
+
+@lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def parse_amount(value: str) -> Decimal | None:
+    """``"R$ 1.234,56"``, ``"1234.56"`` or ``"1.000"`` (Brazilian thousands) -> ``Decimal``."""
+    text = (value or "").replace("R$", "").replace(" ", "").strip()
+    if "," in text:
+        text = text.replace(".", "").replace(",", ".")
+    elif text.count(".") > 1 or (text.count(".") == 1 and len(text.rsplit(".", 1)[1]) == 3):
+        text = text.replace(".", "")
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() and amount >= 0 else None
+
+
+@lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def date_parts(value: str) -> Tuple[int, int, int] | None:
+    """``"05/03/2025"`` -> ``(5, 3, 2025)``; ``None`` for anything that is not a real dd/mm/aaaa date."""
+    value = (value or "").strip()
+    if not DATE_RE.match(value):
+        return None
+    day, month, year = (int(part) for part in value.split("/"))
+    try:
+        date(year, month, day)
+    except ValueError:
+        return None
+    return day, month, year
+
+
+def _integer(value: str) -> int | None:
+    amount = parse_amount(value)
+    return int(amount) if amount is not None and amount == amount.to_integral_value() else None
+
+
+@lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def words(value: str) -> str | None:
+    number = _integer(value)
+    return None if number is None else number_words(number)
+
+
+@lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def day_words(value: str) -> str | None:
+    number = _integer(value)
+    if number is None or not 1 <= number <= 31:
+        return None
+    return "primeiro" if number == 1 else number_words(number)
+
+
+@lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def amount_words(value: str) -> str | None:
+    """``"1.200,50"`` -> ``"mil e duzentos reais e cinquenta centavos"``."""
+    amount = parse_amount(value)
+    if amount is None:
+        return None
+    cents_total = int(amount.quantize(Decimal("0.01")) * 100)
+    reais, cents = divmod(cents_total, 100)
+    parts: List[str] = []
+    if reais:
+        unit = "real" if reais == 1 else "reais"
+        if reais >= 1_000_000 and reais % 1_000_000 == 0:
+            unit = "de reais"
+        parts.append(f"{number_words(reais)} {unit}")
+    if cents:
+        parts.append(f"{number_words(cents)} {'centavo' if cents == 1 else 'centavos'}")
+    return " e ".join(parts) or "zero real"
+
+
+@lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def currency(value: str) -> str | None:
+    """``"1234.5"`` -> ``"R$ 1.234,50"``."""
+    amount = parse_amount(value)
+    if amount is None:
+        return None
+    text = f"{amount.quantize(Decimal('0.01')):,.2f}"
+    return "R$ " + text.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _date_part(position: int, template: str) -> Callable[[str], str | None]:
+    @lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+    def formatter(value: str) -> str | None:
+        parts = date_parts(value)
+        return None if parts is None else template.format(parts[position])
+
+    return formatter
+
+
+@lru_cache(maxsize=FORMATTER_CACHE_SIZE)
+def _month_words(value: str) -> str | None:
+    parts = date_parts(value)
+    return None if parts is None else _MONTHS[parts[1] - 1]
+
+
+# kind -> formatter of one input value
+FORMATTERS: Dict[str, Callable[[str], str | None]] = {
+    "dia": _date_part(0, "{:02d}"),
+    "mes": _date_part(1, "{:02d}"),
+    "ano": _date_part(2, "{}"),
+    "dia_extenso": day_words,
+    "mes_extenso": _month_words,
+    "extenso": words,
+    "valor_extenso": amount_words,
+    "moeda": currency,
+}
+
+
+class ComputedField(NamedTuple):
+    name: str
+    kind: str
+    inputs: Tuple[str, ...]
+    entity: str | None = None  # concordancia: whose records are counted
+    forms: Tuple[str, ...] = ()  # concordancia: singular|plural or m.sing|f.sing|m.pl|f.pl
+
+
+def agreement_forms(hint: str | None) -> List[str] | None:
+    """``"o outorgante|os outorgantes"`` -> its 2 or 4 agreement forms; ``None`` for any other hint."""
+    forms = (hint or "").split("|")
+    return [form.strip() for form in forms] if len(forms) in (2, 4) else None
+
+
+def declare_computed(
+    placeholders: List[Dict[str, Any]], entity_of: Dict[str, str]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    """``(computed declarations, input fields to ask for)`` for the placeholders of one template.
+
+    ``entity_of`` maps each placeholder name to the entity the parser assigned it ("GLOBAL" for none).
+    """
+    names = {item["name"].casefold(): item["name"] for item in placeholders}
+    raws = {item["name"]: item["raw"] for item in placeholders}
+    declared: Dict[str, Dict[str, Any]] = {}
+    inputs: Dict[str, Dict[str, str]] = {}
+
+    def declare_date(name: str) -> None:
+        kind, source = DATE_FIELDS[name.upper()]
+        exact = names.get(name.casefold(), name)
+        if exact in declared:
+            return
+        declared[exact] = {"name": exact, "kind": kind, "inputs": [names.get(source.casefold(), source)]}
+        if source.upper() in DATE_FIELDS:
+            declare_date(source)
+        elif source.casefold() not in names:
+            inputs[source] = {"entity": "GLOBAL", "name": source, "placeholder": f"{{{source}}}", "input": True}
+
+    for item in placeholders:
+        name, hint = item["name"], item.get("hint") or ""
+        entity = entity_of.get(name, "GLOBAL")
+        if entity == "GLOBAL" and name.upper() in DATE_FIELDS:
+            declare_date(name)
+        elif entity == "GLOBAL" and name.upper().endswith(WORDS_SUFFIX):
+            source = names.get(name[: -len(WORDS_SUFFIX)].casefold())
+            if source is not None:
+                kind = "valor_extenso" if "VALOR" in source.upper() else "extenso"
+                declared.setdefault(name, {"name": name, "kind": kind, "inputs": [source]})
+        elif entity != "GLOBAL" and agreement_forms(hint) and name not in declared:
+            forms = agreement_forms(hint)
+            needs_gender = len(forms) == 4
+            gender = f"{GENDER_FIELD}_{entity}"
+            declared[name] = {
+                "name": name,
+                "kind": AGREEMENT_KIND,
+                "inputs": [gender] if needs_gender else [],
+                "entity": entity,
+                "forms": forms,
+            }
+            if needs_gender and gender.casefold() not in names:
+                inputs[gender] = {"entity": entity, "name": GENDER_FIELD, "placeholder": f"{{{gender}}}", "input": True}
+    for name, item in declared.items():
+        if name in raws:
+            item["placeholder"] = raws[name]
+    return list(declared.values()), list(inputs.values())
+
+
+def computed_fields(spec: Dict[str, Any]) -> List[ComputedField]:
+    """The spec's computed fields, ordered so every field comes after the computed fields it reads."""
+    fields: Dict[str, ComputedField] = {}
+    for item in spec.get("computed") or []:
+        inputs, forms = tuple(item.get("inputs") or ()), tuple(item.get("forms") or ())
+        fields[item["name"]] = ComputedField(item["name"], item["kind"], inputs, item.get("entity"), forms)
+    for field in fields.values():
+        if field.kind != AGREEMENT_KIND and field.kind not in FORMATTERS:
+            raise ValueError(f"campo calculado {field.name}: tipo desconhecido {field.kind!r}")
+    graph = {name: [source for source in field.inputs if source in fields] for name, field in fields.items()}
+    try:
+        order = list(TopologicalSorter(graph).static_order())
+    except CycleError as exc:
+        raise ValueError(f"campos calculados em ciclo: {exc.args[1]}") from exc
+    return [fields[name] for name in order]
+
+
+def _agreement(plan, field: ComputedField, mapping: Dict[str, str]) -> str | None:
+    bases = [item.name for item in plan.fields if item.entity == field.entity]
+    count = 0
+    while any(plan.key_for(base, field.entity, count + 1) in mapping for base in bases):
+        count += 1
+    if not count:
+        return None
+    plural = count > 1
+    if len(field.forms) == 2:
+        return field.forms[plural]
+    genders = [mapping.get(plan.key_for(GENDER_FIELD, field.entity, idx)) or "" for idx in range(1, count + 1)]
+    # Portuguese agreement: feminine only when every record is feminine.
+    feminine = all(gender.strip().casefold().startswith("f") for gender in genders)
+    return field.forms[2 * plural + feminine]
+
+
+class Derivation(NamedTuple):
+    field: ComputedField
+    key: str | None  # placeholder the value goes to; None for intermediate values (DIA_NUMERAL without a slot)
+    source_key: str | None
+
+
+def bind(plan) -> List[Derivation]:
+    """Resolve the placeholder keys of ``plan.computed`` once, so ``derive`` is dict lookups only."""
+    return [
+        Derivation(field, plan.resolve_key(field.name), plan.resolve_key(field.inputs[0]) if field.inputs else None)
+        for field in plan.computed
+    ]
+
+
+def derive(plan, mapping: Dict[str, str]) -> Dict[str, str]:
+    """``mapping`` plus the computed placeholders that are blank or missing and whose inputs are valid."""
+    if not plan.derivations:
+        return mapping
+    result = dict(mapping)
+    values: Dict[str, str] = {}
+    for field, key, source_key in plan.derivations:
+        given = result.get(key) if key is not None else None
+        if given:
+            values[field.name] = given
+            continue
+        if field.kind == AGREEMENT_KIND:
+            value = _agreement(plan, field, result)
+        else:
+            raw = values.get(field.inputs[0]) or (result.get(source_key) if source_key is not None else None)
+            value = FORMATTERS[field.kind](raw) if raw else None
+        if value is None:
+            continue
+        values[field.name] = value
+        if key is not None:
+            result[key] = value
+    return result
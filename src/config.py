@@ -1,18 +1,70 @@
-from pydantic import BaseModel
-from dotenv import load_dotenv
 import os
 
-load_dotenv()
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
-class Settings(BaseModel):
-    ROOT: str = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Paths already created by ``ensure_dir`` in this process.
+_CREATED: set = set()
+_ENV = {"loaded": False}
+
+
+def load_env() -> None:
+    """Read ``.env`` into ``os.environ`` the first time any setting needs the environment."""
+    if _ENV["loaded"]:
+        return
+    _ENV["loaded"] = True
+    path = os.path.join(ROOT, ".env")
+    if not os.path.exists(path):
+        return
+    from dotenv import load_dotenv
+
+    load_dotenv(path)
+
+
+def ensure_dir(path: str) -> str:
+    """Create ``path`` if needed (once per process) and return it; called by code that writes there."""
+    if path not in _CREATED:
+        os.makedirs(path, exist_ok=True)
+        _CREATED.add(path)
+    return path
+
+
+class Settings:
+    """Project paths, the local store and Ollama settings.
+
+    Importing this module has no side effects: environment values (and ``.env``) are read on
+    first access and directories are created by whoever writes into them (see ``ensure_dir``).
+    """
+
+    ROOT: str = ROOT
     TEMPLATES: str = os.path.join(ROOT, "templates")
     SPECS: str = os.path.join(ROOT, "specs")
     RESULTS: str = os.path.join(ROOT, "results")
+    INDEX_DIR: str = os.path.join(SPECS, ".index")
+
+    @property
+    def CACHE_DIR(self) -> str:
+        load_env()
+        return os.getenv("AGNODOCS_CACHE_DIR") or os.path.join(ROOT, ".cache", "fills")
+
+    @property
+    def LLM_CACHE_DIR(self) -> str:
+        load_env()
+        return os.getenv("AGNODOCS_LLM_CACHE_DIR") or os.path.join(ROOT, ".cache", "llm")
+
+    @property
+    def STORE_PATH(self) -> str:
+        load_env()
+        return os.getenv("AGNODOCS_STORE") or os.path.join(ROOT, ".data", "agnodocs.sqlite3")
+
+    @property
+    def OLLAMA_HOST(self) -> str | None:
+        load_env()
+        return os.getenv("OLLAMA_HOST") or None
+
+    @property
+    def OLLAMA_MODEL(self) -> str | None:
+        load_env()
+        return os.getenv("OLLAMA_MODEL") or None
 
-    OLLAMA_HOST: str | None = os.getenv("OLLAMA_HOST") or None
-    OLLAMA_MODEL: str | None = os.getenv("OLLAMA_MODEL") or None
 
 settings = Settings()
-for d in (settings.TEMPLATES, settings.SPECS, settings.RESULTS):
-    os.makedirs(d, exist_ok=True)
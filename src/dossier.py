@@ -0,0 +1,193 @@
+"""Dossier: one case record (the people of a deal plus the act data) filled into several templates at once.
+
+Case record (JSON)::
+
+    {
+      "id": "venda-rua-x",
+      "GLOBAL": {"DIA_EXTENSO": "dez", "ANO_NUMERAL": "2025"},
+      "OUTORGANTE": [{"NOME": "Ana", "CPF": "123.456.789-00"}, {"NOME": "Bruno"}],
+      "OUTORGADO": {"NOME": "Carla"}
+    }
+
+Entity lists are numbered from 1 and land on ``{NOME_OUTORGANTE_1}`` / ``{NOME_OUTORGANTE}`` through
+``CollectionPlan.key_for``; any other top-level string value is a global placeholder.
+"""
+import contextlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from .archive import DocxArchive
+from .config import settings
+from .logging_utils import setup_logger, jlog
+from .plan import CollectionPlan, bare_name, plan_for
+
+_SAFE_RE = re.compile(r"[^\w.-]+")
+
+
+class CaseValue(NamedTuple):
+    entity: str  # "GLOBAL" or the entity as written in the case record
+    idx: int
+    base: str  # field name without entity/index, e.g. "NOME"
+    value: str
+
+
+def load_case(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as handler:
+        case = json.load(handler)
+    if not isinstance(case, dict):
+        raise ValueError("o caso precisa ser um objeto JSON")
+    return case
+
+
+def flatten_case(case: Dict[str, Any]) -> List[CaseValue]:
+    """Every value of the case once, in a shape every spec can be resolved against."""
+    values: List[CaseValue] = []
+    for key, item in case.items():
+        if key == "id":
+            continue
+        if key.upper() == "GLOBAL" and isinstance(item, dict):
+            values.extend(CaseValue("GLOBAL", 1, bare_name(name), _text(value)) for name, value in item.items())
+        elif isinstance(item, (dict, list)):
+            records = [item] if isinstance(item, dict) else item
+            for idx, record in enumerate(records, 1):
+                if not isinstance(record, dict):
+                    raise ValueError(f"{key}[{idx}] não é um objeto JSON")
+                values.extend(CaseValue(key, idx, bare_name(name), _text(value)) for name, value in record.items())
+        else:
+            values.append(CaseValue("GLOBAL", 1, bare_name(key), _text(item)))
+    return values
+
+
+def _text(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def mapping_for(plan: CollectionPlan, values: List[CaseValue]) -> Tuple[Dict[str, str], int]:
+    """``({PLACEHOLDER}: value)`` for one spec, plus how many case values it has no placeholder for."""
+    mapping: Dict[str, str] = {}
+    unused = 0
+    for item in values:
+        if item.entity == "GLOBAL":
+            key = plan.resolve_key(item.base)
+        else:
+            key = plan.key_for(item.base, item.entity, item.idx)
+        if key is None:
+            unused += 1
+        else:
+            mapping[key] = item.value
+    return mapping, unused
+
+
+def case_id(case: Dict[str, Any], case_path: str) -> str:
+    raw = str(case.get("id") or "").strip() or os.path.splitext(os.path.basename(case_path))[0]
+    return _SAFE_RE.sub("_", raw).strip("._") or "caso"
+
+
+def _fill(template_path: str, mapping: Dict[str, str], out_dir: str, out_name: str, as_bytes: bool, cache) -> Dict:
+    from .filler import fill_docx, fill_docx_bytes
+
+    started = time.perf_counter()
+    hits = cache.hits if cache is not None else 0
+    if as_bytes:
+        result = {"name": out_name, "data": fill_docx_bytes(template_path, mapping, cache=cache)}
+    else:
+        result = {"out": fill_docx(template_path, mapping, out_name=out_name, out_dir=out_dir, cache=cache)}
+    result["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    if cache is not None:
+        result["cache"] = "hit" if cache.hits > hits else "miss"
+    return result
+
+
+def run_dossier(
+    case: Dict[str, Any],
+    specs: List[Dict[str, Any]],
+    case_name: str,
+    out_dir: str | None = None,
+    archive_path: str | None = None,
+    workers: int = 4,
+    strict: bool = False,
+    cache=None,
+) -> List[Dict[str, Any]]:
+    """Fill every spec in ``specs`` from ``case``; returns one result dict per spec, in ``specs`` order.
+
+    The case is flattened once and each spec resolves it through its (cached) plan; fills share the
+    process's compiled templates and run on a thread pool. With ``strict`` a template with invalid
+    fields is skipped, the others are still generated.
+    """
+    from .compiled import get_compiled
+
+    logger = setup_logger()
+    values = flatten_case(case)
+    out_dir = out_dir or os.path.join(settings.RESULTS, f"{case_name}_dossie")
+    if archive_path is None:
+        os.makedirs(out_dir, exist_ok=True)
+    jlog(logger, "INFO", "DOSSIER_START", case=case_name, templates=len(specs), values=len(values), workers=workers)
+    started = time.perf_counter()
+
+    results: List[Dict[str, Any]] = [{} for _ in specs]
+    jobs: List[Tuple[int, str, Dict[str, str], str]] = []
+    for position, spec in enumerate(specs):
+        slug = spec["name"]
+        plan = plan_for(spec)
+        mapping, unused = mapping_for(plan, values)
+        check = plan.check_record(mapping)
+        filled = sum(1 for value in check.mapping.values() if value)
+        results[position] = {"slug": slug, "placeholders": len(spec.get("all_placeholders", [])), "filled": filled}
+        if check.errors:
+            jlog(logger, "WARN", "DOSSIER_INVALID_FIELDS", case=case_name, slug=slug, fields=check.errors)
+            if strict:
+                results[position].update(status="error", error="campos inválidos", fields=check.errors)
+                continue
+        jlog(logger, "INFO", "DOSSIER_RESOLVE", case=case_name, slug=slug, filled=filled, unused=unused)
+        template_path = os.path.join(settings.TEMPLATES, spec["source"])
+        jobs.append((position, template_path, check.mapping, f"{slug}_preenchido.docx"))
+
+    archive = DocxArchive(archive_path) if archive_path else None
+    # As in ``batch.run_batch``: the archive is closed after the pool, even on error, so the zip is never truncated.
+    with (
+        archive or contextlib.nullcontext(),
+        ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="dossier") as pool,
+    ):
+        # Load each distinct template once, up front, so concurrent fills never compile the same one twice;
+        # a broken template is logged here and its own fill below reports the error.
+        for template_path in dict.fromkeys(job[1] for job in jobs):
+            try:
+                get_compiled(template_path)
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+                jlog(logger, "WARN", "DOSSIER_WARM_FAIL", case=case_name, template=template_path, error=error)
+        futures = {
+            pool.submit(_fill, template_path, mapping, out_dir, out_name, archive is not None, cache): position
+            for position, template_path, mapping, out_name in jobs
+        }
+        for future in as_completed(futures):
+            result = results[futures[future]]
+            try:
+                output = future.result()
+            except Exception as exc:  # one broken template must not sink the dossier
+                result.update(status="error", error=f"{type(exc).__name__}: {exc}")
+                jlog(logger, "WARN", "DOSSIER_FILL_FAIL", case=case_name, slug=result["slug"], error=result["error"])
+                continue
+            if archive is not None:
+                entry = archive.add_bytes(output.pop("name"), output.pop("data"), slug=result["slug"])
+                output["out"] = f"{archive_path}!{entry['name']}"
+                output["sha256"] = entry["sha256"]
+            result.update(status="ok", **output)
+
+    elapsed = time.perf_counter() - started
+    ok = sum(1 for result in results if result.get("status") == "ok")
+    jlog(
+        logger,
+        "INFO",
+        "DOSSIER_DONE",
+        case=case_name,
+        ok=ok,
+        error=len(results) - ok,
+        seconds=round(elapsed, 3),
+        out=archive_path or out_dir,
+    )
+    return results
@@ -1,28 +1,111 @@
-from docx import Document
-from typing import Dict
+from typing import Dict, IO, Iterable, Tuple
+import io
 import os
-from .config import settings
+import shutil
+import threading
+from .config import ensure_dir, settings
+from .compiled import get_compiled, render_docx, render_merged
+from .output_cache import OutputCache
+from .timing import Span
 
-def replace_runs(paragraph, mapping: Dict[str, str]):
-    for i, run in enumerate(paragraph.runs):
-        t = run.text or ""
-        for k, v in mapping.items():
-            if k in t:
-                t = t.replace(k, v)
-        run.text = t
+def fill_docx(
+    template_path: str,
+    mapping: Dict[str, str],
+    out_name: str | None = None,
+    out_dir: str | None = None,
+    timings: Dict[str, float] | None = None,
+    cache: OutputCache | None = None,
+) -> str:
+    """Fill ``template_path`` into ``out_dir``/``out_name`` (atomically); ``timings`` receives per-phase ms.
 
-def fill_docx(template_path: str, mapping: Dict[str, str], out_name: str | None = None) -> str:
-    doc = Document(template_path)
-    for p in doc.paragraphs:
-        replace_runs(p, mapping)
-    for tbl in doc.tables:
-        for row in tbl.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    replace_runs(p, mapping)
+    With an ``OutputCache`` a document already generated from the same template bytes and data is
+    copied from the cache instead of being filled again (``timings["cache"]`` says which happened).
+    """
     if not out_name:
         base = os.path.splitext(os.path.basename(template_path))[0]
         out_name = f"{base}_preenchido.docx"
-    out_path = os.path.join(settings.RESULTS, out_name)
-    doc.save(out_path)
+    out_path = os.path.join(out_dir or ensure_dir(settings.RESULTS), out_name)
+    cached = None
+    if cache is not None:
+        key = cache.key(template_path, mapping)
+        cached = cache.lookup(key)
+        if timings is not None:
+            timings["cache"] = "miss" if cached is None else "hit"
+    # Written next to the target and renamed, so a crash never leaves a truncated .docx behind.
+    tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if cached is not None:
+        try:
+            shutil.copyfile(cached, tmp_path)
+            os.replace(tmp_path, out_path)
+            return out_path
+        except BaseException as exc:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if not isinstance(exc, FileNotFoundError):
+                raise
+        # Evicted by another process between lookup and copy: fill it as a miss.
+        if timings is not None:
+            timings["cache"] = "miss"
+    with Span("fill.load") as load_span:
+        compiled = get_compiled(template_path)
+    if timings is not None:
+        timings["load_ms"] = load_span.ms
+    try:
+        render_docx(compiled, mapping, tmp_path, timings=timings)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if cache is not None:
+        cache.store_file(key, out_path)
     return out_path
+
+def merge_docx(
+    template_path: str,
+    mappings: Iterable[Dict[str, str]],
+    out_name: str | None = None,
+    out_dir: str | None = None,
+    timings: Dict[str, float] | None = None,
+) -> Tuple[str, int]:
+    """Mail merge: one document with the template body filled once per mapping, written atomically.
+
+    ``mappings`` is consumed lazily, so records can be streamed from disk. Returns the path and record count.
+    """
+    if not out_name:
+        base = os.path.splitext(os.path.basename(template_path))[0]
+        out_name = f"{base}_mesclado.docx"
+    out_path = os.path.join(out_dir or ensure_dir(settings.RESULTS), out_name)
+    tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with Span("fill.load") as load_span:
+        compiled = get_compiled(template_path)
+    if timings is not None:
+        timings["load_ms"] = load_span.ms
+    try:
+        count = render_merged(compiled, mappings, tmp_path, timings=timings)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return out_path, count
+
+def fill_docx_to(template_path: str, mapping: Dict[str, str], target: IO[bytes]) -> None:
+    """Write the filled document to any writable binary stream (BytesIO, pipe, socket file)."""
+    render_docx(get_compiled(template_path), mapping, target)
+
+def fill_docx_bytes(template_path: str, mapping: Dict[str, str], cache: OutputCache | None = None) -> bytes:
+    if cache is not None:
+        key = cache.key(template_path, mapping)
+        cached = cache.lookup(key)
+        if cached is not None:
+            try:
+                with open(cached, "rb") as handler:
+                    return handler.read()
+            except FileNotFoundError:
+                pass  # evicted since the lookup; fill it again
+    buffer = io.BytesIO()
+    fill_docx_to(template_path, mapping, buffer)
+    if cache is not None:
+        cache.store(key, buffer.getvalue())
+    return buffer.getvalue()
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+from . import spec_repo, timing
+from .config import settings
+from .logging_utils import setup_logger, jlog
+from .parser import PARSER_VERSION
+from .search import search_path, write_search_index
+
+MANIFEST_NAME = "manifest.json"
+
+
+def manifest_path() -> str:
+    return os.path.join(settings.INDEX_DIR, MANIFEST_NAME)
+
+
+def load_manifest() -> Dict[str, Any]:
+    try:
+        with open(manifest_path(), "r", encoding="utf-8") as handler:
+            manifest = json.load(handler)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault("parser_version", None)
+    manifest.setdefault("templates", {})
+    return manifest
+
+
+def save_manifest(manifest: Dict[str, Any]) -> str:
+    path = manifest_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handler:
+        json.dump(manifest, handler, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handler:
+        for chunk in iter(lambda: handler.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_templates() -> List[str]:
+    if not os.path.isdir(settings.TEMPLATES):
+        return []
+    return sorted(name for name in os.listdir(settings.TEMPLATES) if name.lower().endswith(".docx"))
+
+
+def _index_one(filename: str) -> Dict[str, Any]:
+    from . import parser as myparser
+    from .compiled import compile_docx, save_compiled
+
+    logger = setup_logger()
+    started = time.perf_counter()
+    path = os.path.join(settings.TEMPLATES, filename)
+    spec = myparser.build_spec_from_docx(path)
+    spec_path = spec_repo.save_spec(spec)
+    jlog(logger, "INFO", "INDEX_SAVE_SPEC", file=filename, spec_path=spec_path)
+    compiled_out = save_compiled(compile_docx(path, only_parts=spec["meta"]["parts"]))
+    jlog(logger, "INFO", "INDEX_SAVE_COMPILED", file=filename, compiled_path=compiled_out)
+    return {
+        "file": filename,
+        "spec_path": spec_path,
+        "seconds": round(time.perf_counter() - started, 4),
+        "spans": timing.drain(),
+    }
+
+
+def _entry_matches_stat(entry: Dict[str, Any] | None, stat: os.stat_result) -> bool:
+    return bool(entry) and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns
+
+
+def check_index() -> List[Dict[str, str]]:
+    """Stale entries, decided from ``stat`` calls only (no hashing, no parsing)."""
+    manifest = load_manifest()
+    entries = manifest["templates"]
+    stale: List[Dict[str, str]] = []
+    if manifest["parser_version"] != PARSER_VERSION:
+        stale.append({"file": "*", "reason": "parser_version"})
+    files = list_templates()
+    for filename in files:
+        entry = entries.get(filename)
+        if entry is None:
+            stale.append({"file": filename, "reason": "new"})
+            continue
+        stat = os.stat(os.path.join(settings.TEMPLATES, filename))
+        if not _entry_matches_stat(entry, stat):
+            stale.append({"file": filename, "reason": "changed"})
+        elif not os.path.exists(entry.get("spec_path") or ""):
+            stale.append({"file": filename, "reason": "missing_spec"})
+    for filename in sorted(set(entries) - set(files)):
+        stale.append({"file": filename, "reason": "deleted"})
+    return stale
+
+
+def _prune(filename: str, entry: Dict[str, Any]) -> None:
+    from .compiled import compiled_path
+
+    for path in (entry.get("spec_path"), compiled_path(filename)):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def index_templates(force: bool = False, workers: int | None = None) -> Dict[str, Any]:
+    logger = setup_logger()
+    started = time.perf_counter()
+    manifest = load_manifest()
+    entries: Dict[str, Any] = manifest["templates"]
+    version_changed = manifest["parser_version"] != PARSER_VERSION
+    files = list_templates()
+
+    to_build: List[str] = []
+    fingerprints: Dict[str, Dict[str, Any]] = {}
+    skipped: List[str] = []
+    for filename in files:
+        path = os.path.join(settings.TEMPLATES, filename)
+        stat = os.stat(path)
+        entry = entries.get(filename)
+        spec_ok = bool(entry) and os.path.exists(entry.get("spec_path") or "")
+        fresh = not force and not version_changed and spec_ok
+        if fresh and _entry_matches_stat(entry, stat):
+            skipped.append(filename)
+            continue
+        sha = file_sha256(path)
+        fingerprints[filename] = {"sha256": sha, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if fresh and entry.get("sha256") == sha:
+            # Touched but identical content: only refresh the stat fingerprint.
+            entry.update(fingerprints[filename])
+            skipped.append(filename)
+            continue
+        to_build.append(filename)
+
+    for filename in skipped:
+        jlog(logger, "INFO", "INDEX_SKIP", file=filename)
+
+    built: List[Dict[str, Any]] = []
+    failed: List[Dict[str, str]] = []
+    if to_build:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(to_build)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {filename: pool.submit(_index_one, filename) for filename in to_build}
+            for filename, future in futures.items():
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    jlog(logger, "ERROR", "INDEX_FAIL", file=filename, error=f"{type(exc).__name__}: {exc}")
+                    failed.append({"file": filename, "error": str(exc)})
+                    entries.pop(filename, None)
+                    continue
+                timing.merge(result.pop("spans"))
+                entries[filename] = {**fingerprints[filename], "spec_path": result["spec_path"]}
+                built.append(result)
+
+    pruned: List[str] = []
+    for filename in sorted(set(entries) - set(files)):
+        _prune(filename, entries.pop(filename))
+        jlog(logger, "INFO", "INDEX_PRUNE", file=filename)
+        pruned.append(filename)
+
+    manifest["parser_version"] = PARSER_VERSION
+    save_manifest(manifest)
+    if built or pruned or not os.path.exists(spec_repo.catalog_path()):
+        jlog(logger, "INFO", "INDEX_SAVE_CATALOG", catalog_path=spec_repo.write_catalog())
+    if built or pruned or not os.path.exists(search_path()):
+        jlog(logger, "INFO", "INDEX_SAVE_SEARCH", search_path=write_search_index())
+    summary = {
+        "built": built,
+        "skipped": skipped,
+        "pruned": pruned,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    jlog(
+        logger,
+        "INFO",
+        "INDEX_DONE",
+        built=len(built),
+        skipped=len(skipped),
+        pruned=len(pruned),
+        failed=len(failed),
+        seconds=summary["seconds"],
+    )
+    return summary
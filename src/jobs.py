@@ -0,0 +1,285 @@
+"""Resumable, sharded fill jobs.
+
+``job.json`` fixes the input file and splits its records into N shards by a stable hash of the record key,
+so every machine running ``job-run --shard i`` agrees on who fills what. Each shard appends one line per
+finished record to its own ledger (``ledger/shard-<i>.jsonl``); a restarted shard skips the keys the ledger
+already has as ``ok`` and retries the rest. Ledger lines are flushed as they are written (so ``job-status``
+sees them live) and fsynced in batches.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List
+
+from . import timing
+from .batch import fill_one, init_worker, iter_keyed_records
+from .config import settings
+from .logging_utils import setup_logger, jlog
+from .plan import plan_for
+
+JOB_NAME = "job.json"
+JOB_VERSION = 1
+LEDGER_SYNC_EVERY = 64
+LEDGER_SYNC_SECONDS = 1.0
+
+
+def shard_of(key: str, shards: int) -> int:
+    """Stable across processes and machines (unlike ``hash()``, which is salted per process)."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def _data_sha256(path: str) -> str:
+    from .indexer import file_sha256
+
+    return file_sha256(path)
+
+
+def create_job(
+    slug: str, data_path: str, shards: int, key_field: str | None = None, job_dir: str | None = None
+) -> str:
+    """Write ``job.json`` (with the record count of every shard) and return its path."""
+    if shards < 1:
+        raise ValueError("shards precisa ser >= 1")
+    job_dir = os.path.abspath(job_dir or os.path.join(settings.RESULTS, f"{slug}_job"))
+    counts = [0] * shards
+    for _, key, _, _ in iter_keyed_records(data_path, key_field):
+        counts[shard_of(key, shards)] += 1
+    job = {
+        "version": JOB_VERSION,
+        "slug": slug,
+        "data": os.path.abspath(data_path),
+        "data_size": os.path.getsize(data_path),
+        "data_sha256": _data_sha256(data_path),
+        "key_field": key_field,
+        "shards": shards,
+        "counts": counts,
+        "out_dir": os.path.join(job_dir, "docs"),
+        "created": time.time(),
+    }
+    os.makedirs(job_dir, exist_ok=True)
+    path = os.path.join(job_dir, JOB_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handler:
+        json.dump(job, handler, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_job(job_path: str) -> Dict[str, Any]:
+    if os.path.isdir(job_path):
+        job_path = os.path.join(job_path, JOB_NAME)
+    with open(job_path, "r", encoding="utf-8") as handler:
+        job = json.load(handler)
+    if job.get("version") != JOB_VERSION:
+        raise ValueError(f"versão de job não suportada: {job.get('version')}")
+    job["dir"] = os.path.dirname(os.path.abspath(job_path))
+    return job
+
+
+def ledger_path(job: Dict[str, Any], shard: int) -> str:
+    return os.path.join(job["dir"], "ledger", f"shard-{shard:03d}.jsonl")
+
+
+class Ledger:
+    """Append-only JSONL progress log; every line is flushed, fsync happens every N lines or T seconds."""
+
+    def __init__(self, path: str, sync_every: int = LEDGER_SYNC_EVERY, sync_seconds: float = LEDGER_SYNC_SECONDS):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_seconds = sync_seconds
+        self._handler = open(path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self._handler.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._handler.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every or time.monotonic() - self._synced_at >= self.sync_seconds:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._unsynced:
+            os.fsync(self._handler.fileno())
+            self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self) -> None:
+        if not self._handler.closed:
+            self.sync()
+            self._handler.close()
+
+    def __enter__(self) -> "Ledger":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def read_ledger(path: str) -> List[Dict[str, Any]]:
+    """Ledger entries; a torn last line (crash mid-write) is ignored."""
+    entries: List[Dict[str, Any]] = []
+    try:
+        with open(path, "r", encoding="utf-8") as handler:
+            for line in handler:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def shard_status(job: Dict[str, Any], shard: int) -> Dict[str, Any]:
+    """Counts and throughput of one shard, from its ledger only (safe while the shard is running)."""
+    entries = read_ledger(ledger_path(job, shard))
+    last: Dict[str, str] = {}
+    run_started = run_done = None
+    last_at = None
+    for entry in entries:
+        if entry.get("event") == "start":
+            run_started, run_done = entry["t"], 0
+            continue
+        last[entry["key"]] = entry["status"]
+        last_at = entry["t"]
+        if run_started is not None:
+            run_done += 1
+    done = sum(1 for status in last.values() if status == "ok")
+    failed = len(last) - done
+    total = job["counts"][shard]
+    status = {"shard": shard, "total": total, "done": done, "failed": failed, "pending": max(0, total - len(last))}
+    if run_started is not None and last_at is not None and last_at > run_started:
+        status["docs_per_s"] = round(run_done / (last_at - run_started), 2)
+    return status
+
+
+def job_status(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [shard_status(job, shard) for shard in range(job["shards"])]
+
+
+def run_shard(
+    job: Dict[str, Any],
+    shard: int,
+    workers: int | None = None,
+    max_tasks_per_child: int = 200,
+    strict: bool = False,
+    cache=None,
+    fuzzy: float | None = None,
+    store=None,
+) -> Dict[str, int]:
+    """Fill the records of ``shard`` not yet ``ok`` in its ledger; returns this run's ok/error/skipped counts.
+
+    ``fuzzy`` and ``store`` work as in ``batch.run_batch`` (loose column names; parties and fills recorded in
+    the local store). Shards on different machines should each use their own store file.
+    """
+    from . import spec_repo
+
+    if not 0 <= shard < job["shards"]:
+        raise ValueError(f"shard fora do intervalo 0..{job['shards'] - 1}: {shard}")
+    if os.path.getsize(job["data"]) != job["data_size"] or _data_sha256(job["data"]) != job["data_sha256"]:
+        raise ValueError(f"o arquivo de dados mudou desde a criação do job: {job['data']}")
+    logger = setup_logger()
+    spec = spec_repo.load_spec(job["slug"])
+    plan = plan_for(spec)
+    template_path = os.path.join(settings.TEMPLATES, spec["source"])
+    out_dir = job["out_dir"]
+    os.makedirs(out_dir, exist_ok=True)
+    path = ledger_path(job, shard)
+    done = {entry["key"] for entry in read_ledger(path) if entry.get("status") == "ok"}
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4
+    totals = {"ok": 0, "error": 0, "skipped": 0}
+    matcher = None
+    if fuzzy is not None:
+        from .keymatch import matcher_for
+
+        matcher = matcher_for(spec, fuzzy)
+    logged_resolutions: set = set()
+    # key -> mapping of records in flight, only kept when the store needs it once the fill is done
+    in_flight: Dict[str, Dict[str, str]] = {}
+
+    jlog(logger, "INFO", "JOB_SHARD_START", slug=job["slug"], shard=shard, already_done=len(done), workers=workers)
+    started = time.perf_counter()
+    with Ledger(path) as ledger, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(template_path, cache),
+        max_tasks_per_child=max_tasks_per_child,
+    ) as pool:
+        ledger.append({"event": "start", "t": time.time(), "pid": os.getpid(), "host": os.uname().nodename})
+
+        def record_result(result: Dict[str, Any]) -> None:
+            timing.merge(result.pop("spans", {}))
+            totals[result["status"]] += 1
+            mapping = in_flight.pop(result["key"], None)
+            if store is not None and mapping is not None and result["status"] == "ok":
+                from .store import remember_fill
+
+                remember_fill(store, spec, template_path, mapping, result["out"], {"ms": result.get("ms")})
+            ledger.append({**result, "t": time.time()})
+            if result["status"] != "ok":
+                jlog(logger, "WARN", "JOB_RECORD_FAIL", shard=shard, key=result["key"], error=result.get("error"))
+
+        def drain(block_until: int) -> None:
+            nonlocal pending
+            while len(pending) > block_until:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record_result(future.result())
+
+        pending: set = set()
+        for line_no, key, record, error in iter_keyed_records(job["data"], job["key_field"]):
+            if shard_of(key, job["shards"]) != shard:
+                continue
+            if key in done:
+                totals["skipped"] += 1
+                continue
+            if error is not None:
+                record_result({"key": key, "status": "error", "error": error, "line": line_no})
+                continue
+            if matcher is not None:
+                record, resolution = matcher.remap(record)
+                if id(resolution) not in logged_resolutions:  # once per distinct set of columns
+                    logged_resolutions.add(id(resolution))
+                    renamed = {k: v for k, v in resolution.matches.items() if k != v}
+                    jlog(
+                        logger,
+                        "INFO",
+                        "JOB_KEY_MATCH",
+                        shard=shard,
+                        matched=renamed,
+                        ambiguous=resolution.ambiguous,
+                        unmatched=[k for k in resolution.unmatched if k != job["key_field"]],
+                    )
+            check = plan.check_record(record)
+            if check.errors and strict:
+                record_result(
+                    {"key": key, "status": "error", "error": "campos inválidos", "line": line_no, "fields": check.errors}
+                )
+                continue
+            out_name = f"{job['slug']}_{key}_preenchido.docx"
+            if store is not None:
+                in_flight[key] = check.mapping
+            pending.add(pool.submit(fill_one, key, check.mapping, out_dir, out_name, False))
+            drain(max_pending)
+        drain(0)
+
+    elapsed = time.perf_counter() - started
+    jlog(
+        logger,
+        "INFO",
+        "JOB_SHARD_DONE",
+        slug=job["slug"],
+        shard=shard,
+        ok=totals["ok"],
+        error=totals["error"],
+        skipped=totals["skipped"],
+        seconds=round(elapsed, 3),
+        ledger=path,
+    )
+    return totals
@@ -0,0 +1,163 @@
+"""Map loosely written input keys (CRM exports, spreadsheets) onto a spec's placeholders.
+
+``nome_outorgante``, ``CPF Outorgado 2`` or ``Profissão-Outorgante`` resolve to ``{NOME_OUTORGANTE}``,
+``{CPF_OUTORGADO_2}`` and ``{PROFISSAO_OUTORGANTE}``: exact match after normalization first, then one
+vectorized ``rapidfuzz.process.cdist`` call for every key left over.
+"""
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+from .plan import plan_for
+
+DEFAULT_THRESHOLD = 85.0
+# A runner-up within this many points of the best candidate makes the key ambiguous.
+AMBIGUITY_MARGIN = 3.0
+MATCHER_CACHE_SIZE = 256
+MEMO_SIZE = 1024
+
+_SEP_RE = re.compile(r"[\s_\-./]+")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def normalize_key(key: str) -> str:
+    """``"{CPF_Outorgado:hint}"`` / ``"cpf-outorgado"`` -> ``"cpf outorgado"``."""
+    key = key.strip()
+    if key.startswith("{") and key.endswith("}"):
+        key = key[1:-1].split(":", 1)[0]
+    key = "".join(ch for ch in unicodedata.normalize("NFKD", key) if not unicodedata.combining(ch))
+    return _SEP_RE.sub(" ", key.casefold()).strip()
+
+
+def _numbers(normalized: str) -> Tuple[str, ...]:
+    return tuple(str(int(number)) for number in _DIGITS_RE.findall(normalized))
+
+
+def _same_index(query: Tuple[str, ...], choice: Tuple[str, ...]) -> bool:
+    # "CPF Outorgado 2" must never land on {CPF_OUTORGADO_1}; unnumbered and "_1" both mean record 1, either way
+    # round (``plan.key_for`` also fills record 1 into a bare {CPF_OUTORGADO}).
+    return query == choice or {query, choice} == {(), ("1",)}
+
+
+class KeyResolution(NamedTuple):
+    matches: Dict[str, str]  # input key -> exact "{PLACEHOLDER}"
+    scores: Dict[str, float]  # input key -> similarity (100 for exact matches)
+    ambiguous: Dict[str, List[str]]  # input key -> equally good placeholders, or the one several keys compete for
+    unmatched: List[str]
+
+
+class KeyMatcher:
+    """Precomputed placeholder index of one spec; resolutions are memoized per set of input keys."""
+
+    def __init__(self, spec: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD):
+        self.plan = plan_for(spec)
+        self.threshold = threshold
+        inputs = [
+            field["placeholder"].strip("{}")
+            for group in spec.get("groups", [])
+            for field in group.get("fields", [])
+            if field.get("input")
+        ]
+        self.names: List[str] = list(dict.fromkeys([*spec.get("all_placeholders", []), *inputs]))
+        self.choices: List[str] = [normalize_key(name) for name in self.names]
+        self._numbers = [_numbers(choice) for choice in self.choices]
+        self._exact: Dict[str, List[str]] = {}
+        for name, choice in zip(self.names, self.choices):
+            self._exact.setdefault(choice, []).append(name)
+        self._memo: Dict[Tuple[str, ...], KeyResolution] = {}
+
+    def _key(self, name: str) -> str:
+        return self.plan.resolve_key(name) or f"{{{name}}}"
+
+    def resolve(self, keys: Iterable[str]) -> KeyResolution:
+        keys = tuple(keys)
+        cached = self._memo.get(keys)
+        if cached is not None:
+            return cached
+        matches: Dict[str, str] = {}
+        scores: Dict[str, float] = {}
+        ambiguous: Dict[str, List[str]] = {}
+        unmatched: List[str] = []
+        pending: List[Tuple[str, str]] = []
+        for key in keys:
+            normalized = normalize_key(key)
+            exact = self._exact.get(normalized)
+            if exact and len(exact) == 1:
+                matches[key], scores[key] = self._key(exact[0]), 100.0
+            elif exact:
+                ambiguous[key] = [self._key(name) for name in exact]
+            elif normalized and self.choices:
+                pending.append((key, normalized))
+            else:
+                unmatched.append(key)
+
+        if pending:
+            from rapidfuzz import fuzz, process
+
+            matrix = process.cdist(
+                [normalized for _, normalized in pending],
+                self.choices,
+                scorer=fuzz.token_sort_ratio,
+                score_cutoff=self.threshold,
+                dtype="float32",
+            )
+            for (key, normalized), row in zip(pending, matrix):
+                query_numbers = _numbers(normalized)
+                candidates = [
+                    (float(row[idx]), self.names[idx])
+                    for idx in row.nonzero()[0]
+                    if _same_index(query_numbers, self._numbers[idx])
+                ]
+                if not candidates:
+                    unmatched.append(key)
+                    continue
+                candidates.sort(key=lambda item: -item[0])
+                best_score, best_name = candidates[0]
+                rivals = [name for score, name in candidates[1:] if score >= best_score - AMBIGUITY_MARGIN]
+                if rivals:
+                    ambiguous[key] = [self._key(name) for name in (best_name, *rivals)]
+                else:
+                    matches[key], scores[key] = self._key(best_name), round(best_score, 1)
+
+        # Two input keys landing on one placeholder ("Nome" and "NOME", or a fuzzy and an exact hit): neither wins.
+        sources: Dict[str, List[str]] = {}
+        for key, target in matches.items():
+            sources.setdefault(target, []).append(key)
+        for target, keys_for_target in sources.items():
+            if len(keys_for_target) > 1:
+                for key in keys_for_target:
+                    del matches[key], scores[key]
+                    ambiguous[key] = [target]
+
+        resolution = KeyResolution(matches, scores, ambiguous, unmatched)
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[keys] = resolution
+        return resolution
+
+    def remap(self, record: Dict[str, Any]) -> Tuple[Dict[str, Any], KeyResolution]:
+        """``record`` with every resolved key renamed to its placeholder; ambiguous keys are left out (they would
+        still reach a placeholder through ``check_record``), unmatched ones are kept as they are."""
+        resolution = self.resolve(record.keys())
+        remapped: Dict[str, Any] = {}
+        for key, value in record.items():
+            if key not in resolution.ambiguous:
+                remapped[resolution.matches.get(key, key)] = value
+        return remapped, resolution
+
+
+# spec name -> (spec dict, threshold, matcher); same identity check as ``plan_for``.
+_MATCHERS: "OrderedDict[str, Tuple[Dict[str, Any], float, KeyMatcher]]" = OrderedDict()
+
+
+def matcher_for(spec: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> KeyMatcher:
+    cached = _MATCHERS.get(spec["name"])
+    if cached is not None and cached[0] is spec and cached[1] == threshold:
+        _MATCHERS.move_to_end(spec["name"])
+        return cached[2]
+    matcher = KeyMatcher(spec, threshold)
+    _MATCHERS[spec["name"]] = (spec, threshold, matcher)
+    while len(_MATCHERS) > MATCHER_CACHE_SIZE:
+        _MATCHERS.popitem(last=False)
+    return matcher
@@ -0,0 +1,194 @@
+"""Fill a spec's fields from free text (client qualification paragraphs) with a local Ollama model.
+
+One model call per group (a whole entity with all its records, or the act data), groups run
+concurrently, responses are cached on disk and every value goes through ``validators``.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from .config import ensure_dir, settings
+from .logging_utils import setup_logger, jlog
+from .plan import plan_for
+
+PROMPT_VERSION = 1
+SYSTEM_PROMPT = (
+    "Você extrai dados de qualificação de partes em documentos notariais brasileiros. "
+    "Responda só com JSON no formato pedido. Use exatamente o texto que aparece na entrada; "
+    "se um campo não aparecer, devolva string vazia. Não invente valores."
+)
+_CACHE_LOCK = threading.Lock()
+
+
+def cache_dir() -> str:
+    return settings.LLM_CACHE_DIR
+
+
+def group_schema(fields: List[str], count: int) -> Dict[str, Any]:
+    """JSON schema sent as Ollama's ``format``: ``{"registros": [{FIELD: str, ...} x count]}``."""
+    record = {
+        "type": "object",
+        "properties": {field: {"type": "string"} for field in fields},
+        "required": list(fields),
+    }
+    return {
+        "type": "object",
+        "properties": {"registros": {"type": "array", "items": record, "minItems": count, "maxItems": count}},
+        "required": ["registros"],
+    }
+
+
+def group_prompt(entity: str, label: str, fields: List[str], count: int, text: str) -> str:
+    who = "dados do ato (valores globais)" if entity == "GLOBAL" else f"{count} registro(s) da entidade {entity}"
+    return (
+        f"Grupo: {label}\n"
+        f"Extraia {who}, na ordem em que aparecem no texto.\n"
+        f"Campos: {', '.join(fields)}\n"
+        f"Texto:\n{text.strip()}\n"
+    )
+
+
+def _cache_key(model: str, prompt: str, schema: Dict[str, Any]) -> str:
+    payload = json.dumps([PROMPT_VERSION, model, SYSTEM_PROMPT, prompt, schema], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_read(key: str) -> Dict[str, Any] | None:
+    try:
+        with open(os.path.join(cache_dir(), f"{key}.json"), "r", encoding="utf-8") as handler:
+            return json.load(handler)
+    except (OSError, ValueError):
+        return None
+
+
+def _cache_write(key: str, response: Dict[str, Any]) -> None:
+    path = os.path.join(ensure_dir(cache_dir()), f"{key}.json")
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with _CACHE_LOCK:
+        with open(tmp_path, "w", encoding="utf-8") as handler:
+            json.dump(response, handler, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def _ask_model(client, model: str, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    response = client.chat(
+        model=model,
+        messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+        format=schema,
+        options={"temperature": 0},
+    )
+    content = response["message"]["content"]
+    data = json.loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("resposta do modelo não é um objeto JSON")
+    return data
+
+
+def extract_fields(
+    spec: Dict[str, Any],
+    text: str,
+    counts: Dict[str, int] | None = None,
+    workers: int = 4,
+    model: str | None = None,
+    host: str | None = None,
+    use_cache: bool = True,
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """Extract ``{PLACEHOLDER: value}`` for every group of ``spec`` from ``text``.
+
+    ``counts`` gives how many records each entity has (default: the spec's inferred counts, else 1).
+    Returns the mapping plus a report with rejected values, failed groups and cache hits.
+    """
+    from .collector import infer_counts_from_spec
+
+    logger = setup_logger()
+    model = model or settings.OLLAMA_MODEL
+    if not model:
+        raise ValueError("defina OLLAMA_MODEL (no .env) ou passe --model")
+    plan = plan_for(spec)
+    counts = {**infer_counts_from_spec(spec), **(counts or {})}
+    client = None
+    client_lock = threading.Lock()
+
+    def get_client():
+        nonlocal client
+        with client_lock:
+            if client is None:
+                import ollama
+
+                client = ollama.Client(host=host or settings.OLLAMA_HOST)
+            return client
+
+    def run_group(group: Dict[str, Any]) -> Tuple[Dict[str, Any], bool, float]:
+        entity = group["fields"][0]["entity"]
+        count = 1 if entity == "GLOBAL" else max(1, counts.get(entity, 1))
+        names = [field["name"] for field in group["fields"]]
+        schema = group_schema(names, count)
+        prompt = group_prompt(entity, group["label"], names, count, text)
+        key = _cache_key(model, prompt, schema)
+        started = time.perf_counter()
+        response = _cache_read(key) if use_cache else None
+        hit = response is not None
+        if response is None:
+            response = _ask_model(get_client(), model, prompt, schema)
+            if use_cache:
+                _cache_write(key, response)
+        return response, hit, round((time.perf_counter() - started) * 1000, 2)
+
+    mapping: Dict[str, str] = {}
+    report: Dict[str, Any] = {"groups": 0, "cache_hits": 0, "rejected": [], "failed": []}
+    groups = [group for group in spec.get("groups", []) if group.get("fields")]
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="llm") as pool:
+        futures = [pool.submit(run_group, group) for group in groups]
+        for group, future in zip(groups, futures):
+            try:
+                response, hit, ms = future.result()
+            except Exception as exc:  # one group failing leaves the others usable
+                report["failed"].append({"group": group["id"], "error": f"{type(exc).__name__}: {exc}"})
+                jlog(logger, "WARN", "LLM_GROUP_FAIL", group=group["id"], error=f"{type(exc).__name__}: {exc}")
+                continue
+            report["groups"] += 1
+            report["cache_hits"] += int(hit)
+            records = response.get("registros") or []
+            if isinstance(records, dict):
+                records = [records]
+            filled = 0
+            for idx, record in enumerate(records, 1):
+                if not isinstance(record, dict):
+                    continue
+                for field in group["fields"]:
+                    value = str(record.get(field["name"]) or "").strip()
+                    if not value:
+                        continue
+                    entity = field["entity"]
+                    if entity == "GLOBAL":
+                        key = field["placeholder"] if idx == 1 else None
+                    else:
+                        key = plan.key_for(field["name"], entity, idx) or (field["placeholder"] if idx == 1 else None)
+                    if key is None:
+                        continue
+                    validator, _, rule = plan.validator(field["name"])
+                    if not validator(value):
+                        report["rejected"].append({"key": key, "value": value, "rule": rule})
+                        jlog(logger, "WARN", "LLM_FIELD_INVALID", key=key, value=value, rule=rule)
+                        continue
+                    mapping[key] = value
+                    filled += 1
+            jlog(logger, "INFO", "LLM_GROUP_DONE", group=group["id"], cache_hit=hit, ms=ms, filled=filled)
+
+    jlog(
+        logger,
+        "INFO",
+        "LLM_EXTRACT_DONE",
+        slug=spec["name"],
+        model=model,
+        placeholders=len(mapping),
+        groups=report["groups"],
+        cache_hits=report["cache_hits"],
+        rejected=len(report["rejected"]),
+        failed=len(report["failed"]),
+    )
+    return mapping, report
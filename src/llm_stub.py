@@ -0,0 +1,105 @@
+"""Offline stand-in for the Ollama HTTP API, for exercising ``llm_extract`` without a model.
+
+    python -m src.llm_stub --port 11500      # then OLLAMA_HOST=http://127.0.0.1:11500
+
+``POST /api/chat`` answers in Ollama's response shape. The "model" reads the fields requested in the
+JSON schema sent as ``format`` and takes the n-th ``FIELD: value`` occurrence in the text for record n.
+"""
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from .logging_utils import setup_logger, jlog
+
+STUB_MODEL = "stub"
+
+
+def answer(request: Dict[str, Any]) -> Dict[str, Any]:
+    """The JSON object a model would return for an ``llm_extract`` group request."""
+    schema = request.get("format") if isinstance(request.get("format"), dict) else {}
+    records = schema.get("properties", {}).get("registros", {})
+    fields: List[str] = list(records.get("items", {}).get("properties", {}))
+    count = int(records.get("maxItems") or 1)
+    prompt = next((m.get("content", "") for m in reversed(request.get("messages") or []) if m.get("role") == "user"), "")
+    text = prompt.split("Texto:\n", 1)[-1]
+    values = {
+        field: re.findall(rf"(?<![\w]){re.escape(field)}\s*[:=]\s*([^;\n]+)", text, re.IGNORECASE) for field in fields
+    }
+    return {
+        "registros": [
+            {field: found[idx].strip() if idx < len(found) else "" for field, found in values.items()}
+            for idx in range(count)
+        ]
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ollama-stub"
+
+    def _send(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/api/version":
+            self._send(200, {"version": "0.0.0-stub"})
+        elif self.path == "/api/tags":
+            self._send(200, {"models": [{"name": STUB_MODEL, "model": STUB_MODEL}]})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if self.path != "/api/chat":
+            self._send(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        started = time.perf_counter()
+        content = json.dumps(answer(request), ensure_ascii=False)
+        self.server.requests += 1
+        jlog(self.server.logger, "INFO", "LLM_STUB_REQUEST", model=request.get("model"), requests=self.server.requests)
+        self._send(
+            200,
+            {
+                "model": request.get("model") or STUB_MODEL,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((time.perf_counter() - started) * 1e9),
+            },
+        )
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # requests are logged as LLM_STUB_REQUEST
+
+
+def make_server(host: str = "127.0.0.1", port: int = 11500) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.logger = setup_logger()
+    server.requests = 0
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor falso da API do Ollama (para testes offline)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    args = parser.parse_args()
+    server = make_server(args.host, args.port)
+    jlog(server.logger, "INFO", "LLM_STUB_START", host=args.host, port=args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,155 @@
+import atexit
 import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
-import datetime
+import threading
+import time
+from typing import Dict
 
+from .config import load_env
 
-def _ts() -> str:
-    """UTC timestamp with millisecond precision."""
-    return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARN": logging.WARNING,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+}
 
+# Per-process logging state: the background listener, sampling rules and event counters.
+_STATE: Dict[str, object] = {"listener": None, "sample": {}, "counters": {}, "lock": threading.Lock()}
 
-def setup_logger(level: str = "INFO") -> logging.Logger:
-    """Return a configured singleton logger for the agent."""
+
+def _ts(created: float) -> str:
+    """UTC timestamp with microsecond precision."""
+    seconds = int(created)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)) + f".{int((created - seconds) * 1e6):06d}Z"
+
+
+class JsonFormatter(logging.Formatter):
+    """Serializes the payload dict carried in ``record.msg``; runs on the listener thread."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = record.msg
+        if not isinstance(payload, dict):
+            return super().format(record)
+        return json.dumps({"ts": _ts(record.created), **payload}, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue the record untouched, so JSON serialization happens off the calling thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _parse_sample(spec: str) -> Dict[str, int]:
+    """``"RUN_FIELD_PROMPT=0,RUN_MAP_KEY=10"`` -> emit 1 in N (0 = only count)."""
+    rules: Dict[str, int] = {}
+    for item in (spec or "").split(","):
+        event, _, rate = item.partition("=")
+        if event.strip() and rate.strip().isdigit():
+            rules[event.strip()] = int(rate)
+    return rules
+
+
+def _output_handler() -> logging.Handler:
+    path = os.getenv("AGNODOCS_LOG_FILE")
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler: logging.Handler = logging.handlers.RotatingFileHandler(
+            path,
+            maxBytes=int(os.getenv("AGNODOCS_LOG_MAX_BYTES") or 10 * 1024 * 1024),
+            backupCount=int(os.getenv("AGNODOCS_LOG_BACKUPS") or 5),
+            encoding="utf-8",
+        )
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter("%(message)s"))
+    return handler
+
+
+def setup_logger(level: str | None = None) -> logging.Logger:
+    """Return a configured singleton logger for the agent.
+
+    Environment: ``AGNODOCS_LOG_LEVEL``, ``AGNODOCS_LOG_FILE`` (rotating JSONL instead of stdout)
+    and ``AGNODOCS_LOG_SAMPLE`` (per-event sampling, see ``_parse_sample``).
+    """
     logger = logging.getLogger("agnodocs")
     if logger.handlers:
         return logger
-    logger.setLevel(getattr(logging, level.upper(), logging.INFO))
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(logging.Formatter("%(message)s"))
-    logger.addHandler(handler)
+    load_env()
+    level = level or os.getenv("AGNODOCS_LOG_LEVEL") or "INFO"
+    logger.setLevel(_LEVELS.get(level.upper(), logging.INFO))
+    logger.propagate = False
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, _output_handler())
+    listener.start()
+    _STATE["listener"] = listener
+    _register_finalizer()
+    _STATE["sample"] = _parse_sample(os.getenv("AGNODOCS_LOG_SAMPLE", ""))
+    logger.addHandler(_DeferredQueueHandler(log_queue))
     return logger
 
 
+def flush_counters(logger: logging.Logger) -> None:
+    """Emit the aggregated counts of sampled events as one ``LOG_COUNTERS`` line."""
+    with _STATE["lock"]:
+        counters = dict(_STATE["counters"])
+        _STATE["counters"].clear()
+    if counters:
+        logger.info({"level": "INFO", "event": "LOG_COUNTERS", "counts": counters})
+
+
+def shutdown_logging() -> None:
+    """Flush counters and drain the background writer; safe to call more than once."""
+    listener = _STATE.get("listener")
+    if listener is None:
+        return
+    flush_counters(logging.getLogger("agnodocs"))
+    _STATE["listener"] = None
+    listener.stop()
+
+
+def _reset_after_fork() -> None:
+    # The listener thread does not survive fork; give the child its own.
+    logger = logging.getLogger("agnodocs")
+    had_handlers = bool(logger.handlers)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    _STATE["listener"] = None
+    _STATE["lock"] = threading.Lock()
+    _STATE["counters"] = {}
+    if had_handlers:
+        setup_logger(logging.getLevelName(logger.level))
+
+
+def _register_finalizer() -> None:
+    # Forked pool workers exit through multiprocessing, which skips atexit but runs its finalizers. A process
+    # that has not loaded multiprocessing is no worker; if it starts a pool later, each forked worker registers
+    # on its own (``_reset_after_fork`` sets the logger up again), so short commands skip the import.
+    util = sys.modules.get("multiprocessing.util")
+    if util is not None:
+        util.Finalize(None, shutdown_logging, exitpriority=0)
+
+
+atexit.register(shutdown_logging)
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
 def jlog(logger: logging.Logger, level: str, event: str, **payload) -> None:
-    """Emit a structured JSON log line."""
-    record = {"ts": _ts(), "level": level.upper(), "event": event, **payload}
-    msg = json.dumps(record, ensure_ascii=False)
-    match level.upper():
-        case "ERROR":
-            logger.error(msg)
-        case "WARN" | "WARNING":
-            logger.warning(msg)
-        case _:
-            logger.info(msg)
+    """Emit a structured JSON log line (serialized on the background writer)."""
+    level = level.upper()
+    if not logger.isEnabledFor(_LEVELS.get(level, logging.INFO)):
+        return
+    rate = _STATE["sample"].get(event)
+    if rate is not None:
+        with _STATE["lock"]:
+            count = _STATE["counters"].get(event, 0) + 1
+            _STATE["counters"][event] = count
+        if rate == 0 or count % rate != 1 % rate:
+            return
+    logger.log(_LEVELS.get(level, logging.INFO), {"level": level, "event": event, **payload})
@@ -2,25 +2,39 @@ import argparse
 import json
 import os
 from .config import settings
-from . import parser as myparser
 from . import spec_repo
-from .collector import collect_for_spec
-from .filler import fill_docx
 from .logging_utils import setup_logger, jlog
 
+# Command modules (and python-docx/lxml/pydantic behind them) are imported inside each cmd_*,
+# so cheap commands such as ``list`` start without loading them.
 
-def cmd_index() -> None:
-    logger = setup_logger()
-    files = [name for name in os.listdir(settings.TEMPLATES) if name.lower().endswith(".docx")]
-    if not files:
+
+def cmd_index(check: bool = False, force: bool = False, workers: int | None = None) -> None:
+    from .indexer import check_index, index_templates, list_templates
+
+    if check:
+        stale = check_index()
+        for item in stale:
+            print(f"[STALE] {item['file']} ({item['reason']})")
+        if stale:
+            print("Índice desatualizado. Rode: python -m src.main index")
+            raise SystemExit(1)
+        print("[OK] Índice atualizado.")
+        return
+    if not list_templates():
         print("Nenhum .docx encontrado em ./templates")
         return
-    for filename in sorted(files):
-        path = os.path.join(settings.TEMPLATES, filename)
-        spec = myparser.build_spec_from_docx(path)
-        out_path = spec_repo.save_spec(spec)
-        jlog(logger, "INFO", "INDEX_SAVE_SPEC", file=filename, spec_path=out_path)
-        print(f"[OK] {filename} -> spec: {out_path}")
+    summary = index_templates(force=force, workers=workers)
+    for item in summary["built"]:
+        print(f"[OK] {item['file']} -> spec: {item['spec_path']} ({item['seconds']:.3f}s)")
+    for item in summary["failed"]:
+        print(f"[ERRO] {item['file']}: {item['error']}")
+    for filename in summary["pruned"]:
+        print(f"[REMOVIDO] {filename}")
+    print(
+        f"Index: {len(summary['built'])} reconstruídos, {len(summary['skipped'])} inalterados, "
+        f"{len(summary['pruned'])} removidos, {len(summary['failed'])} com erro em {summary['seconds']:.3f}s"
+    )
 
 
 def cmd_list() -> None:
@@ -32,6 +46,36 @@ def cmd_list() -> None:
         print(f"{idx}. {slug}")
 
 
+def cmd_search(
+    terms: list,
+    match_any: bool,
+    entities: list,
+    multiplicity: str | None,
+    casais: bool | None,
+    fuzzy: float | None,
+) -> None:
+    import time
+
+    from .search import load_search_index
+
+    logger = setup_logger()
+    started = time.perf_counter()
+    hits, expansions = load_search_index().search(
+        terms, match_any=match_any, entities=entities, multiplicity=multiplicity, casais=casais, fuzzy=fuzzy
+    )
+    ms = round((time.perf_counter() - started) * 1000, 3)
+    jlog(logger, "INFO", "SEARCH_DONE", terms=terms, hits=len(hits), ms=ms)
+    for term, found in expansions.items():
+        if not found:
+            print(f"[SEM TERMO] {term}")
+        elif fuzzy is not None:
+            print(f"~ {term}: " + ", ".join(f"{indexed} ({score:g})" for indexed, score in found))
+    for idx, hit in enumerate(hits, 1):
+        flags = " casais" if hit.casais else ""
+        print(f"{idx}. {hit.slug}  [{hit.multiplicity}]{flags}  {', '.join(hit.entities)}")
+    print(f"{len(hits)} template(s) em {ms:g} ms")
+
+
 def choose_slug() -> str | None:
     slugs = spec_repo.list_specs()
     if not slugs:
@@ -48,7 +92,10 @@ def choose_slug() -> str | None:
     return None
 
 
-def cmd_run() -> None:
+def cmd_run(use_llm: bool = False, use_store: bool = False) -> None:
+    from .collector import collect_for_spec
+    from .filler import fill_docx
+
     logger = setup_logger()
     slug = choose_slug()
     if not slug:
@@ -64,28 +111,344 @@ def cmd_run() -> None:
         entities=spec.get("entities"),
         casais=(spec.get("meta") or {}).get("casais"),
     )
-    mapping = collect_for_spec(spec, use_llm=False)
-    template_path = os.path.join(settings.TEMPLATES, spec["source"])
-    out_path = os.path.join(settings.RESULTS, f"{slug}_preenchido.docx")
-    jlog(logger, "INFO", "FILL_START", template=template_path, out=out_path)
-    final_path = fill_docx(template_path, mapping, out_name=f"{slug}_preenchido.docx")
-    jlog(logger, "INFO", "FILL_DONE", out=final_path)
+    store = _store(use_store)
+    try:
+        mapping = collect_for_spec(spec, use_llm=use_llm, store=store)
+        template_path = os.path.join(settings.TEMPLATES, spec["source"])
+        out_path = os.path.join(settings.RESULTS, f"{slug}_preenchido.docx")
+        jlog(logger, "INFO", "FILL_START", template=template_path, out=out_path)
+        timings: dict = {}
+        final_path = fill_docx(template_path, mapping, out_name=f"{slug}_preenchido.docx", timings=timings)
+        jlog(logger, "INFO", "FILL_DONE", out=final_path, **timings)
+        _remember(store, spec, template_path, mapping, final_path, timings)
+    finally:
+        if store is not None:
+            store.close()
     print(f"[OK] Documento gerado em: {final_path}")
 
 
-def cmd_fill(slug: str, data_path: str) -> None:
+def _store(enabled: bool):
+    if not enabled:
+        return None
+    from .store import Store
+
+    return Store()
+
+
+def _remember(store, spec: dict, template_path: str, mapping: dict, out_path: str, timings: dict) -> None:
+    if store is None:
+        return
+    from .store import remember_fill
+
+    parties = remember_fill(store, spec, template_path, mapping, out_path, timings)
+    jlog(setup_logger(), "INFO", "STORE_FILL", slug=spec["name"], parties=len(parties))
+
+
+def _output_cache(enabled: bool):
+    if not enabled:
+        return None
+    from .output_cache import OutputCache
+
+    return OutputCache()
+
+
+def cmd_fill(
+    slug: str,
+    data_path: str,
+    strict: bool = False,
+    use_cache: bool = False,
+    fuzzy: float | None = None,
+    use_store: bool = False,
+) -> None:
+    from .filler import fill_docx
+    from .plan import plan_for
+
     logger = setup_logger()
     spec = spec_repo.load_spec(slug)
     template_path = os.path.join(settings.TEMPLATES, spec["source"])
     with open(data_path, "r", encoding="utf-8") as handler:
-        mapping = json.load(handler)
+        record = json.load(handler)
+    if fuzzy is not None:
+        from .keymatch import matcher_for
+
+        record, resolution = matcher_for(spec, fuzzy).remap(record)
+        renamed = {key: value for key, value in resolution.matches.items() if key != value}
+        jlog(
+            logger,
+            "INFO",
+            "FILL_KEY_MATCH",
+            slug=slug,
+            matched=renamed,
+            scores={key: resolution.scores[key] for key in renamed},
+            ambiguous=resolution.ambiguous,
+            unmatched=resolution.unmatched,
+        )
+        for key, candidates in resolution.ambiguous.items():
+            print(f"[AMBÍGUO] {key}: {', '.join(candidates)}")
+    check = plan_for(spec).check_record(record)
+    if check.unknown:
+        jlog(logger, "WARN", "FILL_UNKNOWN_KEYS", slug=slug, keys=check.unknown)
+    if check.errors:
+        jlog(logger, "WARN", "FILL_INVALID_FIELDS", slug=slug, fields=check.errors)
+        if strict:
+            for error in check.errors:
+                print(f"[ERRO] {error['key']}: valor inválido ({error['rule']}): {error['value']!r}")
+            raise SystemExit(1)
+    mapping = check.mapping
     out_path = os.path.join(settings.RESULTS, f"{slug}_preenchido.docx")
     jlog(logger, "INFO", "FILL_START", template=template_path, out=out_path)
-    final_path = fill_docx(template_path, mapping, out_name=f"{slug}_preenchido.docx")
-    jlog(logger, "INFO", "FILL_DONE", out=final_path)
+    timings: dict = {}
+    final_path = fill_docx(
+        template_path, mapping, out_name=f"{slug}_preenchido.docx", timings=timings, cache=_output_cache(use_cache)
+    )
+    jlog(logger, "INFO", "FILL_DONE", out=final_path, **timings)
+    store = _store(use_store)
+    if store is not None:
+        with store:
+            _remember(store, spec, template_path, mapping, final_path, timings)
     print(f"[OK] Documento gerado em: {final_path}")
 
 
+def cmd_extract(
+    slug: str,
+    text_path: str,
+    out_path: str | None,
+    counts: list,
+    workers: int,
+    model: str | None,
+    use_cache: bool,
+) -> None:
+    from .llm_extract import extract_fields
+
+    spec = spec_repo.load_spec(slug)
+    with open(text_path, "r", encoding="utf-8") as handler:
+        text = handler.read()
+    entity_counts = {}
+    for item in counts:
+        entity, _, number = item.partition("=")
+        if not number.strip().isdigit():
+            raise SystemExit(f"--count inválido: {item} (use ENTIDADE=N)")
+        entity_counts[entity.strip().upper()] = int(number)
+    mapping, report = extract_fields(
+        spec, text, counts=entity_counts, workers=workers, model=model, use_cache=use_cache
+    )
+    payload = json.dumps(mapping, ensure_ascii=False, indent=2)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as handler:
+            handler.write(payload + "\n")
+        print(f"[OK] {len(mapping)} campos extraídos em: {out_path}")
+    else:
+        print(payload)
+    for item in report["rejected"]:
+        print(f"[INVÁLIDO] {item['key']}: {item['value']!r} ({item['rule']})")
+    for item in report["failed"]:
+        print(f"[ERRO] {item['group']}: {item['error']}")
+
+
+def cmd_fill_batch(
+    slug: str,
+    data_path: str,
+    key_field: str | None,
+    out_dir: str | None,
+    workers: int | None,
+    max_tasks_per_child: int,
+    archive_path: str | None = None,
+    strict: bool = False,
+    use_cache: bool = False,
+    fuzzy: float | None = None,
+    use_store: bool = False,
+) -> None:
+    from .batch import run_batch
+
+    spec = spec_repo.load_spec(slug)
+    store = _store(use_store)
+    try:
+        totals = run_batch(
+            spec,
+            data_path,
+            key_field=key_field,
+            out_dir=out_dir,
+            workers=workers,
+            max_tasks_per_child=max_tasks_per_child,
+            archive_path=archive_path,
+            strict=strict,
+            cache=_output_cache(use_cache),
+            fuzzy=fuzzy,
+            store=store,
+        )
+    finally:
+        if store is not None:
+            store.close()
+    print(f"[OK] Lote concluído: {totals['ok']} gerados, {totals['error']} com erro")
+
+
+def cmd_merge(
+    slug: str,
+    data_path: str,
+    out_name: str | None,
+    out_dir: str | None,
+    strict: bool = False,
+    fuzzy: float | None = None,
+) -> None:
+    from .merge import run_merge
+
+    try:
+        result = run_merge(
+            spec_repo.load_spec(slug), data_path, out_name=out_name, out_dir=out_dir, strict=strict, fuzzy=fuzzy
+        )
+    except ValueError as exc:
+        raise SystemExit(f"[ERRO] {exc}")
+    print(f"[OK] {result['records']} registros mesclados em: {result['out']} ({result['skipped']} pulados)")
+
+
+def cmd_job_create(slug: str, data_path: str, shards: int, key_field: str | None, job_dir: str | None) -> None:
+    from .jobs import create_job, load_job
+
+    spec_repo.load_spec(slug)
+    job = load_job(create_job(slug, data_path, shards, key_field=key_field, job_dir=job_dir))
+    print(f"[OK] Job criado em: {job['dir']}")
+    for shard, count in enumerate(job["counts"]):
+        print(f"  shard {shard}: {count} registros")
+
+
+def cmd_job_run(
+    job_path: str,
+    shard: int,
+    workers: int | None,
+    max_tasks_per_child: int,
+    strict: bool = False,
+    use_cache: bool = False,
+    fuzzy: float | None = None,
+    use_store: bool = False,
+) -> None:
+    from .jobs import load_job, run_shard
+
+    store = _store(use_store)
+    try:
+        totals = run_shard(
+            load_job(job_path),
+            shard,
+            workers=workers,
+            max_tasks_per_child=max_tasks_per_child,
+            strict=strict,
+            cache=_output_cache(use_cache),
+            fuzzy=fuzzy,
+            store=store,
+        )
+    except ValueError as exc:
+        raise SystemExit(f"[ERRO] {exc}")
+    finally:
+        if store is not None:
+            store.close()
+    print(
+        f"[OK] Shard {shard}: {totals['ok']} gerados, {totals['error']} com erro, "
+        f"{totals['skipped']} já concluídos antes"
+    )
+
+
+def cmd_job_status(job_path: str) -> None:
+    from .jobs import job_status, load_job
+
+    job = load_job(job_path)
+    totals = {"total": 0, "done": 0, "failed": 0, "pending": 0}
+    for status in job_status(job):
+        for name in totals:
+            totals[name] += status[name]
+        rate = f", {status['docs_per_s']} docs/s" if "docs_per_s" in status else ""
+        print(
+            f"shard {status['shard']}: {status['done']}/{status['total']} ok, "
+            f"{status['failed']} com erro, {status['pending']} pendentes{rate}"
+        )
+    print(
+        f"Total: {totals['done']}/{totals['total']} ok, {totals['failed']} com erro, {totals['pending']} pendentes"
+    )
+
+
+def cmd_dossier(
+    case_path: str,
+    slugs: list,
+    patterns: list,
+    out_dir: str | None,
+    archive_path: str | None,
+    workers: int,
+    strict: bool = False,
+    use_cache: bool = False,
+) -> None:
+    from fnmatch import fnmatchcase
+
+    from .dossier import case_id, load_case, run_dossier
+
+    selected = list(dict.fromkeys(slugs))
+    if patterns:
+        for slug in spec_repo.list_specs():
+            if slug not in selected and any(fnmatchcase(slug, pattern) for pattern in patterns):
+                selected.append(slug)
+    if not selected:
+        raise SystemExit("Nenhum template selecionado (use --slug e/ou --match)")
+    specs = []
+    for slug in selected:
+        try:
+            specs.append(spec_repo.load_spec(slug))
+        except FileNotFoundError:
+            raise SystemExit(f"Spec não encontrado: {slug}")
+    case = load_case(case_path)
+    results = run_dossier(
+        case,
+        specs,
+        case_id(case, case_path),
+        out_dir=out_dir,
+        archive_path=archive_path,
+        workers=workers,
+        strict=strict,
+        cache=_output_cache(use_cache),
+    )
+    for result in results:
+        if result["status"] == "ok":
+            print(f"[OK] {result['slug']} ({result['filled']}/{result['placeholders']} campos) -> {result['out']}")
+        else:
+            print(f"[ERRO] {result['slug']}: {result['error']}")
+    if any(result["status"] != "ok" for result in results):
+        raise SystemExit(1)
+
+
+def cmd_ledger(doc: str | None, slug: str | None, since: str | None, limit: int) -> None:
+    import datetime
+
+    from .store import Store
+
+    since_ts = None
+    if since:
+        try:
+            since_ts = datetime.datetime.strptime(since, "%Y-%m-%d").timestamp()
+        except ValueError:
+            raise SystemExit(f"--since inválido: {since} (use AAAA-MM-DD)")
+    with Store() as store:
+        if doc:
+            party = store.party(doc)
+            if party is not None:
+                print(f"[cadastro] {party.kind.upper()} {party.doc}: " + json.dumps(party.fields, ensure_ascii=False))
+        rows = store.fills(doc=doc, slug=slug, since=since_ts, limit=limit)
+    for row in rows:
+        when = datetime.datetime.fromtimestamp(row["created_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{when}  {row['slug']}  {row['out_path']}")
+    print(f"{len(rows)} documento(s)")
+
+
+def cmd_serve(
+    host: str, port: int, workers: int, max_concurrency: int, timeout: float, use_cache: bool = False
+) -> None:
+    from .service import run_service
+
+    run_service(
+        host=host,
+        port=port,
+        workers=workers,
+        max_concurrency=max_concurrency,
+        timeout=timeout,
+        cache=_output_cache(use_cache),
+    )
+
+
 def main() -> None:
     import sys
 
@@ -93,25 +456,270 @@ def main() -> None:
         sys.path.append(os.path.dirname(__file__))
 
     parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", metavar="ARQUIVO", default=None, help="Grava estatísticas do cProfile do comando")
+    parser.add_argument(
+        "--trace-memory",
+        metavar="N",
+        type=int,
+        nargs="?",
+        const=15,
+        default=None,
+        help="Registra as N maiores alocações (tracemalloc) do comando",
+    )
     sub = parser.add_subparsers(dest="cmd")
+    cache_help = "Reaproveita documentos já gerados com o mesmo template e os mesmos dados"
+    store_help = "Guarda as partes (por CPF/CNPJ) e registra o documento no banco local (.data/agnodocs.sqlite3)"
+    fuzzy_help = "Aceita chaves aproximadas (nome_outorgante, 'CPF Outorgado 2'); LIMIAR de similaridade 0-100, padrão 85"
 
-    sub.add_parser("index")
+    index_parser = sub.add_parser("index")
+    index_parser.add_argument("--check", action="store_true", help="Só verifica (via stat) se o índice está desatualizado")
+    index_parser.add_argument("--force", action="store_true", help="Reconstrói todos os specs")
+    index_parser.add_argument("--workers", type=int, default=None)
     sub.add_parser("list")
-    sub.add_parser("run")
+    search_parser = sub.add_parser("search", help="Busca templates por placeholders, entidades e multiplicidade")
+    search_parser.add_argument(
+        "terms", nargs="*", metavar="TERMO", help="Placeholder (CNPJ_VENDEDOR); alternativas com |, ex.: CPF_X|CNPJ_X"
+    )
+    search_parser.add_argument("--any", action="store_true", help="Basta um dos termos (OU); padrão: todos (E)")
+    search_parser.add_argument("--entity", action="append", default=[], help="Exige a entidade (repetível)")
+    search_parser.add_argument("--mult", default=None, help="Multiplicidade, ex.: V-1")
+    search_parser.add_argument("--casais", dest="casais", action="store_const", const=True, default=None)
+    search_parser.add_argument("--sem-casais", dest="casais", action="store_const", const=False)
+    search_parser.add_argument(
+        "--fuzzy",
+        type=float,
+        nargs="?",
+        const=80.0,
+        default=None,
+        metavar="LIMIAR",
+        help="Aceita termos aproximados (similaridade 0-100, padrão 80)",
+    )
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--llm", action="store_true", help="Sugere os valores a partir de um texto colado (Ollama)")
+    run_parser.add_argument(
+        "--store", action="store_true", help="Busca as partes já cadastradas pelo CPF/CNPJ e registra o documento"
+    )
+
+    extract_parser = sub.add_parser("extract", help="Extrai os campos de um texto livre com o modelo do Ollama")
+    extract_parser.add_argument("--slug", required=True)
+    extract_parser.add_argument("--text", required=True, help="Arquivo .txt com a qualificação das partes")
+    extract_parser.add_argument("--out", default=None, help="Grava o JSON para usar no 'fill' (padrão: stdout)")
+    extract_parser.add_argument("--count", action="append", default=[], metavar="ENTIDADE=N")
+    extract_parser.add_argument("--workers", type=int, default=4, help="Grupos consultados em paralelo")
+    extract_parser.add_argument("--model", default=None, help="Padrão: OLLAMA_MODEL")
+    extract_parser.add_argument("--no-cache", action="store_true", help="Ignora respostas já guardadas")
 
     fill_parser = sub.add_parser("fill")
     fill_parser.add_argument("--slug", required=True)
     fill_parser.add_argument("--data", required=True)
+    fill_parser.add_argument("--strict", action="store_true", help="Não preenche se algum campo falhar na validação")
+    fill_parser.add_argument("--cache", action="store_true", help=cache_help)
+    fill_parser.add_argument("--store", action="store_true", help=store_help)
+    fill_parser.add_argument(
+        "--fuzzy",
+        type=float,
+        nargs="?",
+        const=85.0,
+        default=None,
+        metavar="LIMIAR",
+        help=fuzzy_help,
+    )
+
+    batch_parser = sub.add_parser("fill-batch")
+    batch_parser.add_argument("--slug", required=True)
+    batch_parser.add_argument("--data", required=True, help="Arquivo .jsonl ou .csv com um registro por linha")
+    batch_parser.add_argument("--key", default=None, help="Campo do registro usado no nome do arquivo gerado")
+    batch_parser.add_argument("--out-dir", default=None)
+    batch_parser.add_argument("--workers", type=int, default=None)
+    batch_parser.add_argument("--max-tasks-per-child", type=int, default=200)
+    batch_parser.add_argument("--archive", default=None, help="Grava todos os documentos num único .zip com manifest.json")
+    batch_parser.add_argument("--strict", action="store_true", help="Pula registros com campos inválidos")
+    batch_parser.add_argument("--cache", action="store_true", help=cache_help)
+    batch_parser.add_argument("--store", action="store_true", help=store_help)
+    batch_parser.add_argument(
+        "--fuzzy",
+        type=float,
+        nargs="?",
+        const=85.0,
+        default=None,
+        metavar="LIMIAR",
+        help=fuzzy_help,
+    )
+
+    merge_parser = sub.add_parser("merge", help="Um único .docx com o template repetido para cada registro")
+    merge_parser.add_argument("--slug", required=True)
+    merge_parser.add_argument("--data", required=True, help="Arquivo .jsonl ou .csv com um registro por linha")
+    merge_parser.add_argument("--out", default=None, help="Nome do arquivo gerado (padrão: <slug>_mesclado.docx)")
+    merge_parser.add_argument("--out-dir", default=None)
+    merge_parser.add_argument("--strict", action="store_true", help="Pula registros com campos inválidos")
+    merge_parser.add_argument(
+        "--fuzzy",
+        type=float,
+        nargs="?",
+        const=85.0,
+        default=None,
+        metavar="LIMIAR",
+        help=fuzzy_help,
+    )
+
+    job_create_parser = sub.add_parser("job-create", help="Divide um arquivo de registros em shards retomáveis")
+    job_create_parser.add_argument("--slug", required=True)
+    job_create_parser.add_argument("--data", required=True, help="Arquivo .jsonl ou .csv")
+    job_create_parser.add_argument("--shards", type=int, default=1)
+    job_create_parser.add_argument("--key", default=None, help="Campo usado como chave do registro")
+    job_create_parser.add_argument("--job-dir", default=None)
+
+    job_run_parser = sub.add_parser("job-run", help="Processa (ou retoma) um shard de um job")
+    job_run_parser.add_argument("--job", required=True, help="job.json ou a pasta do job")
+    job_run_parser.add_argument("--shard", type=int, default=0)
+    job_run_parser.add_argument("--workers", type=int, default=None)
+    job_run_parser.add_argument("--max-tasks-per-child", type=int, default=200)
+    job_run_parser.add_argument("--strict", action="store_true", help="Pula registros com campos inválidos")
+    job_run_parser.add_argument("--cache", action="store_true", help=cache_help)
+    job_run_parser.add_argument("--store", action="store_true", help=store_help)
+    job_run_parser.add_argument(
+        "--fuzzy",
+        type=float,
+        nargs="?",
+        const=85.0,
+        default=None,
+        metavar="LIMIAR",
+        help=fuzzy_help,
+    )
+
+    job_status_parser = sub.add_parser("job-status", help="Progresso de cada shard, lido dos ledgers")
+    job_status_parser.add_argument("--job", required=True, help="job.json ou a pasta do job")
+
+    dossier_parser = sub.add_parser("dossier", help="Preenche vários templates a partir de um único caso")
+    dossier_parser.add_argument("--case", required=True, help="JSON do caso (GLOBAL + entidades com suas pessoas)")
+    dossier_parser.add_argument("--slug", action="append", default=[], help="Template a preencher (repetível)")
+    dossier_parser.add_argument(
+        "--match", action="append", default=[], metavar="PADRÃO", help="Seleciona specs por padrão, ex.: '*_VENDA_*'"
+    )
+    dossier_parser.add_argument("--out-dir", default=None)
+    dossier_parser.add_argument("--archive", default=None, help="Grava o dossiê num único .zip com manifest.json")
+    dossier_parser.add_argument("--workers", type=int, default=4)
+    dossier_parser.add_argument("--strict", action="store_true", help="Pula templates com campos inválidos")
+    dossier_parser.add_argument("--cache", action="store_true", help=cache_help)
+
+    ledger_parser = sub.add_parser("ledger", help="Documentos gerados registrados no banco local")
+    ledger_parser.add_argument("--doc", default=None, help="CPF/CNPJ de uma das partes")
+    ledger_parser.add_argument("--slug", default=None)
+    ledger_parser.add_argument("--since", default=None, metavar="AAAA-MM-DD")
+    ledger_parser.add_argument("--limit", type=int, default=50)
+
+    serve_parser = sub.add_parser("serve")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--workers", type=int, default=4, help="Threads de preenchimento")
+    serve_parser.add_argument("--max-concurrency", type=int, default=32, help="Preenchimentos simultâneos")
+    serve_parser.add_argument("--timeout", type=float, default=30.0, help="Segundos por requisição")
+    serve_parser.add_argument("--cache", action="store_true", help=cache_help)
 
     args = parser.parse_args()
+    _run_with_hooks(args, lambda: dispatch(args, parser))
+
+
+def _run_with_hooks(args: argparse.Namespace, run) -> None:
+    """Run the command under the optional profilers and log the per-command span summary."""
+    from . import timing
+
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    if args.trace_memory:
+        import tracemalloc
+
+        tracemalloc.start(25)
+    try:
+        if profiler is not None:
+            profiler.runcall(run)
+        else:
+            run()
+    finally:
+        # Logging (dotenv, the listener thread) is only set up when there is something to report, so cheap
+        # commands such as ``list`` exit without paying for it.
+        spans = timing.summary()
+        if spans or profiler is not None or args.trace_memory:
+            logger = setup_logger()
+            if spans:
+                jlog(logger, "INFO", "CMD_TIMINGS", cmd=args.cmd, spans=spans)
+            if profiler is not None:
+                _dump_profile(logger, profiler, args.profile)
+            if args.trace_memory:
+                _dump_memory(logger, args.trace_memory)
+
+
+def _dump_profile(logger, profiler, out_path: str) -> None:
+    import pstats
+    import sys
+
+    profiler.dump_stats(out_path)
+    stats = pstats.Stats(profiler, stream=sys.stderr)
+    stats.sort_stats("cumulative").print_stats(25)
+    jlog(logger, "INFO", "CMD_PROFILE", path=out_path)
+
+
+def _dump_memory(logger, top: int) -> None:
+    import tracemalloc
+
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocations = [
+        {"where": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:top]
+    ]
+    jlog(logger, "INFO", "CMD_MEMORY_TOP", peak_kb=round(peak / 1024, 1), top=allocations)
+
+
+def dispatch(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
     if args.cmd == "index":
-        cmd_index()
+        cmd_index(args.check, args.force, args.workers)
     elif args.cmd == "list":
         cmd_list()
+    elif args.cmd == "search":
+        cmd_search(args.terms, args.any, args.entity, args.mult, args.casais, args.fuzzy)
     elif args.cmd == "run":
-        cmd_run()
+        cmd_run(args.llm, args.store)
+    elif args.cmd == "extract":
+        cmd_extract(args.slug, args.text, args.out, args.count, args.workers, args.model, not args.no_cache)
     elif args.cmd == "fill":
-        cmd_fill(args.slug, args.data)
+        cmd_fill(args.slug, args.data, args.strict, args.cache, args.fuzzy, args.store)
+    elif args.cmd == "fill-batch":
+        cmd_fill_batch(
+            args.slug,
+            args.data,
+            args.key,
+            args.out_dir,
+            args.workers,
+            args.max_tasks_per_child,
+            args.archive,
+            args.strict,
+            args.cache,
+            args.fuzzy,
+            args.store,
+        )
+    elif args.cmd == "merge":
+        cmd_merge(args.slug, args.data, args.out, args.out_dir, args.strict, args.fuzzy)
+    elif args.cmd == "job-create":
+        cmd_job_create(args.slug, args.data, args.shards, args.key, args.job_dir)
+    elif args.cmd == "job-run":
+        cmd_job_run(
+            args.job, args.shard, args.workers, args.max_tasks_per_child, args.strict, args.cache, args.fuzzy, args.store
+        )
+    elif args.cmd == "job-status":
+        cmd_job_status(args.job)
+    elif args.cmd == "dossier":
+        cmd_dossier(
+            args.case, args.slug, args.match, args.out_dir, args.archive, args.workers, args.strict, args.cache
+        )
+    elif args.cmd == "ledger":
+        cmd_ledger(args.doc, args.slug, args.since, args.limit)
+    elif args.cmd == "serve":
+        cmd_serve(args.host, args.port, args.workers, args.max_concurrency, args.timeout, args.cache)
     else:
         parser.print_help()
 
@@ -0,0 +1,82 @@
+"""Mail merge: one ``.docx`` with the template repeated, page after page, for every record of a JSONL/CSV file."""
+import os
+import time
+from typing import Any, Dict, Iterator
+
+from .batch import iter_records
+from .config import settings
+from .filler import merge_docx
+from .logging_utils import setup_logger, jlog
+from .plan import plan_for
+
+
+def run_merge(
+    spec: Dict[str, Any],
+    data_path: str,
+    out_name: str | None = None,
+    out_dir: str | None = None,
+    strict: bool = False,
+    fuzzy: float | None = None,
+) -> Dict[str, Any]:
+    """Merge every record of ``data_path`` into one document; returns ``records``/``skipped`` counts and ``out``.
+
+    Records are read, validated and rendered one at a time, so memory does not grow with the file. Unreadable
+    records are skipped; with ``strict``, so are records with invalid fields. ``fuzzy`` resolves loosely written
+    column names as in ``fill-batch``.
+    """
+    logger = setup_logger()
+    plan = plan_for(spec)
+    template_path = os.path.join(settings.TEMPLATES, spec["source"])
+    totals = {"records": 0, "skipped": 0}
+    matcher = None
+    if fuzzy is not None:
+        from .keymatch import matcher_for
+
+        matcher = matcher_for(spec, fuzzy)
+    logged_resolutions: set = set()
+
+    def mappings() -> Iterator[Dict[str, str]]:
+        for line_no, record, error in iter_records(data_path):
+            if error is not None:
+                totals["skipped"] += 1
+                jlog(logger, "WARN", "MERGE_RECORD_SKIP", line=line_no, error=error)
+                continue
+            if matcher is not None:
+                record, resolution = matcher.remap(record)
+                if id(resolution) not in logged_resolutions:  # once per distinct set of columns
+                    logged_resolutions.add(id(resolution))
+                    renamed = {k: v for k, v in resolution.matches.items() if k != v}
+                    jlog(
+                        logger,
+                        "INFO",
+                        "MERGE_KEY_MATCH",
+                        matched=renamed,
+                        ambiguous=resolution.ambiguous,
+                        unmatched=resolution.unmatched,
+                    )
+            check = plan.check_record(record)
+            if check.errors:
+                jlog(logger, "WARN", "MERGE_INVALID_FIELDS", line=line_no, fields=check.errors)
+                if strict:
+                    totals["skipped"] += 1
+                    continue
+            yield check.mapping
+
+    jlog(logger, "INFO", "MERGE_START", slug=spec["name"], data=data_path)
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    out_name = out_name or f"{spec['name']}_mesclado.docx"
+    out_path, totals["records"] = merge_docx(template_path, mappings(), out_name, out_dir, timings=timings)
+    jlog(
+        logger,
+        "INFO",
+        "MERGE_DONE",
+        slug=spec["name"],
+        records=totals["records"],
+        skipped=totals["skipped"],
+        seconds=round(time.perf_counter() - started, 3),
+        bytes=os.path.getsize(out_path),
+        out=out_path,
+        **timings,
+    )
+    return {**totals, "out": out_path}
@@ -0,0 +1,77 @@
+from functools import cached_property
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, ConfigDict, Field
+
+# Version of the TemplateSpec JSON shape; specs written before it existed are version 1.
+SPEC_SCHEMA_VERSION = 2
+
+
+class SpecField(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="allow")
+
+    entity: str
+    name: str
+    placeholder: str
+
+
+class SpecGroup(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="allow")
+
+    id: str
+    label: str
+    fields: List[SpecField] = Field(default_factory=list)
+
+
+class SpecMeta(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="allow")
+
+    casais: bool = False
+    inferred_counts: Dict[str, int] = Field(default_factory=dict)
+    # story part (e.g. "word/header1.xml") -> placeholder names found in it; empty for pre-v2 parser specs
+    parts: Dict[str, List[str]] = Field(default_factory=dict)
+    split_placeholders: List[str] = Field(default_factory=list)
+    # entity -> story parts holding a {#ENTITY}...{/ENTITY} block, repeated once per record when filling
+    repeat: Dict[str, List[str]] = Field(default_factory=dict)
+
+
+class TemplateSpec(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="allow")
+
+    schema_version: int = SPEC_SCHEMA_VERSION
+    name: str
+    source: str
+    multiplicity: str = "[1-1]"
+    entities: List[str] = Field(default_factory=list)
+    groups: List[SpecGroup] = Field(default_factory=list)
+    meta: SpecMeta = Field(default_factory=SpecMeta)
+    all_placeholders: List[str] = Field(default_factory=list)
+    # computed placeholders, see ``computed.declare_computed``
+    computed: List[Dict[str, Any]] = Field(default_factory=list)
+
+    @cached_property
+    def as_dict(self) -> Dict[str, Any]:
+        """Plain-dict view, built once; shared between callers, so treat it as read-only."""
+        return self.model_dump()
+
+    @cached_property
+    def all_fields(self) -> List[SpecField]:
+        return [field for group in self.groups for field in group.fields]
+
+
+def migrate_spec(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Upgrade a spec dict read from disk to ``SPEC_SCHEMA_VERSION``."""
+    version = int(raw.get("schema_version") or 1)
+    if version < 2:
+        raw = dict(raw)
+        meta = raw.get("meta") or {}
+        raw["meta"] = {**meta, "casais": bool(meta.get("casais", "_OU_CASAIS" in raw.get("source", "")))}
+        raw.setdefault("all_placeholders", [])
+        raw.setdefault("entities", [])
+        raw.setdefault("groups", [])
+        raw["schema_version"] = 2
+    return raw
+
+
+def parse_spec(raw: Dict[str, Any]) -> TemplateSpec:
+    return TemplateSpec.model_validate(migrate_spec(raw))
@@ -0,0 +1,148 @@
+"""Content-addressed cache of filled documents: same template bytes + same data -> same ``.docx``."""
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+from .config import ensure_dir, settings
+
+CACHE_VERSION = 1
+DEFAULT_MAX_MB = 512
+
+# template path -> (size, mtime_ns, sha256), so a template is hashed once per change, not per fill.
+_TEMPLATE_HASHES: Dict[str, Tuple[int, int, str]] = {}
+
+
+def template_hash(path: str) -> str:
+    from .indexer import file_sha256
+
+    stat = os.stat(path)
+    cached = _TEMPLATE_HASHES.get(path)
+    if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    digest = file_sha256(path)
+    _TEMPLATE_HASHES[path] = (stat.st_size, stat.st_mtime_ns, digest)
+    return digest
+
+
+def mapping_hash(mapping: Dict[str, Any]) -> str:
+    """Order-insensitive hash; ``None`` and ``""`` count as the same value, as they fill the same."""
+    normalized = {str(key): "" if value is None else str(value) for key, value in mapping.items() if key}
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class OutputCache:
+    """Filled documents on local disk, capped at ``max_bytes`` with least-recently-used eviction.
+
+    Environment: ``AGNODOCS_CACHE_DIR`` and ``AGNODOCS_CACHE_MAX_MB``. Safe to share between threads;
+    several processes may share one directory (writes are atomic renames).
+    """
+
+    def __init__(self, root: str | None = None, max_bytes: int | None = None):
+        self.root = root or settings.CACHE_DIR
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("AGNODOCS_CACHE_MAX_MB") or DEFAULT_MAX_MB) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Shipped to batch workers as configuration; counters and the lock stay per process.
+        return {"root": self.root, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["root"], state["max_bytes"])
+
+    def key(self, template_path: str, mapping: Dict[str, Any]) -> str:
+        from .compiled import COMPILED_VERSION
+
+        raw = f"{CACHE_VERSION}:{COMPILED_VERSION}:{template_hash(template_path)}:{mapping_hash(mapping)}"
+        return hashlib.sha256(raw.encode("ascii")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.docx")
+
+    def lookup(self, key: str) -> str | None:
+        """Path of the cached document (marked as recently used), or ``None`` on a miss."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def store(self, key: str, data: bytes) -> str:
+        path = self.path_for(key)
+        ensure_dir(os.path.dirname(path))
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as handler:
+            handler.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+        return path
+
+    def store_file(self, key: str, source_path: str) -> str:
+        with open(source_path, "rb") as handler:
+            return self.store(key, handler.read())
+
+    def _entries(self) -> list:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(".docx"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """Drop least recently used documents until the cache is back under 90% of the cap."""
+        from .logging_utils import setup_logger, jlog
+
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = freed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            freed += size
+            removed += 1
+        with self._lock:
+            self._size = total
+            self.evicted += removed
+        if removed:
+            jlog(setup_logger(), "INFO", "FILL_CACHE_EVICT", removed=removed, freed_bytes=freed, size_bytes=total)
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evicted": self.evicted}
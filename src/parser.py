@@ -1,13 +1,26 @@
-from typing import Dict, Any
-from docx import Document
+from typing import Dict, Any, Iterator, List
 import re
 import os
 import unicodedata
+import zipfile
 from collections import OrderedDict
+from .computed import declare_computed
 from .logging_utils import setup_logger, jlog
+from .timing import Span
+
+# Bump whenever spec output changes, so `index` rebuilds specs produced by older parsers.
+PARSER_VERSION = 4
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W_P = f"{{{W_NS}}}p"
+W_T = f"{{{W_NS}}}t"
+MAIN_PART = "word/document.xml"
 
 # Accept broader Unicode/ASCII placeholder names. Avoid greedy match ending at first closing brace.
 PLACEHOLDER_RE = re.compile(r"\{([^{}:\s]+)(?::([^{}]+))?\}")
+# {#OUTORGADO} ... {/OUTORGADO}: the paragraphs (or table rows) in between are repeated once per record.
+REPEAT_OPEN = "#"
+REPEAT_CLOSE = "/"
 ENTITY_SUFFIXES = {
     "OUTORGANTE",
     "OUTORGADO",
@@ -77,32 +90,114 @@ def _strip_accents(text: str) -> str:
     return "".join(ch for ch in normalized if not unicodedata.combining(ch))
 
 
+def is_story_part(name: str) -> bool:
+    """Zip members that may hold document text: body, headers, footers, notes, comments."""
+    return name.startswith("word/") and name.endswith(".xml") and name.count("/") == 1
+
+
+def iter_paragraphs(package: zipfile.ZipFile, part: str) -> Iterator[tuple[int, List[str]]]:
+    """Stream ``(paragraph_index, own w:t texts)`` for each paragraph of a part, in document order.
+
+    Paragraphs nested in text boxes are yielded on their own and their text is not folded into the
+    enclosing paragraph. Elements are cleared as soon as they are consumed, so memory stays flat.
+    """
+    from lxml import etree
+
+    stack: List[tuple[int, List[str]]] = []
+    count = 0
+    with package.open(part) as stream:
+        for event, elem in etree.iterparse(stream, events=("start", "end"), tag=(W_P, W_T), huge_tree=True):
+            if elem.tag == W_T:
+                if event == "end" and stack:
+                    stack[-1][1].append(elem.text or "")
+                continue
+            if event == "start":
+                stack.append((count, []))
+                count += 1
+                continue
+            yield stack.pop()
+            elem.clear(keep_tail=True)
+            if not stack:
+                # Everything before this paragraph (earlier rows, cells, body blocks) is done too.
+                for node in (elem, *elem.iterancestors()):
+                    while node.getprevious() is not None:
+                        del node.getparent()[0]
+
+
 def read_docx_placeholders(path: str) -> Dict[str, Any]:
-    doc = Document(path)
-    texts = []
-
-    for paragraph in doc.paragraphs:
-        text = (paragraph.text or "").strip()
-        if text:
-            texts.append(text)
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                text = (cell.text or "").strip()
-                if text:
+    """Placeholders of every story part, in document order, with part/paragraph location.
+
+    ``split`` is true when the placeholder text is spread over several runs (Word does that after
+    edits or spell-check); the fillers stitch those back before replacing.
+    """
+    with Span("parser.scan"):
+        texts, placeholders, titles, all_names, markers = [], [], [], [], []
+        with zipfile.ZipFile(path) as package:
+            parts = sorted((name for name in package.namelist() if is_story_part(name)), key=lambda n: n != MAIN_PART)
+            for part in parts:
+                for paragraph, runs in iter_paragraphs(package, part):
+                    text = "".join(runs)
+                    if "{" in text:
+                        bounds, position = [], 0
+                        for run in runs:
+                            position += len(run)
+                            bounds.append(position)
+                        for match in PLACEHOLDER_RE.finditer(text):
+                            name = match.group(1)
+                            if name[0] in (REPEAT_OPEN, REPEAT_CLOSE):
+                                markers.append({"marker": name[0], "entity": name[1:], "part": part})
+                                continue
+                            split = len(runs) > 1 and any(match.start() < bound < match.end() for bound in bounds)
+                            placeholders.append(
+                                {
+                                    "raw": match.group(0),
+                                    "name": name,
+                                    "hint": match.group(2) or "",
+                                    "part": part,
+                                    "paragraph": paragraph,
+                                    "split": split,
+                                }
+                            )
+                            all_names.append(name)
+                    text = text.strip()
+                    if not text:
+                        continue
                     texts.append(text)
+                    if (text.endswith(":") or text.upper().isupper()) and len(text) < 120:
+                        titles.append(text)
 
-    placeholders, titles, all_names = [], [], []
-    for text in texts:
-        for match in PLACEHOLDER_RE.finditer(text):
-            name = match.group(1)
-            placeholders.append({"raw": match.group(0), "name": name, "hint": match.group(2) or ""})
-            all_names.append(name)
-        upper = text.upper()
-        if (text.endswith(":") or upper.isupper()) and len(text) < 120:
-            titles.append(text.strip())
+    return {
+        "texts": texts,
+        "placeholders": placeholders,
+        "titles": titles,
+        "all_names": all_names,
+        "repeat": repeat_blocks(markers),
+    }
 
-    return {"texts": texts, "placeholders": placeholders, "titles": titles, "all_names": all_names}
+
+def repeat_blocks(markers: List[Dict[str, str]]) -> Dict[str, List[str]]:
+    """``{ENTITY: [parts]}`` from the repeat markers in document order; blocks must be closed and not nested."""
+    blocks: Dict[str, List[str]] = {}
+    current: Dict[str, str] | None = None
+    for marker in markers:
+        if marker["marker"] == REPEAT_OPEN:
+            if current is not None:
+                raise ValueError(f"bloco {{#{marker['entity']}}} aberto dentro de {{#{current['entity']}}}")
+            current = marker
+            continue
+        closes = current is not None and (current["entity"].casefold(), current["part"]) == (
+            marker["entity"].casefold(),
+            marker["part"],
+        )
+        if not closes:
+            raise ValueError(f"{{/{marker['entity']}}} sem {{#{marker['entity']}}} correspondente")
+        parts = blocks.setdefault(current["entity"].upper(), [])
+        if current["part"] not in parts:
+            parts.append(current["part"])
+        current = None
+    if current is not None:
+        raise ValueError(f"bloco {{#{current['entity']}}} sem {{/{current['entity']}}}")
+    return blocks
 
 
 def infer_multiplicity_from_filename(fname: str) -> str:
@@ -121,10 +216,13 @@ def build_spec_from_docx(path: str) -> Dict[str, Any]:
     filename = os.path.basename(path)
     jlog(logger, "INFO", "INDEX_START", file=filename)
 
-    data = read_docx_placeholders(path)
+    total_span = Span("index.total").start()
+    with Span("index.read") as read_span:
+        data = read_docx_placeholders(path)
     placeholders = data["placeholders"]
     all_names = list(dict.fromkeys(data["all_names"]))
-    jlog(logger, "INFO", "INDEX_PLACEHOLDERS", file=filename, count=len(placeholders))
+    jlog(logger, "INFO", "INDEX_PLACEHOLDERS", file=filename, count=len(placeholders), read_ms=read_span.ms)
+    infer_span = Span("index.infer").start()
 
     entities = set()
     fields_by_key: "OrderedDict[tuple[str, str], Dict[str, Any]]" = OrderedDict()
@@ -159,6 +257,9 @@ def build_spec_from_docx(path: str) -> Dict[str, Any]:
                     hints.add(normalized)
 
     entity_lookup: Dict[str, str] = {suffix.casefold(): suffix for suffix in ENTITY_SUFFIXES}
+    # A repeat block names its entity outright, however few placeholders it has.
+    for entity in data["repeat"]:
+        entity_lookup.setdefault(entity.casefold(), entity)
     for norm, count in suffix_counts.items():
         if count < ENTITY_MIN_OCCURRENCES:
             continue
@@ -168,6 +269,7 @@ def build_spec_from_docx(path: str) -> Dict[str, Any]:
                 continue
             # Use uppercase to align with existing specs.
             entity_lookup[norm] = suffix_original[norm].upper()
+    entity_of: Dict[str, str] = {}
     for placeholder in placeholders:
         name = placeholder["name"]
         parts = [part for part in name.split("_") if part]
@@ -198,6 +300,7 @@ def build_spec_from_docx(path: str) -> Dict[str, Any]:
         if entity:
             entities.add(entity)
 
+        entity_of[name] = entity or "GLOBAL"
         key = (entity or "GLOBAL", base)
         if key not in fields_by_key:
             fields_by_key[key] = {
@@ -214,7 +317,13 @@ def build_spec_from_docx(path: str) -> Dict[str, Any]:
             if idx >= 1:
                 entity_max_indices[entity] = max(entity_max_indices.get(entity, 1), idx)
 
-    fields = list(fields_by_key.values())
+    # Computed placeholders are not asked for; the inputs they are derived from are.
+    computed, computed_inputs = declare_computed(placeholders, entity_of)
+    outputs = {item["name"] for item in computed}
+    fields = [
+        field for field in fields_by_key.values() if PLACEHOLDER_RE.match(field["placeholder"]).group(1) not in outputs
+    ]
+    fields.extend(computed_inputs)
     groups = []
     gid = 1
     for entity in sorted(x for x in entities if x != "GLOBAL"):
@@ -227,9 +336,20 @@ def build_spec_from_docx(path: str) -> Dict[str, Any]:
         groups.append({"id": f"G{gid}", "label": "Dados do Ato", "fields": global_fields})
 
     multiplicity = infer_multiplicity_from_filename(path)
-    meta = {"casais": "_OU_CASAIS" in filename}
+    meta: Dict[str, Any] = {"casais": "_OU_CASAIS" in filename}
     if entity_max_indices:
         meta["inferred_counts"] = entity_max_indices
+    if data["repeat"]:
+        meta["repeat"] = {entity_lookup[entity.casefold()]: parts for entity, parts in data["repeat"].items()}
+    # Where each placeholder lives, so the filler only touches those parts.
+    meta["parts"] = {}
+    for placeholder in placeholders:
+        names = meta["parts"].setdefault(placeholder["part"], [])
+        if placeholder["name"] not in names:
+            names.append(placeholder["name"])
+    split_names = [placeholder["name"] for placeholder in placeholders if placeholder["split"]]
+    if split_names:
+        meta["split_placeholders"] = list(dict.fromkeys(split_names))
     spec = {
         "name": os.path.splitext(filename)[0],
         "source": filename,
@@ -239,10 +359,22 @@ def build_spec_from_docx(path: str) -> Dict[str, Any]:
         "meta": meta,
         "all_placeholders": all_names,
     }
+    if computed:
+        spec["computed"] = computed
+    infer_span.stop()
+    total_span.stop()
     entities_payload = list(spec["entities"])
     if global_fields:
         entities_payload.append("GLOBAL")
-    jlog(logger, "INFO", "INDEX_ENTITIES", file=filename, entities=entities_payload)
-    jlog(logger, "INFO", "INDEX_MULTIPLICITY", file=filename, multiplicity=multiplicity, casais=meta["casais"])
+    jlog(logger, "INFO", "INDEX_ENTITIES", file=filename, entities=entities_payload, infer_ms=infer_span.ms)
+    jlog(
+        logger,
+        "INFO",
+        "INDEX_MULTIPLICITY",
+        file=filename,
+        multiplicity=multiplicity,
+        casais=meta["casais"],
+        duration_ms=total_span.ms,
+    )
 
     return spec
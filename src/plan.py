@@ -0,0 +1,168 @@
+"""Collection plan: what a spec asks for, derived once and shared by ``run``, ``fill`` and ``fill-batch``."""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+from .computed import ComputedField, Derivation, bind, computed_fields, derive
+from .validators import guess_validator
+
+PLAN_CACHE_SIZE = 256
+
+
+class PlanField(NamedTuple):
+    group: str
+    entity: str
+    name: str
+    placeholder: str
+    validator: Callable[[str], bool]
+    hint: str | None
+    rule: str | None
+
+
+class RecordCheck(NamedTuple):
+    """``mapping`` uses the exact ``{PLACEHOLDER}`` keys; ``errors`` lists values rejected by the validators."""
+
+    mapping: Dict[str, str]
+    errors: List[Dict[str, Any]]
+    unknown: List[str]
+
+
+def bare_name(key: str) -> str:
+    """``"{NOME_OUTORGANTE:nome completo}"`` / ``" NOME_OUTORGANTE "`` -> ``"NOME_OUTORGANTE"``."""
+    key = key.strip()
+    if key.startswith("{") and key.endswith("}"):
+        key = key[1:-1]
+    return key.split(":", 1)[0]
+
+
+class CollectionPlan:
+    """Fields with their validators plus casefold lookup tables over the spec's placeholders."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.name: str = spec["name"]
+        self.fields: List[PlanField] = []
+        self._validators: Dict[str, Tuple[Callable[[str], bool], str | None, str | None]] = {}
+        for group in spec.get("groups", []):
+            for field in group.get("fields", []):
+                self.fields.append(
+                    PlanField(
+                        group["id"], field["entity"], field["name"], field["placeholder"], *self.validator(field["name"])
+                    )
+                )
+
+        # casefolded placeholder name -> exact name (first occurrence wins, as the old linear scan did)
+        self._names: Dict[str, str] = {}
+        for name in spec.get("all_placeholders", []):
+            self._names.setdefault(name.casefold(), name)
+        # fields asked for without a placeholder of their own (inputs of computed fields, e.g. DATA_ATO)
+        self._inputs = set()
+        for group in spec.get("groups", []):
+            for field in group.get("fields", []):
+                if field.get("input"):
+                    name = bare_name(field["placeholder"])
+                    self._names.setdefault(name.casefold(), name)
+                    self._inputs.add(name.casefold())
+        # casefolded name -> the field it fills, so bulk records validate with that field's rule
+        self._owners: Dict[str, PlanField] = {}
+        # name -> raw placeholder text, for placeholders written with a hint ({NAME:hint})
+        self._raw: Dict[str, str] = {}
+        entities = {field.entity.casefold(): field.entity for field in self.fields if field.entity != "GLOBAL"}
+        by_base = {(field.entity, field.name.casefold()): field for field in self.fields}
+        for name_cf, name in self._names.items():
+            entity, base = "GLOBAL", name
+            parts = [part for part in name.split("_") if part]
+            if len(parts) >= 2 and parts[-1].isdigit() and parts[-2].casefold() in entities:
+                entity, base = entities[parts[-2].casefold()], "_".join(parts[:-2]) or parts[-2]
+            elif len(parts) >= 2 and parts[-1].casefold() in entities:
+                entity, base = entities[parts[-1].casefold()], "_".join(parts[:-1])
+            owner = by_base.get((entity, base.casefold()))
+            if owner is not None:
+                self._owners[name_cf] = owner
+        for field in self.fields:
+            self._raw.setdefault(bare_name(field.placeholder), field.placeholder)
+        for item in spec.get("computed") or []:
+            if item.get("placeholder"):
+                self._raw.setdefault(bare_name(item["placeholder"]), item["placeholder"])
+        # entities filled through a {#ENTITY} repeat block: any record index is a valid key
+        self._repeat = {entity.casefold() for entity in (spec.get("meta") or {}).get("repeat") or {}}
+        self.computed: List[ComputedField] = computed_fields(spec)
+        self.derivations: List[Derivation] = bind(self)
+
+    def validator(self, field_name: str) -> Tuple[Callable[[str], bool], str | None, str | None]:
+        cached = self._validators.get(field_name)
+        if cached is None:
+            cached = self._validators[field_name] = guess_validator(field_name)
+        return cached
+
+    def key_for(self, base: str, entity: str, idx: int) -> str | None:
+        """``{BASE_ENTITY_idx}`` as written in the template (``{BASE_ENTITY}`` also serves idx 1).
+
+        Inside a repeat block ``{BASE_ENTITY}`` stands for every record, so idx > 1 gets ``{BASE_ENTITY_idx}``;
+        so do input fields, which are never written in the template.
+        """
+        name = self._names.get(f"{base}_{entity}_{idx}".casefold())
+        if name is None:
+            stem = self._names.get(f"{base}_{entity}".casefold())
+            if stem is not None and idx > 1 and (entity.casefold() in self._repeat or stem.casefold() in self._inputs):
+                return f"{{{stem}_{idx}}}"
+            if idx == 1:
+                name = stem
+        return None if name is None else self._raw.get(name, f"{{{name}}}")
+
+    def resolve_key(self, key: str) -> str | None:
+        """Exact placeholder key for ``{nome_outorgante_1}``, ``NOME_OUTORGANTE_1`` and the like."""
+        bare = bare_name(key)
+        name = self._names.get(bare.casefold())
+        if name is None and (self._repeat or self._inputs):
+            parts = bare.rsplit("_", 2)
+            if len(parts) == 3 and parts[2].isdigit() and int(parts[2]) >= 1:
+                return self.key_for(parts[0], parts[1], int(parts[2]))
+        return None if name is None else self._raw.get(name, f"{{{name}}}")
+
+    def derive(self, mapping: Dict[str, str]) -> Dict[str, str]:
+        """``mapping`` completed with the spec's computed placeholders (see ``computed``)."""
+        return derive(self, mapping)
+
+    def check_record(self, record: Dict[str, Any]) -> RecordCheck:
+        """Map a ``{PLACEHOLDER: value}`` record onto the spec, validate every known value and derive the rest.
+
+        Keys that match no placeholder are kept as-is (the document may still contain them, e.g. in a
+        header) and reported in ``unknown``.
+        """
+        mapping: Dict[str, str] = {}
+        errors: List[Dict[str, Any]] = []
+        unknown: List[str] = []
+        for key, value in record.items():
+            value = "" if value is None else str(value)
+            exact = self.resolve_key(key)
+            if exact is None:
+                mapping[key] = value
+                unknown.append(key)
+                continue
+            mapping[exact] = value
+            owner = self._owners.get(bare_name(exact).casefold())
+            if owner is None and self._repeat:
+                owner = self._owners.get(bare_name(exact).rsplit("_", 1)[0].casefold())
+            validator, _, rule = self.validator(owner.name if owner else bare_name(exact))
+            if not validator(value):
+                errors.append({"key": exact, "value": value, "rule": rule})
+        return RecordCheck(self.derive(mapping), errors, unknown)
+
+    def check_records(self, records: Iterable[Dict[str, Any]]) -> Iterator[RecordCheck]:
+        for record in records:
+            yield self.check_record(record)
+
+
+# spec name -> (spec dict, plan); the identity check drops the plan when the spec is reloaded.
+_PLANS: "OrderedDict[str, Tuple[Dict[str, Any], CollectionPlan]]" = OrderedDict()
+
+
+def plan_for(spec: Dict[str, Any]) -> CollectionPlan:
+    cached = _PLANS.get(spec["name"])
+    if cached is not None and cached[0] is spec:
+        _PLANS.move_to_end(spec["name"])
+        return cached[1]
+    plan = CollectionPlan(spec)
+    _PLANS[spec["name"]] = (spec, plan)
+    while len(_PLANS) > PLAN_CACHE_SIZE:
+        _PLANS.popitem(last=False)
+    return plan
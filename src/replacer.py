@@ -0,0 +1,78 @@
+import re
+from typing import Callable, List
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W_P = f"{{{W_NS}}}p"
+W_T = f"{{{W_NS}}}t"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+
+def own_text_nodes(paragraph) -> List:
+    """``w:t`` nodes of ``paragraph``, excluding those of nested paragraphs (text boxes)."""
+    nodes = []
+    for node in paragraph.iter(W_T):
+        parent = node.getparent()
+        while parent is not None and parent.tag != W_P:
+            parent = parent.getparent()
+        if parent is paragraph:
+            nodes.append(node)
+    return nodes
+
+
+def splice_paragraph(paragraph, pattern: re.Pattern, replace: Callable[[re.Match], str]) -> int:
+    """Replace every ``pattern`` match in the paragraph text, even across run boundaries.
+
+    The replacement is written into the run where the match starts (keeping that
+    run's formatting); the matched text is removed from the following runs.
+    """
+    nodes = own_text_nodes(paragraph)
+    if not nodes:
+        return 0
+    texts = [node.text or "" for node in nodes]
+    full = "".join(texts)
+    matches = list(pattern.finditer(full))
+    if not matches:
+        return 0
+
+    starts: List[int] = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text)
+
+    def node_at(position: int, lo: int) -> int:
+        idx = lo
+        while idx + 1 < len(starts) and starts[idx + 1] <= position:
+            idx += 1
+        return idx
+
+    touched = set()
+    # Right to left, so node start offsets stay valid for earlier matches.
+    for match in reversed(matches):
+        start, end = match.span()
+        first = node_at(start, 0)
+        last = node_at(end - 1, first)
+        value = replace(match)
+        if first == last and value == match.group(0):
+            continue
+        head = texts[first][: start - starts[first]]
+        if first == last:
+            texts[first] = head + value + texts[first][end - starts[first]:]
+        else:
+            texts[first] = head + value
+            for idx in range(first + 1, last):
+                texts[idx] = ""
+                touched.add(idx)
+            texts[last] = texts[last][end - starts[last]:]
+            touched.add(last)
+        touched.add(first)
+
+    for idx in touched:
+        nodes[idx].text = texts[idx]
+        nodes[idx].set(XML_SPACE, "preserve")
+    return len(matches)
+
+
+def stitch_placeholders(root, pattern: re.Pattern) -> int:
+    """Merge run-split occurrences of ``pattern`` into their first run, leaving the text unchanged."""
+    return sum(splice_paragraph(p, pattern, lambda match: match.group(0)) for p in root.iter(W_P))
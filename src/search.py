@@ -0,0 +1,191 @@
+"""Inverted index over the spec catalog: placeholder, entity, multiplicity and ``casais`` -> slugs.
+
+Built by ``index`` next to the catalog (``specs/.index/search.json``) and loaded once per process, so a
+query never opens the spec files.
+"""
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Set, Tuple
+
+from . import spec_repo
+from .config import settings
+from .keymatch import normalize_key
+
+SEARCH_NAME = "search.json"
+SEARCH_VERSION = 1
+
+_INDEXED_RE = re.compile(r" \d+$")
+_LOADED: Dict[str, Any] = {"mtime_ns": None, "index": None}
+
+
+def search_path() -> str:
+    return os.path.join(settings.INDEX_DIR, SEARCH_NAME)
+
+
+def normalize_multiplicity(value: str) -> str:
+    """``"[V-1]"`` / ``"v-1"`` -> ``"V-1"``."""
+    return (value or "").strip().strip("[]").upper()
+
+
+def _terms(placeholders: Iterable[str]) -> Set[str]:
+    terms: Set[str] = set()
+    for name in placeholders:
+        term = normalize_key(name)
+        terms.add(term)
+        # {NOME_OUTORGANTE_1} is also found as NOME_OUTORGANTE
+        terms.add(_INDEXED_RE.sub("", term))
+    terms.discard("")
+    return terms
+
+
+def build_search_index(specs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Posting lists (sorted positions into ``slugs``) for every spec of the catalog."""
+    slugs = sorted(specs)
+    meta: List[Dict[str, Any]] = []
+    terms: Dict[str, List[int]] = {}
+    entities: Dict[str, List[int]] = {}
+    multiplicity: Dict[str, List[int]] = {}
+    casais: List[int] = []
+    for position, slug in enumerate(slugs):
+        spec = specs[slug]
+        spec_entities = sorted(spec.get("entities") or [])
+        mult = normalize_multiplicity(spec.get("multiplicity") or "")
+        is_casal = bool((spec.get("meta") or {}).get("casais"))
+        meta.append({"multiplicity": mult, "entities": spec_entities, "casais": is_casal})
+        for term in _terms(spec.get("all_placeholders") or []):
+            terms.setdefault(term, []).append(position)
+        for entity in spec_entities:
+            entities.setdefault(entity.casefold(), []).append(position)
+        multiplicity.setdefault(mult, []).append(position)
+        if is_casal:
+            casais.append(position)
+    return {
+        "version": SEARCH_VERSION,
+        "slugs": slugs,
+        "meta": meta,
+        "terms": terms,
+        "entities": entities,
+        "multiplicity": multiplicity,
+        "casais": casais,
+    }
+
+
+def write_search_index() -> str:
+    """Rebuild ``search.json`` from the catalog written by ``index``."""
+    with open(spec_repo.catalog_path(), "r", encoding="utf-8") as handler:
+        catalog = json.load(handler).get("specs", {})
+    data = build_search_index({slug: entry["spec"] for slug, entry in catalog.items()})
+    path = search_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handler:
+        json.dump(data, handler, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return path
+
+
+class SearchHit(NamedTuple):
+    slug: str
+    multiplicity: str
+    entities: List[str]
+    casais: bool
+
+
+class SearchIndex:
+    def __init__(self, data: Dict[str, Any]):
+        self.slugs: List[str] = data["slugs"]
+        self.meta: List[Dict[str, Any]] = data["meta"]
+        self.terms: Dict[str, List[int]] = data["terms"]
+        self.entities: Dict[str, List[int]] = data["entities"]
+        self.multiplicity: Dict[str, List[int]] = data["multiplicity"]
+        self.casais: Set[int] = set(data["casais"])
+        self._vocabulary: List[str] | None = None
+
+    def expand(self, term: str, fuzzy: float | None = None) -> List[Tuple[str, float]]:
+        """Indexed terms a query term stands for: itself when indexed, else (with ``fuzzy``) the close ones."""
+        normalized = normalize_key(term)
+        if normalized in self.terms:
+            return [(normalized, 100.0)]
+        if fuzzy is None or not normalized:
+            return []
+        from rapidfuzz import fuzz, process
+
+        if self._vocabulary is None:
+            self._vocabulary = list(self.terms)
+        found = process.extract(
+            normalized, self._vocabulary, scorer=fuzz.token_sort_ratio, score_cutoff=fuzzy, limit=None
+        )
+        return [(choice, round(score, 1)) for choice, score, _ in found]
+
+    def search(
+        self,
+        terms: Iterable[str] = (),
+        match_any: bool = False,
+        entities: Iterable[str] = (),
+        multiplicity: str | None = None,
+        casais: bool | None = None,
+        fuzzy: float | None = None,
+    ) -> Tuple[List[SearchHit], Dict[str, List[Tuple[str, float]]]]:
+        """Slugs matching every term (``match_any``: at least one) and every filter.
+
+        A term may list alternatives as ``CPF_OUTORGADO|CNPJ_OUTORGADO``. Returns the hits plus, per query
+        term, the indexed terms it was expanded to.
+        """
+        expansions: Dict[str, List[Tuple[str, float]]] = {}
+        selected: Set[int] | None = None
+        for term in terms:
+            matched: Set[int] = set()
+            expansions[term] = []
+            for alternative in term.split("|"):
+                for indexed, score in self.expand(alternative, fuzzy):
+                    expansions[term].append((indexed, score))
+                    matched.update(self.terms[indexed])
+            if selected is None:
+                selected = matched
+            elif match_any:
+                selected |= matched
+            else:
+                selected &= matched
+        if selected is None:
+            selected = set(range(len(self.slugs)))
+        for entity in entities:
+            selected &= set(self.entities.get(entity.casefold(), ()))
+        if multiplicity:
+            selected &= set(self.multiplicity.get(normalize_multiplicity(multiplicity), ()))
+        if casais is not None:
+            selected = selected & self.casais if casais else selected - self.casais
+        hits = [
+            SearchHit(self.slugs[pos], self.meta[pos]["multiplicity"], self.meta[pos]["entities"], pos in self.casais)
+            for pos in sorted(selected)
+        ]
+        return hits, expansions
+
+
+def load_search_index() -> SearchIndex:
+    """The persisted index, read once per process (and again only if ``index`` rewrote it).
+
+    A missing or outdated file (older than the catalog, or another format version) is rebuilt first.
+    """
+    path = search_path()
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+        catalog_mtime = os.stat(spec_repo.catalog_path()).st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = catalog_mtime = None
+    if mtime_ns is not None and _LOADED["mtime_ns"] == mtime_ns:
+        return _LOADED["index"]
+    data = None
+    if mtime_ns is not None and mtime_ns >= catalog_mtime:
+        with open(path, "r", encoding="utf-8") as handler:
+            data = json.load(handler)
+    if data is None or data.get("version") != SEARCH_VERSION:
+        if not os.path.exists(spec_repo.catalog_path()):
+            spec_repo.write_catalog()
+        write_search_index()
+        with open(path, "r", encoding="utf-8") as handler:
+            data = json.load(handler)
+        mtime_ns = os.stat(path).st_mtime_ns
+    _LOADED.update(mtime_ns=mtime_ns, index=SearchIndex(data))
+    return _LOADED["index"]
+
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+from . import spec_repo
+from .compiled import get_compiled
+from .config import settings
+from .filler import fill_docx_bytes
+from .logging_utils import setup_logger, jlog
+from .plan import plan_for
+from .session import CollectionSession, SessionManager
+
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MAX_BODY_BYTES = 2 * 1024 * 1024
+HEADER_TIMEOUT = 10.0
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str | None = None, details: Dict | None = None):
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.message = message or status.phrase
+        self.details = details or {}
+
+
+class FillService:
+    """Long-running HTTP front end over the compiled-template fill path."""
+
+    def __init__(self, workers: int = 4, max_concurrency: int = 32, timeout: float = 30.0, cache=None):
+        self.logger = setup_logger()
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fill")
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.timeout = timeout
+        self.sessions = SessionManager()
+
+    def _template_path(self, slug: str) -> str:
+        # Slugs come URL-decoded from the path: only catalog names may reach spec_path (no "../" tricks).
+        if not spec_repo.has_spec(slug):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"spec não encontrado: {slug}")
+        try:
+            spec = spec_repo.load_spec(slug)
+        except FileNotFoundError:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"spec não encontrado: {slug}")
+        return os.path.join(settings.TEMPLATES, spec["source"])
+
+    def warm(self) -> int:
+        """Load the compiled form of every indexed template into memory; failures are logged and skipped."""
+        warmed = 0
+        for slug in spec_repo.list_specs():
+            try:
+                path = os.path.join(settings.TEMPLATES, spec_repo.load_spec(slug)["source"])
+                if os.path.exists(path):
+                    get_compiled(path)
+                    warmed += 1
+            except Exception as exc:  # one broken template must not keep the server from starting
+                jlog(self.logger, "WARN", "SERVICE_WARM_FAIL", slug=slug, error=f"{type(exc).__name__}: {exc}")
+        return warmed
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(self.slots.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "servidor ocupado")
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.executor, func, *args), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(HTTPStatus.GATEWAY_TIMEOUT, "tempo de preenchimento excedido")
+        finally:
+            self.slots.release()
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[HTTPStatus, str, bytes, Dict[str, str]]:
+        parts = [unquote(part) for part in path.strip("/").split("/") if part]
+        if method == "GET" and parts == ["health"]:
+            health = {"status": "ok", "sessions": len(self.sessions), **({"cache": self.cache.stats()} if self.cache is not None else {})}
+            return HTTPStatus.OK, "application/json", json.dumps(health).encode("utf-8"), {}
+        if method == "GET" and parts == ["specs"]:
+            payload = json.dumps(spec_repo.list_specs(), ensure_ascii=False).encode("utf-8")
+            return HTTPStatus.OK, "application/json", payload, {}
+        if method == "GET" and len(parts) == 2 and parts[0] == "specs":
+            self._template_path(parts[1])
+            payload = json.dumps(spec_repo.load_spec(parts[1]), ensure_ascii=False).encode("utf-8")
+            return HTTPStatus.OK, "application/json", payload, {}
+        if method == "POST" and len(parts) == 2 and parts[0] == "fill":
+            slug = parts[1]
+            template_path = self._template_path(slug)
+            try:
+                mapping = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "corpo deve ser um JSON")
+            if not isinstance(mapping, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "corpo deve ser um objeto { \"{PLACEHOLDER}\": \"valor\" }")
+            record = {str(key): "" if value is None else str(value) for key, value in mapping.items()}
+            check = plan_for(spec_repo.load_spec(slug)).check_record(record)
+            if check.unknown:
+                jlog(self.logger, "WARN", "FILL_UNKNOWN_KEYS", slug=slug, keys=check.unknown)
+            if check.errors:
+                jlog(self.logger, "WARN", "FILL_INVALID_FIELDS", slug=slug, fields=check.errors)
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "campos inválidos", {"fields": check.errors})
+            data = await self._run(fill_docx_bytes, template_path, check.mapping, self.cache)
+            filename = quote(f"{slug}_preenchido.docx")
+            headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"}
+            return HTTPStatus.OK, DOCX_CONTENT_TYPE, data, headers
+        if parts and parts[0] == "sessions":
+            return await self._dispatch_session(method, parts[1:], body)
+        if parts and parts[0] in {"health", "specs", "fill"}:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+
+    def _session_state(self, session: CollectionSession, spec: Dict, extra: Dict | None = None) -> bytes:
+        question = session.question(spec)
+        state = {
+            "id": session.id,
+            "slug": session.slug,
+            "question": None if question is None else question._asdict(),
+            "progress": session.progress(spec),
+            "done": question is None,
+            **(extra or {}),
+        }
+        return json.dumps(state, ensure_ascii=False).encode("utf-8")
+
+    async def _dispatch_session(
+        self, method: str, parts: list, body: bytes
+    ) -> Tuple[HTTPStatus, str, bytes, Dict[str, str]]:
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "corpo deve ser um JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "corpo deve ser um objeto JSON")
+        if method == "POST" and not parts:
+            slug = str(payload.get("slug") or "")
+            self._template_path(slug)
+            prefill = payload.get("prefill")
+            try:
+                session = self.sessions.create(slug, prefill=prefill if isinstance(prefill, dict) else None)
+            except OverflowError as exc:
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, str(exc))
+            spec = spec_repo.load_spec(slug)
+            return HTTPStatus.CREATED, "application/json", self._session_state(session, spec), {}
+        if not parts:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+        try:
+            session = self.sessions.get(parts[0])
+        except KeyError:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "sessão não encontrada ou expirada")
+        template_path = self._template_path(session.slug)
+        spec = spec_repo.load_spec(session.slug)
+        action = parts[1] if len(parts) == 2 else None
+        if method == "GET" and len(parts) == 1:
+            return HTTPStatus.OK, "application/json", self._session_state(session, spec), {}
+        if method == "DELETE" and len(parts) == 1:
+            self.sessions.drop(session.id)
+            return HTTPStatus.OK, "application/json", b'{"deleted": true}', {}
+        if method == "POST" and action == "answer":
+            if session.done(spec):
+                raise HTTPError(HTTPStatus.CONFLICT, "a coleta já terminou")
+            result = session.submit(spec, "" if payload.get("value") is None else str(payload["value"]))
+            extra = {"accepted": result.ok, **({"error": result.error} if result.error else {})}
+            return HTTPStatus.OK, "application/json", self._session_state(session, spec, extra), {}
+        if method == "POST" and action == "back":
+            session.back(spec)
+            return HTTPStatus.OK, "application/json", self._session_state(session, spec), {}
+        if method == "GET" and action == "mapping":
+            payload_out = json.dumps(session.mapping(spec), ensure_ascii=False).encode("utf-8")
+            return HTTPStatus.OK, "application/json", payload_out, {}
+        if method == "POST" and action == "fill":
+            if not session.done(spec):
+                raise HTTPError(HTTPStatus.CONFLICT, "a coleta ainda não terminou")
+            data = await self._run(fill_docx_bytes, template_path, session.mapping(spec), self.cache)
+            filename = quote(f"{session.slug}_preenchido.docx")
+            headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"}
+            return HTTPStatus.OK, DOCX_CONTENT_TYPE, data, headers
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes] | None:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=HEADER_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError, ConnectionError):
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST)
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await asyncio.wait_for(reader.readexactly(length), timeout=self.timeout) if length else b""
+        return method.upper(), urlsplit(target).path, headers, body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                started = time.perf_counter()
+                keep_alive = False
+                method = path = "-"
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, content_type, payload, extra = await self.dispatch(method, path, body)
+                except HTTPError as exc:
+                    status, content_type, extra = exc.status, "application/json", {}
+                    payload = json.dumps({"error": exc.message, **exc.details}, ensure_ascii=False).encode("utf-8")
+                except Exception as exc:
+                    jlog(self.logger, "ERROR", "SERVICE_ERROR", path=path, error=f"{type(exc).__name__}: {exc}")
+                    status, content_type, extra = HTTPStatus.INTERNAL_SERVER_ERROR, "application/json", {}
+                    payload = b'{"error": "erro interno"}'
+                head = [
+                    f"HTTP/1.1 {status.value} {status.phrase}",
+                    f"Content-Type: {content_type}",
+                    f"Content-Length: {len(payload)}",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                    *(f"{name}: {value}" for name, value in extra.items()),
+                ]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                jlog(
+                    self.logger,
+                    "INFO",
+                    "SERVICE_REQUEST",
+                    method=method,
+                    path=path,
+                    status=status.value,
+                    bytes=len(payload),
+                    ms=round((time.perf_counter() - started) * 1000, 2),
+                )
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        loop = asyncio.get_running_loop()
+        warmed = await loop.run_in_executor(self.executor, self.warm)
+        server = await asyncio.start_server(self.handle, host, port)
+        sweeper = asyncio.create_task(self.sessions.sweep())
+        jlog(self.logger, "INFO", "SERVICE_START", host=host, port=port, templates=warmed)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+
+def run_service(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    workers: int = 4,
+    max_concurrency: int = 32,
+    timeout: float = 30.0,
+    cache=None,
+) -> None:
+    async def main() -> None:
+        service = FillService(workers=workers, max_concurrency=max_concurrency, timeout=timeout, cache=cache)
+        await service.serve(host, port)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
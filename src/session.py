@@ -0,0 +1,266 @@
+"""Guided collection as a resumable state machine: ``question`` / ``submit`` / ``back``.
+
+A session keeps only its slug, the answers given so far and the optional prefill; everything else (which
+entities are "V", how many records each has, the field questions) is derived from the answers and the spec,
+and the field questions are shared by every session with the same spec and counts. Front ends (console
+``run``, HTTP ``/sessions``) pass the spec on each call, so sessions hold no spec copy.
+"""
+import asyncio
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from .collector import infer_counts_from_spec
+from .plan import plan_for
+
+SESSION_TTL = 3600.0
+MAX_SESSIONS = 100_000
+QUESTIONS_CACHE_SIZE = 256
+
+
+class Question(NamedTuple):
+    kind: str  # "v_entities", "count" or "field"
+    prompt: str
+    default: str | None = None
+    group: str | None = None
+    label: str | None = None
+    entity: str | None = None
+    name: str | None = None
+    idx: int = 1
+    key: str | None = None  # placeholder the answer fills (fields only); None when the template has no slot
+    options: Tuple[str, ...] = ()
+
+
+class SubmitResult(NamedTuple):
+    ok: bool
+    error: str | None
+    question: Question  # the question the value was submitted for
+
+
+class _Shape(NamedTuple):
+    entities: Tuple[str, ...]
+    casais: bool
+    inferred: Dict[str, int]
+    auto_v: Tuple[str, ...]
+    v_question: Question | None
+
+
+# spec name -> (spec dict, shape); same identity check as ``plan_for``.
+_SHAPES: "OrderedDict[str, Tuple[Dict[str, Any], _Shape]]" = OrderedDict()
+# (spec name, counts) -> (spec dict, field questions); same identity check as ``plan_for``.
+_QUESTIONS: "OrderedDict[Tuple[str, Tuple[Tuple[str, int], ...]], Tuple[Dict[str, Any], Tuple[Question, ...]]]" = (
+    OrderedDict()
+)
+
+
+def _shape_for(spec: Dict[str, Any]) -> _Shape:
+    cached = _SHAPES.get(spec["name"])
+    if cached is not None and cached[0] is spec:
+        return cached[1]
+    multiplicity = spec.get("multiplicity") or "[1-1]"
+    entities = tuple(entity for entity in spec.get("entities", []) if entity != "GLOBAL")
+    inferred = infer_counts_from_spec(spec)
+    # Entities with a repeat block take any number of records, whatever the file name says.
+    repeat = set((spec.get("meta") or {}).get("repeat") or {})
+    auto_v = tuple(sorted(entity for entity in entities if entity in repeat))
+    v_question = None
+    if "V" in multiplicity:
+        inferred_v = (entity for entity, count in inferred.items() if count > 1 and entity in entities)
+        auto_v = tuple(sorted(set(auto_v).union(inferred_v)))
+        remaining = tuple(entity for entity in entities if entity not in auto_v)
+        if len(remaining) == 1:
+            prompt = f"A entidade '{remaining[0]}' é 'V' (vários)? (s/n)"
+            v_question = Question("v_entities", prompt, "n", options=remaining)
+        elif remaining:
+            prompt = "Quais entidades são 'V' (vários)? Separe por vírgula. Opções: " + ", ".join(remaining)
+            v_question = Question("v_entities", prompt, options=remaining)
+    shape = _Shape(entities, bool((spec.get("meta") or {}).get("casais")), inferred, auto_v, v_question)
+    _SHAPES[spec["name"]] = (spec, shape)
+    while len(_SHAPES) > QUESTIONS_CACHE_SIZE:
+        _SHAPES.popitem(last=False)
+    return shape
+
+
+def _field_questions(spec: Dict[str, Any], counts: Dict[str, int]) -> Tuple[Question, ...]:
+    cache_key = (spec["name"], tuple(sorted(counts.items())))
+    cached = _QUESTIONS.get(cache_key)
+    if cached is not None and cached[0] is spec:
+        _QUESTIONS.move_to_end(cache_key)
+        return cached[1]
+    plan = plan_for(spec)
+    questions: List[Question] = []
+    for group in spec.get("groups", []):
+        for field in group.get("fields", []):
+            entity, name, placeholder = field["entity"], field["name"], field["placeholder"]
+            _, hint, _ = plan.validator(name)
+            suffix = f"  [{hint}]" if hint else ""
+            if entity == "GLOBAL":
+                questions.append(
+                    Question("field", f"{name} (GLOBAL){suffix}", None, group["id"], group["label"], entity, name, 1,
+                             placeholder)
+                )
+                continue
+            for idx in range(1, counts.get(entity, 1) + 1):
+                key = plan.key_for(name, entity, idx) or (placeholder if idx == 1 else None)
+                questions.append(
+                    Question("field", f"{name} ({entity}) #{idx}{suffix}", None, group["id"], group["label"], entity,
+                             name, idx, key)
+                )
+    result = tuple(questions)
+    _QUESTIONS[cache_key] = (spec, result)
+    _QUESTIONS.move_to_end(cache_key)
+    while len(_QUESTIONS) > QUESTIONS_CACHE_SIZE:
+        _QUESTIONS.popitem(last=False)
+    return result
+
+
+class CollectionSession:
+    """One interview. Answers are stored normalized, one per answered question, in order."""
+
+    __slots__ = ("id", "slug", "answers", "prefill", "touched")
+
+    def __init__(self, slug: str, session_id: str | None = None, prefill: Dict[str, str] | None = None):
+        self.id = session_id or secrets.token_hex(8)
+        self.slug = slug
+        self.answers: List[str] = []
+        self.prefill = prefill or None
+        self.touched = time.monotonic()
+
+    def _replay(self, spec: Dict[str, Any]) -> Tuple[List[Question], List[str], Dict[str, int] | None]:
+        """Setup questions asked so far, the "V" entities and, once known, the record count of every entity."""
+        shape = _shape_for(spec)
+        setup: List[Question] = []
+        v_entities = list(shape.auto_v)
+        position = 0
+        if shape.v_question is not None:
+            setup.append(shape.v_question)
+            if position == len(self.answers):
+                return setup, v_entities, None
+            v_entities.extend(entity for entity in self.answers[position].split(",") if entity)
+            position += 1
+        counts = {entity: 1 for entity in shape.entities if entity not in v_entities}
+        for entity in v_entities:
+            default = shape.inferred.get(entity, 0)
+            if default < 1:
+                default = 2 if shape.casais else 1
+            setup.append(Question("count", f"Quantos registros para '{entity}'?", str(default), entity=entity))
+            if position == len(self.answers):
+                return setup, v_entities, None
+            counts[entity] = int(self.answers[position])
+            position += 1
+        return setup, v_entities, counts
+
+    def _questions(self, spec: Dict[str, Any]) -> Tuple[List[Question], Tuple[Question, ...]]:
+        setup, _, counts = self._replay(spec)
+        return setup, (_field_questions(spec, counts) if counts is not None else ())
+
+    def question(self, spec: Dict[str, Any]) -> Question | None:
+        """The current question (``None`` when the interview is over); field defaults come from the prefill."""
+        setup, fields = self._questions(spec)
+        position = len(self.answers)
+        if position < len(setup):
+            return setup[position]
+        position -= len(setup)
+        if position >= len(fields):
+            return None
+        current = fields[position]
+        if self.prefill and current.key:
+            suggested = self.prefill.get(current.key)
+            if suggested:
+                current = current._replace(default=suggested)
+        return current
+
+    def submit(self, spec: Dict[str, Any], value: str) -> SubmitResult:
+        current = self.question(spec)
+        if current is None:
+            raise ValueError("a coleta já terminou")
+        self.touched = time.monotonic()
+        value = (value or "").strip() or (current.default or "")
+        if current.kind == "v_entities":
+            if len(current.options) == 1:
+                chosen = [current.options[0]] if value.lower().startswith("s") else []
+            else:
+                wanted = [item.strip().upper() for item in value.split(",") if item.strip()]
+                chosen = [entity for entity in current.options if entity in wanted]
+            self.answers.append(",".join(chosen))
+        elif current.kind == "count":
+            if not (value.isdigit() and int(value) >= 1):
+                return SubmitResult(False, "Informe um número inteiro >= 1.", current)
+            self.answers.append(str(int(value)))
+        else:
+            validator, _, rule = plan_for(spec).validator(current.name)
+            if not validator(value):
+                return SubmitResult(False, f"valor inválido ({rule})" if rule else "valor inválido", current)
+            self.answers.append(value)
+        return SubmitResult(True, None, current)
+
+    def back(self, spec: Dict[str, Any]) -> Question | None:
+        """Undo the last answer and return the question it answered."""
+        self.touched = time.monotonic()
+        if self.answers:
+            self.answers.pop()
+        return self.question(spec)
+
+    def v_entities(self, spec: Dict[str, Any]) -> List[str]:
+        return self._replay(spec)[1]
+
+    def counts(self, spec: Dict[str, Any]) -> Dict[str, int] | None:
+        return self._replay(spec)[2]
+
+    def progress(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        setup, fields = self._questions(spec)
+        known = len(fields) > 0 or self.counts(spec) is not None
+        return {"answered": len(self.answers), "total": len(setup) + len(fields) if known else None}
+
+    def mapping(self, spec: Dict[str, Any]) -> Dict[str, str]:
+        """``{PLACEHOLDER: value}`` of the fields answered so far, plus the computed ones they allow."""
+        setup, fields = self._questions(spec)
+        mapping: Dict[str, str] = {}
+        for current, value in zip(fields, self.answers[len(setup):]):
+            if current.key is not None:
+                mapping[current.key] = value
+        return plan_for(spec).derive(mapping)
+
+    def done(self, spec: Dict[str, Any]) -> bool:
+        return self.question(spec) is None
+
+
+class SessionManager:
+    """Sessions of one process, for an asyncio front end; idle sessions expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sessions: Dict[str, CollectionSession] = {}
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def create(self, slug: str, prefill: Dict[str, str] | None = None) -> CollectionSession:
+        if len(self.sessions) >= self.max_sessions and not self.expire():
+            raise OverflowError("limite de sessões atingido")
+        session = CollectionSession(slug, prefill=prefill)
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> CollectionSession:
+        """Raises ``KeyError`` for unknown or expired sessions."""
+        session = self.sessions[session_id]
+        session.touched = time.monotonic()
+        return session
+
+    def drop(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+
+    def expire(self, now: float | None = None) -> int:
+        deadline = (now if now is not None else time.monotonic()) - self.ttl
+        stale = [session_id for session_id, session in self.sessions.items() if session.touched < deadline]
+        for session_id in stale:
+            del self.sessions[session_id]
+        return len(stale)
+
+    async def sweep(self, interval: float = 60.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.expire()
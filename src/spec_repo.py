@@ -1,20 +1,107 @@
 import os, json
-from typing import Dict, Any, List
-from .config import settings
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
+from .config import ensure_dir, settings
+
+CATALOG_NAME = "catalog.json"
+SPEC_CACHE_SIZE = 256
+
+# slug -> (spec file mtime_ns, TemplateSpec); most recently used last.
+_SPEC_CACHE: "OrderedDict[str, Tuple[int, Any]]" = OrderedDict()
+_CATALOG: Dict[str, Any] = {"mtime_ns": None, "specs": {}}
+_LISTING: Dict[str, Any] = {"mtime_ns": None, "slugs": [], "known": frozenset()}
 
 def spec_path(slug: str) -> str:
     return os.path.join(settings.SPECS, f"{slug}.json")
 
+def catalog_path() -> str:
+    return os.path.join(settings.INDEX_DIR, CATALOG_NAME)
+
 def save_spec(spec: Dict[str, Any]) -> str:
+    from .models import SPEC_SCHEMA_VERSION
+
     slug = spec["name"]
+    ensure_dir(settings.SPECS)
     path = spec_path(slug)
+    spec = {"schema_version": SPEC_SCHEMA_VERSION, **spec}
     with open(path, "w", encoding="utf-8") as f:
         json.dump(spec, f, ensure_ascii=False, indent=2)
+    _SPEC_CACHE.pop(slug, None)
     return path
 
-def load_spec(slug: str) -> Dict[str, Any]:
+def _read_spec_file(slug: str) -> Dict[str, Any]:
     with open(spec_path(slug), "r", encoding="utf-8") as f:
         return json.load(f)
 
+def _catalog_entry(slug: str, mtime_ns: int) -> Dict[str, Any] | None:
+    """Spec dict from the consolidated catalog, if the catalog has it for this exact file version."""
+    try:
+        catalog_mtime = os.stat(catalog_path()).st_mtime_ns
+    except OSError:
+        return None
+    if _CATALOG["mtime_ns"] != catalog_mtime:
+        try:
+            with open(catalog_path(), "r", encoding="utf-8") as f:
+                _CATALOG["specs"] = json.load(f).get("specs", {})
+        except (OSError, ValueError):
+            _CATALOG["specs"] = {}
+        _CATALOG["mtime_ns"] = catalog_mtime
+    entry = _CATALOG["specs"].get(slug)
+    if entry and entry.get("mtime_ns") == mtime_ns:
+        return entry["spec"]
+    return None
+
+def get_spec(slug: str):
+    """Typed, migrated spec; cached per slug and invalidated when the spec file's mtime changes."""
+    from .models import parse_spec
+
+    mtime_ns = os.stat(spec_path(slug)).st_mtime_ns
+    cached = _SPEC_CACHE.get(slug)
+    if cached is not None and cached[0] == mtime_ns:
+        _SPEC_CACHE.move_to_end(slug)
+        return cached[1]
+    raw = _catalog_entry(slug, mtime_ns) or _read_spec_file(slug)
+    spec = parse_spec(raw)
+    _SPEC_CACHE[slug] = (mtime_ns, spec)
+    _SPEC_CACHE.move_to_end(slug)
+    while len(_SPEC_CACHE) > SPEC_CACHE_SIZE:
+        _SPEC_CACHE.popitem(last=False)
+    return spec
+
+def load_spec(slug: str) -> Dict[str, Any]:
+    """Dict view of ``get_spec``; shared with other callers, so do not mutate it."""
+    return get_spec(slug).as_dict
+
 def list_specs() -> List[str]:
-    return [fn[:-5] for fn in sorted(os.listdir(settings.SPECS)) if fn.endswith(".json")]
+    try:
+        mtime_ns = os.stat(settings.SPECS).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    if _LISTING["mtime_ns"] != mtime_ns:
+        _LISTING["slugs"] = [
+            fn[:-5] for fn in sorted(os.listdir(settings.SPECS)) if fn.endswith(".json") and not fn.startswith(".")
+        ]
+        _LISTING["known"] = frozenset(_LISTING["slugs"])
+        _LISTING["mtime_ns"] = mtime_ns
+    return list(_LISTING["slugs"])
+
+
+def has_spec(slug: str) -> bool:
+    """``slug`` is one of ``list_specs()``; use it before turning untrusted input into a path."""
+    list_specs()
+    return slug in _LISTING["known"]
+
+def write_catalog() -> str:
+    """Consolidate every spec into one catalog file, so a process can load them all in one read."""
+    from .models import SPEC_SCHEMA_VERSION, migrate_spec
+
+    specs: Dict[str, Any] = {}
+    for slug in list_specs():
+        specs[slug] = {"mtime_ns": os.stat(spec_path(slug)).st_mtime_ns, "spec": migrate_spec(_read_spec_file(slug))}
+    path = catalog_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"schema_version": SPEC_SCHEMA_VERSION, "specs": specs}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
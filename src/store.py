@@ -0,0 +1,243 @@
+"""Local SQLite store: parties already collected (by CPF/CNPJ) and a ledger of every generated document.
+
+One file (``AGNODOCS_STORE``, default ``.data/agnodocs.sqlite3``) in WAL mode, so reports can read while a
+batch writes. Writes are queued and committed in batches (``flush``), one transaction each.
+"""
+import json
+import os
+import re
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+from .config import ensure_dir, settings
+from .plan import CollectionPlan, plan_for
+
+SCHEMA_VERSION = 1
+FLUSH_EVERY = 200
+DOCUMENT_RULES = ("cpf", "cnpj")
+
+_DIGITS_RE = re.compile(r"\D+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parties (
+    doc TEXT PRIMARY KEY,          -- CPF/CNPJ, digits only
+    kind TEXT NOT NULL,            -- 'cpf' or 'cnpj'
+    fields TEXT NOT NULL,          -- JSON {FIELD: value}, e.g. {"NOME": "...", "RG": "..."}
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS parties_updated ON parties (updated_at);
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    slug TEXT NOT NULL,
+    template_sha256 TEXT NOT NULL,
+    mapping_sha256 TEXT NOT NULL,
+    out_path TEXT NOT NULL,
+    timings TEXT NOT NULL          -- JSON
+);
+CREATE INDEX IF NOT EXISTS fills_created ON fills (created_at);
+CREATE INDEX IF NOT EXISTS fills_slug_created ON fills (slug, created_at);
+CREATE TABLE IF NOT EXISTS fill_parties (
+    doc TEXT NOT NULL,
+    fill_id INTEGER NOT NULL REFERENCES fills (id),
+    PRIMARY KEY (doc, fill_id)
+) WITHOUT ROWID;
+"""
+
+
+def normalize_doc(value: str) -> str:
+    """``"123.456.789-09"`` -> ``"12345678909"``."""
+    return _DIGITS_RE.sub("", value or "")
+
+
+def doc_kind(doc: str) -> str | None:
+    return {11: "cpf", 14: "cnpj"}.get(len(doc))
+
+
+class Party(NamedTuple):
+    doc: str
+    kind: str
+    fields: Dict[str, str]
+
+
+def parties_in(plan: CollectionPlan, mapping: Dict[str, str]) -> List[Tuple[str, int, Party]]:
+    """``(entity, idx, party)`` for every entity record of ``mapping`` that carries a CPF or CNPJ."""
+    by_record: Dict[Tuple[str, int], Dict[str, str]] = {}
+    documents: Dict[Tuple[str, int], str] = {}
+    for field in plan.fields:
+        if field.entity == "GLOBAL":
+            continue
+        for idx in range(1, 100):
+            key = plan.key_for(field.name, field.entity, idx)
+            if key is None or key not in mapping:
+                break
+            value = mapping[key]
+            if not value:
+                continue
+            by_record.setdefault((field.entity, idx), {})[field.name] = value
+            if field.rule in DOCUMENT_RULES and doc_kind(normalize_doc(value)):
+                documents[(field.entity, idx)] = normalize_doc(value)
+    return [
+        (entity, idx, Party(doc, doc_kind(doc), by_record[(entity, idx)]))
+        for (entity, idx), doc in documents.items()
+    ]
+
+
+def prefill_for(plan: CollectionPlan, entity: str, idx: int, party: Party) -> Dict[str, str]:
+    """``{PLACEHOLDER: value}`` suggestions for record ``idx`` of ``entity`` from a stored party."""
+    prefill: Dict[str, str] = {}
+    for name, value in party.fields.items():
+        key = plan.key_for(name, entity, idx)
+        if key is not None:
+            prefill[key] = value
+    return prefill
+
+
+class Store:
+    """Not thread-safe: use one ``Store`` per thread or process (WAL lets several of them share the file)."""
+
+    def __init__(self, path: str | None = None, flush_every: int = FLUSH_EVERY):
+        self.path = path or settings.STORE_PATH
+        ensure_dir(os.path.dirname(os.path.abspath(self.path)))
+        self.flush_every = flush_every
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION:
+            with self.db:
+                self.db.executescript(SCHEMA)
+                self.db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self._parties: Dict[str, Party] = {}
+        self._fills: List[Tuple[Dict[str, Any], List[str]]] = []
+
+    def party(self, doc: str) -> Party | None:
+        doc = normalize_doc(doc)
+        pending = self._parties.get(doc)
+        row = self.db.execute("SELECT doc, kind, fields FROM parties WHERE doc = ?", (doc,)).fetchone()
+        stored = Party(row["doc"], row["kind"], json.loads(row["fields"])) if row is not None else None
+        if pending is None:
+            return stored
+        return pending._replace(fields={**(stored.fields if stored else {}), **pending.fields})
+
+    def save_party(self, party: Party) -> None:
+        """Queue ``party``; non-empty values win over what is stored, missing fields are kept."""
+        queued = self._parties.get(party.doc)
+        fields = {**(queued.fields if queued else {}), **{k: v for k, v in party.fields.items() if v}}
+        self._parties[party.doc] = party._replace(fields=fields)
+        self._maybe_flush()
+
+    def record_fill(
+        self,
+        slug: str,
+        template_sha256: str,
+        mapping_sha256: str,
+        out_path: str,
+        timings: Dict[str, Any] | None = None,
+        docs: Iterable[str] = (),
+    ) -> None:
+        entry = {
+            "created_at": time.time(),
+            "slug": slug,
+            "template_sha256": template_sha256,
+            "mapping_sha256": mapping_sha256,
+            "out_path": out_path,
+            "timings": json.dumps(timings or {}, ensure_ascii=False),
+        }
+        self._fills.append((entry, sorted({normalize_doc(doc) for doc in docs})))
+        self._maybe_flush()
+
+    def fills(
+        self, doc: str | None = None, slug: str | None = None, since: float | None = None, limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Most recent fills first; ``doc`` uses ``fill_parties``, ``since`` the ``created_at`` index."""
+        self.flush()
+        sql = "SELECT f.* FROM fills f"
+        where: List[str] = []
+        args: List[Any] = []
+        if doc:
+            sql += " JOIN fill_parties p ON p.fill_id = f.id"
+            where.append("p.doc = ?")
+            args.append(normalize_doc(doc))
+        if slug:
+            where.append("f.slug = ?")
+            args.append(slug)
+        if since is not None:
+            where.append("f.created_at >= ?")
+            args.append(since)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY f.created_at DESC LIMIT ?"
+        args.append(limit)
+        rows = self.db.execute(sql, args).fetchall()
+        return [{**dict(row), "timings": json.loads(row["timings"])} for row in rows]
+
+    def _maybe_flush(self) -> None:
+        if len(self._parties) + len(self._fills) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write every queued party and fill in one transaction."""
+        if not self._parties and not self._fills:
+            return
+        now = time.time()
+        parties, fills = self._parties, self._fills
+        self._parties, self._fills = {}, []
+        with self.db:
+            for party in parties.values():
+                row = self.db.execute("SELECT fields FROM parties WHERE doc = ?", (party.doc,)).fetchone()
+                fields = {**(json.loads(row["fields"]) if row is not None else {}), **party.fields}
+                self.db.execute(
+                    "INSERT INTO parties (doc, kind, fields, created_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (doc) DO UPDATE SET fields = excluded.fields, updated_at = excluded.updated_at",
+                    (party.doc, party.kind, json.dumps(fields, ensure_ascii=False), now, now),
+                )
+            for entry, docs in fills:
+                cursor = self.db.execute(
+                    "INSERT INTO fills (created_at, slug, template_sha256, mapping_sha256, out_path, timings) "
+                    "VALUES (:created_at, :slug, :template_sha256, :mapping_sha256, :out_path, :timings)",
+                    entry,
+                )
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO fill_parties (doc, fill_id) VALUES (?, ?)",
+                    [(doc, cursor.lastrowid) for doc in docs],
+                )
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close()
+
+    def __enter__(self) -> "Store":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def remember_fill(
+    store: Store,
+    spec: Dict[str, Any],
+    template_path: str,
+    mapping: Dict[str, str],
+    out_path: str,
+    timings: Dict[str, Any] | None = None,
+) -> List[Party]:
+    """Save the parties of ``mapping`` and record the fill; returns the parties found."""
+    from .output_cache import mapping_hash, template_hash
+
+    parties = [party for _, _, party in parties_in(plan_for(spec), mapping)]
+    for party in parties:
+        store.save_party(party)
+    store.record_fill(
+        spec["name"],
+        template_hash(template_path),
+        mapping_hash(mapping),
+        out_path,
+        timings,
+        docs=[party.doc for party in parties],
+    )
+    return parties
@@ -0,0 +1,104 @@
+"""Synthetic stress templates for the benchmark suite (deterministic, generated offline)."""
+import os
+import random
+import struct
+import zlib
+from typing import Callable, Dict
+
+from docx import Document
+from docx.shared import Inches
+
+ENTITIES = ("OUTORGANTE", "OUTORGADO", "COMPRADOR", "VENDEDOR")
+BASES = ("NOME", "CPF", "RG", "PROFISSAO", "END_LOGRADOURO", "END_BAIRRO", "END_CIDADE", "END_UF")
+
+
+def _placeholder(rng: random.Random, idx: int) -> str:
+    return f"{{{rng.choice(BASES)}_{rng.choice(ENTITIES)}_{idx % 50 + 1}}}"
+
+
+def _noise_png(width: int, height: int, seed: int) -> bytes:
+    """Incompressible RGB noise, so the image weighs the same inside the .docx zip."""
+    rng = random.Random(seed)
+    raw = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b"")
+
+
+def many_paragraphs(path: str, paragraphs: int = 5000) -> None:
+    rng = random.Random(1)
+    doc = Document()
+    for idx in range(paragraphs):
+        doc.add_paragraph(f"Cláusula {idx}: o outorgante {_placeholder(rng, idx)} declara que {_placeholder(rng, idx)}.")
+    doc.save(path)
+
+
+def big_tables(path: str, rows: int = 400, cols: int = 6) -> None:
+    rng = random.Random(2)
+    doc = Document()
+    table = doc.add_table(rows=rows, cols=cols)
+    for r in range(rows):
+        for c in range(cols):
+            table.cell(r, c).text = f"{_placeholder(rng, r)}"
+        if r % 4 == 0:
+            table.cell(r, 0).merge(table.cell(r, 2))
+        if r % 10 == 0 and r + 1 < rows:
+            table.cell(r, cols - 1).merge(table.cell(r + 1, cols - 1))
+    doc.save(path)
+
+
+def ten_k_placeholders(path: str, placeholders: int = 10_000) -> None:
+    rng = random.Random(3)
+    doc = Document()
+    per_paragraph = 10
+    for start in range(0, placeholders, per_paragraph):
+        doc.add_paragraph(", ".join(_placeholder(rng, start + k) for k in range(per_paragraph)))
+    doc.save(path)
+
+
+def run_split(path: str, paragraphs: int = 2000) -> None:
+    rng = random.Random(4)
+    doc = Document()
+    for idx in range(paragraphs):
+        text = _placeholder(rng, idx)
+        cut1, cut2 = len(text) // 3, 2 * len(text) // 3
+        paragraph = doc.add_paragraph("Campo: ")
+        paragraph.add_run(text[:cut1]).bold = True
+        paragraph.add_run(text[cut1:cut2])
+        paragraph.add_run(text[cut2:] + " fim.")
+    doc.save(path)
+
+
+def large_images(path: str, images: int = 3, side: int = 900) -> None:
+    rng = random.Random(5)
+    doc = Document()
+    image_path = f"{path}.png"
+    for idx in range(images):
+        with open(image_path, "wb") as handler:
+            handler.write(_noise_png(side, side, seed=idx))
+        doc.add_paragraph(f"Anexo {idx}: {_placeholder(rng, idx)}")
+        doc.add_picture(image_path, width=Inches(4))
+    os.remove(image_path)
+    doc.save(path)
+
+
+GENERATORS: Dict[str, Callable[[str], None]] = {
+    "synthetic_paragraphs": many_paragraphs,
+    "synthetic_tables": big_tables,
+    "synthetic_10k_placeholders": ten_k_placeholders,
+    "synthetic_run_split": run_split,
+    "synthetic_images": large_images,
+}
+
+
+def generate_all(out_dir: str) -> Dict[str, str]:
+    os.makedirs(out_dir, exist_ok=True)
+    paths: Dict[str, str] = {}
+    for name, generator in GENERATORS.items():
+        path = os.path.join(out_dir, f"{name}.docx")
+        generator(path)
+        paths[name] = path
+    return paths
@@ -0,0 +1,75 @@
+import threading
+import time
+from typing import Dict, List
+
+# span name -> durations in ms, for the per-command summary.
+_SPANS: Dict[str, List[float]] = {}
+_LOCK = threading.Lock()
+
+
+def record(name: str, ms: float) -> None:
+    with _LOCK:
+        _SPANS.setdefault(name, []).append(ms)
+
+
+class Span:
+    """``with Span("fill.render") as span: ...`` -> ``span.ms`` holds the duration and it joins the summary."""
+
+    __slots__ = ("name", "started", "ms")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = 0.0
+        self.ms = 0.0
+
+    def start(self) -> "Span":
+        self.started = time.perf_counter()
+        return self
+
+    def stop(self) -> float:
+        self.ms = round((time.perf_counter() - self.started) * 1000, 3)
+        record(self.name, self.ms)
+        return self.ms
+
+    def __enter__(self) -> "Span":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def drain() -> Dict[str, List[float]]:
+    """Take every recorded duration (e.g. to ship them from a worker process to the parent)."""
+    with _LOCK:
+        spans = {name: list(values) for name, values in _SPANS.items()}
+        _SPANS.clear()
+    return spans
+
+
+def merge(spans: Dict[str, List[float]]) -> None:
+    with _LOCK:
+        for name, values in spans.items():
+            _SPANS.setdefault(name, []).extend(values)
+
+
+def summary() -> Dict[str, Dict[str, float]]:
+    with _LOCK:
+        spans = {name: sorted(values) for name, values in _SPANS.items()}
+    return {
+        name: {
+            "count": len(values),
+            "p50_ms": _percentile(values, 50),
+            "p95_ms": _percentile(values, 95),
+            "max_ms": values[-1],
+            "total_ms": round(sum(values), 3),
+        }
+        for name, values in sorted(spans.items())
+        if values
+    }
@@ -8,6 +8,8 @@ UF_RE = re.compile(r"^[A-Za-z]{2}$")
 CEP_RE = re.compile(r"^\d{5}-?\d{3}$")
 EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
 PHONE_RE = re.compile(r"^\+?\d{10,15}$")
+AMOUNT_RE = re.compile(r"^(R\$\s*)?(\d{1,3}(\.\d{3})+|\d+)([.,]\d{1,2})?$")
+GENDER_VALUES = {"m", "f", "masculino", "feminino"}
 
 
 def is_cpf(value: str) -> bool:
@@ -38,8 +40,18 @@ def is_phone(value: str) -> bool:
     return bool(PHONE_RE.match((value or "").strip()))
 
 
+def is_amount(value: str) -> bool:
+    return bool(AMOUNT_RE.match((value or "").strip()))
+
+
+def is_gender(value: str) -> bool:
+    return (value or "").strip().casefold() in GENDER_VALUES
+
+
 def guess_validator(field_name: str) -> Tuple[Callable[[str], bool], str | None, str | None]:
     field = (field_name or "").upper()
+    if field.endswith("_EXTENSO"):
+        return (lambda _value: True), None, None
     if "CPF" in field:
         return is_cpf, "CPF no formato 999.999.999-99", "cpf"
     if "CNPJ" in field:
@@ -54,4 +66,8 @@ def guess_validator(field_name: str) -> Tuple[Callable[[str], bool], str | None,
         return is_email, "e-mail válido", "email"
     if "TELEFONE" in field or "CELULAR" in field or "WHATS" in field:
         return is_phone, "telefone (+5511999999999)", "telefone"
+    if "VALOR" in field:
+        return is_amount, "valor (ex.: 1.234,56)", "valor"
+    if field.startswith("SEXO") or field.startswith("GENERO"):
+        return is_gender, "M ou F", "sexo"
     return (lambda _value: True), None, None